@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -----------------------------------------------------------------------------
+# Project           : Texto
+# -----------------------------------------------------------------------------
+# Author            : Sebastien Pierre             <sebastien.pierre@gmail.com>
+# -----------------------------------------------------------------------------
+# Creation  date    : 2026-10-17
+# Last mod.         : 2026-10-17
+# -----------------------------------------------------------------------------
+
+# Times the parser and the renderers over the test and documentation corpus,
+# and over synthetic documents of growing size, and outputs the timings as
+# JSON. The synthetic timings come with an estimate of their scaling
+# exponent (the slope of log(time) over log(size), once the time of the
+# operation on an empty document is subtracted): a value around 1 is linear,
+# and values well above 1 show a superlinear behaviour.
+#
+# Usage: python benchmarks/run.py [-o RESULT.json] [-q] [-s corpus|synthetic]
+
+import os
+import io
+import sys
+import glob
+import json
+import math
+import time
+import platform
+import argparse
+import contextlib
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BASE)
+sys.path.insert(0, os.path.join(ROOT, "src", "py"))
+
+from texto.parser import Parser  # NOQA
+from texto.formats import html, json as jsonFormat, markdown, lout, twiki  # NOQA
+
+RENDERERS = {
+    "html": html,
+    "json": jsonFormat,
+    "md": markdown,
+    "lout": lout,
+    "twiki": twiki,
+}
+CORPUS = ("tests/*.txto", "doc/*.txto")
+# The minimum duration of a sample, over which short operations are repeated
+SAMPLE_TIME = 0.005
+
+# ------------------------------------------------------------------------------
+#
+# SYNTHETIC DOCUMENTS
+#
+# ------------------------------------------------------------------------------
+
+LOREM = (
+    "Lorem ipsum dolor sit amet, consectetuer adipiscing elit. Vestibulum "
+    "tortor libero, viverra vel, nonummy sodales, bibendum ut, nibh."
+)
+# One of each inline element, in the syntax the parser recognises (see
+# `doc/reference.txto` and `tests/syntax-*.txto`), as emphasis, strong, code,
+# term, citation, strikethrough, link, URL, target, escaped text, en dash and
+# dots.
+INLINES = (
+    "*emphasis*",
+    "**strong**",
+    "`code`",
+    "_term_",
+    "«citation»",
+    "~~strikethrough~~",
+    "[a link](http://github.com/sebastien/texto)",
+    "<http://github.com/sebastien/texto>",
+    "|target|",
+    "<[escaped]>",
+    "a -- b",
+    "dots...",
+)
+
+
+def paragraphs(n):
+    """`n` paragraphs of plain text."""
+    return "\n\n".join("%d %s" % (i, LOREM) for i in range(n))
+
+
+def inlines(n):
+    """A paragraph with `n` inline elements."""
+    return " ".join("%s %s" % (INLINES[i % len(INLINES)], "text") for i in range(n))
+
+
+def listDepth(n):
+    """A list nested `n` levels deep, with two items per level."""
+    lines = []
+    for i in range(n):
+        lines.append("  " * i + "- item %d %s" % (i, LOREM[:40]))
+        lines.append("  " * i + "- item %d" % (i))
+    return "\n".join(lines)
+
+
+def tableSize(n):
+    """A table of `n` rows of four cells."""
+    line = "  " + "=" * 72
+    rows = [line]
+    for i in range(n):
+        rows.append("  Row %-5d || Cell %-5d || Cell %-5d || Cell %-5d" % (i, i, i, i))
+        rows.append("  " + "-" * 72)
+    rows[-1] = line
+    return "\n".join(rows)
+
+
+def markupNesting(n):
+    """A paragraph with inline markup nested `n` levels deep."""
+    return (
+        "Text "
+        + "".join("<span class='l%d'>level %d " % (i, i) for i in range(n))
+        + "end"
+        + "</span>" * n
+        + " of text."
+    )
+
+
+# The generators and the sizes they are run with (full, quick)
+GENERATORS = {
+    "paragraphs": (paragraphs, (50, 100, 200, 400, 800), (50, 100, 200)),
+    "inlines": (inlines, (50, 100, 200, 400, 800), (50, 100, 200)),
+    "listDepth": (listDepth, (4, 8, 16, 32, 64), (4, 8, 16)),
+    "tableSize": (tableSize, (25, 50, 100, 200, 400), (25, 50, 100)),
+    "markupNesting": (markupNesting, (4, 8, 16, 32, 64), (4, 8, 16)),
+}
+# The operations timed on the synthetic documents
+SYNTHETIC_OPERATIONS = ("parse", "offsets", "html", "json")
+
+# ------------------------------------------------------------------------------
+#
+# MEASURES
+#
+# ------------------------------------------------------------------------------
+
+
+def measure(function, repeat=5):
+    """Returns the best time in seconds of a call to the given function,
+    over `repeat` samples, each sample repeating the call until it lasts at
+    least `SAMPLE_TIME`."""
+    best = None
+    number = 1
+    for _ in range(repeat):
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                function()
+            elapsed = time.perf_counter() - started
+            if elapsed >= SAMPLE_TIME or number >= 1 << 16:
+                break
+            number *= 2
+        duration = elapsed / number
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def timeOperations(text, operations, repeat=5, parser=None):
+    """Returns the time of each of the given operations on the given text,
+    and the errors of the operations that failed. The given parser is reused
+    by the parsing operations, so that they do not time the creation of a
+    parser."""
+    parser = parser or Parser()
+    times = {}
+    errors = {}
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            document = parser.parse(text).document
+        except Exception as e:
+            return times, {"parse": "%s: %s" % (e.__class__.__name__, e)}
+        for name in operations:
+            if name == "parse":
+                function = lambda: parser.parse(text)  # NOQA: E731
+            elif name == "offsets":
+                function = lambda: parser.parse(text, True)  # NOQA: E731
+            else:
+                processor = RENDERERS[name].processor
+                function = lambda: processor.generate(document)  # NOQA: E731
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    function()
+                    times[name] = measure(function, repeat)
+            except Exception as e:
+                errors[name] = "%s: %s" % (e.__class__.__name__, e)
+    return times, errors
+
+
+def getExponent(sizes, times, constant=0.0):
+    """Returns the least-squares slope of `log(time)` over `log(size)`, once
+    the given `constant` time (the time of the operation on an empty
+    document) is subtracted from the times."""
+    times = [t - constant for t in times]
+    points = [(math.log(s), math.log(t)) for s, t in zip(sizes, times) if t > 0]
+    if len(points) < 2:
+        return None
+    mx = sum(_[0] for _ in points) / len(points)
+    my = sum(_[1] for _ in points) / len(points)
+    sxx = sum((x - mx) ** 2 for x, _ in points)
+    sxy = sum((x - mx) * (y - my) for x, y in points)
+    return round(sxy / sxx, 3) if sxx else None
+
+
+# ------------------------------------------------------------------------------
+#
+# BENCHMARKS
+#
+# ------------------------------------------------------------------------------
+
+
+def benchmarkCorpus(repeat=5):
+    """Times parsing, parsing with offsets and each renderer over the
+    files of the corpus."""
+    files = []
+    totals = {}
+    operations = ("parse", "offsets") + tuple(RENDERERS)
+    parser = Parser()
+    for pattern in CORPUS:
+        for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+            with open(path) as f:
+                text = f.read()
+            times, errors = timeOperations(text, operations, repeat, parser)
+            for name, value in times.items():
+                totals[name] = totals.get(name, 0.0) + value
+            entry = {
+                "file": os.path.relpath(path, ROOT),
+                "bytes": len(text.encode("utf8")),
+                "times": times,
+            }
+            if errors:
+                entry["errors"] = errors
+            files.append(entry)
+    return {"files": files, "totals": totals}
+
+
+def benchmarkSynthetic(quick=False, repeat=5):
+    """Times the synthetic documents of each generator at growing sizes,
+    with the scaling exponent of each operation. The exponents are those of
+    the times minus the constant time of each operation, as measured on an
+    empty document."""
+    parser = Parser()
+    constants, _ = timeOperations("", SYNTHETIC_OPERATIONS, repeat, parser)
+    results = {}
+    for name, (generator, sizes, quickSizes) in GENERATORS.items():
+        sizes = quickSizes if quick else sizes
+        runs = []
+        for size in sizes:
+            text = generator(size)
+            times, errors = timeOperations(text, SYNTHETIC_OPERATIONS, repeat, parser)
+            run = {"size": size, "bytes": len(text.encode("utf8")), "times": times}
+            if errors:
+                run["errors"] = errors
+            runs.append(run)
+        exponents = {}
+        for operation in SYNTHETIC_OPERATIONS:
+            measured = [_ for _ in runs if operation in _["times"]]
+            exponents[operation] = getExponent(
+                [_["size"] for _ in measured],
+                [_["times"][operation] for _ in measured],
+                constants.get(operation, 0.0),
+            )
+        results[name] = {"runs": runs, "exponents": exponents, "constants": constants}
+    return results
+
+
+def run(args=sys.argv[1:]):
+    oparser = argparse.ArgumentParser(
+        prog="benchmarks/run.py",
+        description="Times the Texto parser and renderers, as JSON",
+    )
+    oparser.add_argument(
+        "-o", "--output", dest="output", default="-", help="The JSON output file"
+    )
+    oparser.add_argument(
+        "-q",
+        "--quick",
+        dest="quick",
+        action="store_true",
+        default=False,
+        help="Uses fewer sizes and samples",
+    )
+    oparser.add_argument(
+        "-s",
+        "--suite",
+        dest="suites",
+        action="append",
+        choices=("corpus", "synthetic"),
+        help="Only runs the given suite (corpus or synthetic)",
+    )
+    oparser.add_argument(
+        "-r",
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=None,
+        help="The number of samples of each measure (5, or 3 when quick)",
+    )
+    args = oparser.parse_args(args)
+    repeat = args.repeat or (3 if args.quick else 5)
+    suites = args.suites or ("corpus", "synthetic")
+    result = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "unit": "seconds",
+    }
+    if "corpus" in suites:
+        result["corpus"] = benchmarkCorpus(repeat)
+    if "synthetic" in suites:
+        result["synthetic"] = benchmarkSynthetic(args.quick, repeat)
+    output = json.dumps(result, indent=1)
+    if args.output == "-":
+        sys.stdout.write(output + "\n")
+    else:
+        with open(args.output, "wt") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    run()
+
+# EOF
@@ -1,2 +1,2 @@
-from texto.command import run, parse, render
+from texto.command import run, parse, render, stream
 # EOF
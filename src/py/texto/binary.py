@@ -0,0 +1,365 @@
+# -----------------------------------------------------------------------------
+# Project           :   Texto
+# -----------------------------------------------------------------------------
+# Author            :   Sebastien Pierre           <sebastien.pierre@gmail.com>
+# License           :   Revised BSD License
+# -----------------------------------------------------------------------------
+# Creation date     :   2026-10-17
+# Last mod.         :   2026-10-17
+# -----------------------------------------------------------------------------
+
+from typing import Iterable
+from .tree import (
+    Document,
+    Element,
+    Text,
+    Comment,
+    ELEMENT_NODE,
+    TEXT_NODE,
+    COMMENT_NODE,
+    DOCUMENT_NODE,
+)
+
+__doc__ = """\
+The `binary` module implements a compact binary format for the native
+document trees (see `texto.tree`, created by `Parser(tree="native")`), which
+is much faster to load than parsing the text again, and which can be used
+to cache parsed documents or to send them to other processes.
+
+```python
+data = binary.dumps(context.document)
+document = binary.loads(data)
+```
+
+The format starts with the `TXTB` magic, a version and a flags byte (`1`
+when the root is a document), followed by:
+
+- the string table: the interned element names and attribute names and
+  values, as a varint count followed by varint-length prefixed UTF-8
+  strings,
+- the text heap: the UTF-8 text of all the text and comment nodes, as a
+  varint length followed by the bytes,
+- the nodes in document order, starting with the root (or the varint
+  number of children of a document).
+
+Each node starts with a byte that holds its kind (element, text or comment)
+and flags. Text and comment nodes give the character offset and length of
+their text in the heap. Elements give the string index of their name,
+their attributes as pairs of string indexes, their `indent`, `start`,
+`end` and `number` fields when defined, and when they have children, the
+number of children and the length in bytes of the children, so that
+elements can be skipped. All the integers are unsigned varints, except the
+fields, which are zigzag-encoded varints.
+
+When loading lazily (see `loads`), the children of the elements with the
+given names (sections by default) are only loaded once they are accessed.
+"""
+
+MAGIC = b"TXTB"
+VERSION = 1
+# The flags of the header
+IS_DOCUMENT = 1
+# The kinds of nodes, in the two lowest bits of the node byte, followed by
+# the node flags.
+KIND_ELEMENT = 0
+KIND_TEXT = 1
+KIND_COMMENT = 2
+KIND_MASK = 3
+HAS_ATTRIBUTES = 4
+HAS_INDENT = 8
+HAS_START = 16
+HAS_END = 32
+HAS_NUMBER = 64
+HAS_CHILDREN = 128
+# The elements that are loaded lazily by default
+LAZY_ELEMENTS = ("section",)
+
+
+class FormatError(ValueError):
+    pass
+
+
+# ------------------------------------------------------------------------------
+#
+# DUMP
+#
+# ------------------------------------------------------------------------------
+
+
+def dumps(node) -> bytes:
+    """Returns the binary serialization of the given native document or
+    element."""
+    writer = Writer()
+    if node.nodeType == DOCUMENT_NODE:
+        nodes = writer.writeChildren(node.childNodes)
+        flags = IS_DOCUMENT
+    else:
+        nodes = writer.writeNode(node)
+        flags = 0
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    out.append(flags)
+    writeVarint(out, len(writer.strings))
+    for string in writer.strings:
+        data = string.encode("utf8")
+        writeVarint(out, len(data))
+        out += data
+    heap = "".join(writer.heap).encode("utf8")
+    writeVarint(out, len(heap))
+    out += heap
+    out += nodes
+    return bytes(out)
+
+
+def dump(node, file):
+    """Writes the binary serialization of the given node to the given
+    binary file object."""
+    file.write(dumps(node))
+
+
+class Writer:
+    """Serializes nodes, collecting the string table and the text heap."""
+
+    def __init__(self):
+        self.strings = {}
+        self.heap = []
+        self.heapLength = 0
+
+    def intern(self, string: str) -> int:
+        index = self.strings.get(string)
+        if index is None:
+            index = self.strings[string] = len(self.strings)
+        return index
+
+    def writeChildren(self, children) -> bytearray:
+        out = bytearray()
+        writeVarint(out, len(children))
+        for child in children:
+            out += self.writeNode(child)
+        return out
+
+    def writeNode(self, node) -> bytearray:
+        out = bytearray()
+        node_type = node.nodeType
+        if node_type == TEXT_NODE or node_type == COMMENT_NODE:
+            data = node.data
+            out.append(KIND_TEXT if node_type == TEXT_NODE else KIND_COMMENT)
+            writeVarint(out, self.heapLength)
+            writeVarint(out, len(data))
+            self.heap.append(data)
+            self.heapLength += len(data)
+            return out
+        elif node_type != ELEMENT_NODE or not isinstance(node, Element):
+            raise FormatError("Only native tree nodes can be serialized: %r" % (node))
+        flags = KIND_ELEMENT
+        fields = []
+        if node.attributes:
+            flags |= HAS_ATTRIBUTES
+        for flag, value in (
+            (HAS_INDENT, node.indent),
+            (HAS_START, node.start),
+            (HAS_END, node.end),
+            (HAS_NUMBER, node.number),
+        ):
+            if value is not None:
+                flags |= flag
+                fields.append(value)
+        if node.childNodes:
+            flags |= HAS_CHILDREN
+        out.append(flags)
+        writeVarint(out, self.intern(node.nodeName))
+        if node.attributes:
+            writeVarint(out, len(node.attributes))
+            for name, value in node.attributes.items():
+                writeVarint(out, self.intern(name))
+                writeVarint(out, self.intern(value))
+        for value in fields:
+            writeVarint(out, (value << 1) ^ (value >> 63))
+        if node.childNodes:
+            children = bytearray()
+            for child in node.childNodes:
+                children += self.writeNode(child)
+            writeVarint(out, len(node.childNodes))
+            writeVarint(out, len(children))
+            out += children
+        return out
+
+
+def writeVarint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+# ------------------------------------------------------------------------------
+#
+# LOAD
+#
+# ------------------------------------------------------------------------------
+
+
+def loads(data: bytes, lazy=False, lazyElements: Iterable[str] = LAZY_ELEMENTS):
+    """Loads the native document or element serialized in the given data.
+    When `lazy` is set, the children of the elements named in
+    `lazyElements` are only loaded when their `childNodes` are first
+    accessed, in which case the data must not be modified."""
+    reader = Reader(data, frozenset(lazyElements) if lazy else frozenset())
+    if reader.flags & IS_DOCUMENT:
+        document = Document()
+        children, _ = reader.readChildren(reader.start, document)
+        document.childNodes = children
+        return document
+    else:
+        node, _ = reader.readNode(reader.start, None)
+        return node
+
+
+def load(file, lazy=False, lazyElements: Iterable[str] = LAZY_ELEMENTS):
+    """Loads the native document or element from the given binary file
+    object (see `loads`)."""
+    return loads(file.read(), lazy, lazyElements)
+
+
+class Reader:
+    """Reads the nodes of serialized data, which is kept along with its
+    string table and text heap for the lazy elements."""
+
+    def __init__(self, data: bytes, lazy=frozenset()):
+        if data[:4] != MAGIC:
+            raise FormatError("Not a binary texto document")
+        if data[4] != VERSION:
+            raise FormatError("Unsupported binary texto version: %s" % (data[4]))
+        self.data = data
+        self.flags = data[5]
+        self.lazy = lazy
+        count, offset = readVarint(data, 6)
+        strings = []
+        for _ in range(count):
+            length, offset = readVarint(data, offset)
+            strings.append(data[offset : offset + length].decode("utf8"))
+            offset += length
+        self.strings = strings
+        length, offset = readVarint(data, offset)
+        self.heap = data[offset : offset + length].decode("utf8")
+        self.start = offset + length
+
+    def readChildren(self, offset: int, parent):
+        """Reads the number of children at the given offset and the
+        children, returning the list of children and the offset that
+        follows them."""
+        count, offset = readVarint(self.data, offset)
+        children = []
+        for _ in range(count):
+            child, offset = self.readNode(offset, parent)
+            children.append(child)
+        return children, offset
+
+    def readNode(self, offset: int, parent):
+        data = self.data
+        flags = data[offset]
+        offset += 1
+        kind = flags & KIND_MASK
+        if kind != KIND_ELEMENT:
+            start, offset = readVarint(data, offset)
+            length, offset = readVarint(data, offset)
+            text = self.heap[start : start + length]
+            node = Text(text) if kind == KIND_TEXT else Comment(text)
+            node.parentNode = parent
+            return node, offset
+        strings = self.strings
+        index, offset = readVarint(data, offset)
+        name = strings[index]
+        if name in self.lazy and flags & HAS_CHILDREN:
+            node = LazyElement(name)
+        else:
+            node = Element(name)
+        node.parentNode = parent
+        if flags & HAS_ATTRIBUTES:
+            count, offset = readVarint(data, offset)
+            attributes = node.attributes
+            for _ in range(count):
+                key, offset = readVarint(data, offset)
+                value, offset = readVarint(data, offset)
+                attributes[strings[key]] = strings[value]
+        if flags & HAS_INDENT:
+            value, offset = readVarint(data, offset)
+            node.indent = (value >> 1) ^ -(value & 1)
+        if flags & HAS_START:
+            value, offset = readVarint(data, offset)
+            node.start = (value >> 1) ^ -(value & 1)
+        if flags & HAS_END:
+            value, offset = readVarint(data, offset)
+            node.end = (value >> 1) ^ -(value & 1)
+        if flags & HAS_NUMBER:
+            value, offset = readVarint(data, offset)
+            node.number = (value >> 1) ^ -(value & 1)
+        if flags & HAS_CHILDREN:
+            count, offset = readVarint(data, offset)
+            length, offset = readVarint(data, offset)
+            if node.__class__ is LazyElement:
+                node._pending = (self, count, offset)
+                offset += length
+            else:
+                children = node.childNodes
+                for _ in range(count):
+                    child, offset = self.readNode(offset, node)
+                    children.append(child)
+        return node, offset
+
+
+def readVarint(data: bytes, offset: int):
+    """Returns the varint at the given offset and the offset that follows."""
+    byte = data[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+    value = byte & 0x7F
+    shift = 7
+    while True:
+        offset += 1
+        byte = data[offset]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset + 1
+        shift += 7
+
+
+# ------------------------------------------------------------------------------
+#
+# LAZY ELEMENT
+#
+# ------------------------------------------------------------------------------
+
+# The slot that holds the children of elements
+CHILD_NODES = Element.childNodes
+
+
+class LazyElement(Element):
+    """An element whose children are loaded from the serialized data when
+    they are first accessed (see `loads`)."""
+
+    __slots__ = ("_pending",)
+
+    @property
+    def childNodes(self):
+        if self._pending:
+            reader, count, offset = self._pending
+            self._pending = None
+            children = CHILD_NODES.__get__(self)
+            for _ in range(count):
+                child, offset = reader.readNode(offset, self)
+                children.append(child)
+        return CHILD_NODES.__get__(self)
+
+    @childNodes.setter
+    def childNodes(self, children):
+        self._pending = None
+        CHILD_NODES.__set__(self, children)
+
+    @property
+    def isLoaded(self) -> bool:
+        """Tells if the children of this element were loaded."""
+        return not self._pending
+
+
+# EOF
@@ -0,0 +1,315 @@
+# -----------------------------------------------------------------------------
+# Project           :   Texto
+# -----------------------------------------------------------------------------
+# Author            :   Sebastien Pierre           <sebastien.pierre@gmail.com>
+# License           :   Revised BSD License
+# -----------------------------------------------------------------------------
+# Creation date     :   2026-10-17
+# Last mod.         :   2026-10-17
+# -----------------------------------------------------------------------------
+
+import os
+import sys
+import glob
+import argparse
+import json
+import hashlib
+import importlib.util
+from typing import Dict, List, Optional, Tuple
+from .command import EXTENSIONS, convert, convertAll, extendParser
+from .parser import Parser
+
+__doc__ = """Incrementally converts a directory of Texto files to another
+directory. A manifest written in the output directory records the hash of
+each source along with a fingerprint of the build settings and of the
+parser code, so that only the files whose inputs changed are converted
+again, and the outputs of deleted sources are removed."""
+
+# The name of the manifest file in the output directory
+MANIFEST = ".texto-manifest.json"
+# The extensions of the source files
+SOURCE_EXTENSIONS = (".txto",)
+
+# ------------------------------------------------------------------------------
+#
+# BUILD
+#
+# ------------------------------------------------------------------------------
+
+
+def build(
+    source: str,
+    output: str,
+    format: str = "html",
+    offsets=False,
+    jobs: int = 1,
+    extensions: List[str] = [],
+    parser: Optional[Parser] = None,
+    tree: str = "dom",
+) -> Tuple[List[str], List[str], List[str], Dict[str, str]]:
+    """Converts the sources of the `source` directory that changed since
+    the last build to the `output` directory, and removes the outputs of
+    the sources that were deleted. Returns the `(built, removed, unchanged)`
+    lists of source paths, relative to the source directory, along with
+    the `failed` sources mapped to their error.
+
+    A source that fails to convert is reported on the standard error and
+    converted again by the next build, and does not stop the conversion of
+    the other sources. The sources are converted by the given `parser` (or
+    by a parser with the given `extensions` and kind of `tree`) when they
+    are not converted in `jobs` processes."""
+    manifest = loadManifest(output)
+    fingerprint = getFingerprint(format, offsets, extensions)
+    previous = manifest.get("files", {})
+    # A change of settings or of the parser code rebuilds everything
+    current = previous if manifest.get("fingerprint") == fingerprint else {}
+    ext = EXTENSIONS.get(format, "." + format)
+    files: Dict[str, dict] = {}
+    changed = []
+    for path in listSources(source, output):
+        rel = os.path.relpath(path, source)
+        entry = current.get(rel) or {}
+        stat = os.stat(path)
+        # We only hash the sources that were modified since the last build
+        if entry.get("mtime") == stat.st_mtime_ns and entry.get("size") == stat.st_size:
+            digest = entry["hash"]
+        else:
+            digest = hashFile(path)
+        files[rel] = {
+            "hash": digest,
+            "output": os.path.splitext(rel)[0] + ext,
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+        }
+        if (
+            entry.get("hash") != digest
+            or entry.get("output") != files[rel]["output"]
+            or not os.path.exists(os.path.join(output, files[rel]["output"]))
+        ):
+            changed.append(rel)
+    # We remove the outputs of the deleted sources, and the previous
+    # outputs that are not produced anymore (when the format changes).
+    removed = [_ for _ in previous if _ not in files]
+    for rel, entry in previous.items():
+        if rel not in files or entry.get("output") != files[rel]["output"]:
+            removeOutput(output, entry.get("output"))
+    sources = [os.path.join(source, _) for _ in changed]
+    outputs = [os.path.join(output, files[_]["output"]) for _ in changed]
+    if jobs != 1 and len(changed) > 1:
+        results = convertAll(
+            sources, outputs, format, offsets, jobs, extensions, errors=True, tree=tree
+        )
+    else:
+        parser = parser or extendParser(Parser, extensions) or Parser(tree=tree)
+        results = (
+            convertOrFail(path, out, format, offsets, parser)
+            for path, out in zip(sources, outputs)
+        )
+    built = []
+    failed: Dict[str, str] = {}
+    try:
+        for rel, result in zip(changed, results):
+            if isinstance(result, Exception):
+                failed[rel] = "%s: %s" % (result.__class__.__name__, result)
+                print(f"texto: failed to convert {rel}: {failed[rel]}", file=sys.stderr)
+            else:
+                built.append(rel)
+    finally:
+        # The sources that failed to convert (or that were not converted)
+        # are left out of the manifest, so that the next build converts them
+        # again.
+        skipped = set(changed).difference(built)
+        saveManifest(
+            output,
+            fingerprint,
+            dict((k, v) for k, v in files.items() if k not in skipped),
+        )
+    unchanged = [_ for _ in files if _ not in built and _ not in failed]
+    return built, removed, unchanged, failed
+
+
+def convertOrFail(
+    path: str, output: str, format: str, offsets: bool, parser: Parser
+) -> Optional[Exception]:
+    """Converts the given file (see `convert`), returning the exception
+    raised by the conversion, if any."""
+    try:
+        convert(path, output, format, offsets, parser)
+    except Exception as e:
+        return e
+    return None
+
+
+def listSources(source: str, output: Optional[str] = None) -> List[str]:
+    """Returns the sorted paths of the source files in the given directory,
+    leaving out the output directory when it is inside of it."""
+    skipped = os.path.abspath(output) if output else None
+    paths = []
+    for parent, dirs, names in os.walk(source):
+        dirs[:] = sorted(
+            _ for _ in dirs if os.path.abspath(os.path.join(parent, _)) != skipped
+        )
+        for name in sorted(names):
+            if os.path.splitext(name)[1] in SOURCE_EXTENSIONS:
+                paths.append(os.path.join(parent, name))
+    return paths
+
+
+def removeOutput(output: str, path: Optional[str]):
+    """Removes the given output file, and its directories once empty."""
+    if not path or not os.path.exists(os.path.join(output, path)):
+        return
+    os.unlink(os.path.join(output, path))
+    parent = os.path.dirname(path)
+    while parent and not os.listdir(os.path.join(output, parent)):
+        os.rmdir(os.path.join(output, parent))
+        parent = os.path.dirname(parent)
+
+
+# ------------------------------------------------------------------------------
+#
+# MANIFEST
+#
+# ------------------------------------------------------------------------------
+
+
+def loadManifest(output: str) -> dict:
+    """Returns the manifest of the given output directory, or an empty
+    manifest when there is none or when it can't be read."""
+    path = os.path.join(output, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def saveManifest(output: str, fingerprint: str, files: Dict[str, dict]):
+    """Writes the manifest of the given output directory, replacing the
+    previous one only once it is fully written."""
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, MANIFEST)
+    with open(path + ".tmp", "wt") as f:
+        json.dump({"fingerprint": fingerprint, "files": files}, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def getFingerprint(format: str, offsets=False, extensions: List[str] = []) -> str:
+    """Returns a hash of the build settings, and of the code of texto and of
+    the given parser extensions, that produce the outputs."""
+    h = hashlib.sha256()
+    h.update(json.dumps([format, offsets, list(extensions)]).encode())
+    base = os.path.dirname(os.path.abspath(__file__))
+    paths = sorted(glob.glob(os.path.join(base, "**", "*.py"), recursive=True))
+    for ext in extensions:
+        if os.path.exists(ext):
+            paths.append(ext)
+        else:
+            spec = importlib.util.find_spec(ext)
+            if spec and spec.origin and os.path.exists(spec.origin):
+                paths.append(spec.origin)
+    for path in paths:
+        h.update(hashFile(path).encode())
+    return h.hexdigest()
+
+
+def hashFile(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ------------------------------------------------------------------------------
+#
+# COMMAND-LINE INTERFACE
+#
+# ------------------------------------------------------------------------------
+
+
+def run(args=sys.argv[1:]):
+    """The command-line interface of `texto build`."""
+    oparser = createArgumentParser("texto build", __doc__)
+    oparser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        dest="jobs",
+        default=1,
+        help="Converts the files in the given number of processes (0 for all cores)",
+    )
+    args = oparser.parse_args(args=args)
+    if not os.path.isdir(args.source):
+        oparser.error(f"Source directory does not exist: {args.source}")
+    built, removed, unchanged, failed = build(
+        args.source,
+        args.output,
+        args.format,
+        args.offsets,
+        args.jobs or None,
+        args.extensions,
+        tree=args.tree,
+    )
+    print(
+        f"texto: built {len(built)}, removed {len(removed)}, "
+        f"unchanged {len(unchanged)}, failed {len(failed)}",
+        file=sys.stderr,
+    )
+    if failed:
+        sys.exit(1)
+
+
+def createArgumentParser(prog: str, description: str) -> argparse.ArgumentParser:
+    """Returns the parser of the arguments shared by `texto build` and
+    `texto watch`."""
+    oparser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+    )
+    oparser.add_argument(
+        "source", metavar="SRC_DIR", type=str, help="The directory of the sources"
+    )
+    oparser.add_argument(
+        "output", metavar="OUT_DIR", type=str, help="The directory of the outputs"
+    )
+    oparser.add_argument(
+        "-t",
+        "--type",
+        type=str,
+        dest="format",
+        default="html",
+        help="The format type to be output",
+    )
+    oparser.add_argument(
+        "-f",
+        "--offsets",
+        dest="offsets",
+        action="store_true",
+        default=False,
+        help="Outputs offsets in source file (HTML, XML)",
+    )
+    oparser.add_argument(
+        "-x",
+        "--ext",
+        dest="extensions",
+        nargs="+",
+        default=[],
+        help="Uses the given extension (Python module name)",
+    )
+    oparser.add_argument(
+        "--tree",
+        type=str,
+        dest="tree",
+        choices=("dom", "native"),
+        default="dom",
+        help="The document tree the parser creates: dom (xml.dom.minidom, the "
+        "default) or native (texto.tree, faster)",
+    )
+    return oparser
+
+
+# EOF
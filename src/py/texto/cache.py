@@ -0,0 +1,239 @@
+# -----------------------------------------------------------------------------
+# Project           :   Texto
+# -----------------------------------------------------------------------------
+# Author            :   Sebastien Pierre           <sebastien.pierre@gmail.com>
+# License           :   Revised BSD License
+# -----------------------------------------------------------------------------
+# Creation date     :   2026-10-17
+# Last mod.         :   2026-10-17
+# -----------------------------------------------------------------------------
+
+import os
+import time
+import zlib
+import marshal
+import sqlite3
+import hashlib
+import threading
+import weakref
+from array import array
+from collections import OrderedDict
+from typing import Optional
+from .parser import Parser, ParsingContext, OffsetTable
+from .tree import Element
+from . import binary
+
+__doc__ = """\
+The `cache` module keeps the results of `Parser.parse` so that a text that
+was already parsed (in this process or by another one) is not parsed again.
+Results are keyed by the hash of the text, the `offsets` option and the
+fingerprint of the parser (see `Parser.getFingerprint`), and are stored as
+compressed binary trees (see `texto.binary`) in two tiers:
+
+- an in-memory LRU tier, bounded by a number of entries,
+- an optional on-disk tier, an sqlite database in a cache directory that
+  can be shared by several processes, bounded by a size in bytes, and from
+  which the least recently used entries are evicted.
+
+Each lookup returns a new document, so that the results can be modified.
+Only the parsers that create native trees (see `texto.tree`) in their own
+document, and that do not profile, are cached, which is why the default
+parser of the cache is `Parser(tree="native")`.
+
+```python
+cache = ParseCache(".texto-cache")
+context = cache.parse(text)
+```
+"""
+
+# The version of the serialized trees, which is part of the keys
+FORMAT_VERSION = 2
+# The name of the database file in the cache directory
+DATABASE = "parse.sqlite"
+
+# ------------------------------------------------------------------------------
+#
+# PARSE CACHE
+#
+# ------------------------------------------------------------------------------
+
+
+class ParseCache:
+    """Caches parse results in memory (up to `size` entries) and, when a
+    `path` is given, in the sqlite database of that directory (up to
+    `maxBytes` bytes of serialized trees)."""
+
+    def __init__(self, path: Optional[str] = None, size=128, maxBytes=256 << 20):
+        self.path = path
+        self.size = size
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        # The fingerprints of the parsers, as parsers are usually reused for
+        # many texts.
+        self._fingerprints = weakref.WeakKeyDictionary()
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._db = sqlite3.connect(
+                os.path.join(path, DATABASE), timeout=30, check_same_thread=False
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, data BLOB, size INTEGER, used REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS entries_used ON entries (used)"
+            )
+            self._db.commit()
+
+    def parse(
+        self, text: str, offsets=False, parser: Optional[Parser] = None
+    ) -> ParsingContext:
+        """Returns the result of `parser.parse(text, offsets)`, from the cache
+        when the text was already parsed by a parser with the same
+        fingerprint."""
+        parser = parser or Parser(tree="native")
+        if not self.isCacheable(parser):
+            return parser.parse(text, offsets)
+        key = self.getKey(text, offsets, parser)
+        data = self.get(key)
+        if data is not None:
+            return loadContext(data, text, offsets, parser)
+        context = parser.parse(text, offsets)
+        self.put(key, dumpContext(context))
+        return context
+
+    def isCacheable(self, parser: Parser) -> bool:
+        # Profiling parsers are not cached, so that they always record stats
+        return (
+            parser.tree == "native"
+            and not (parser.document or parser.root)
+            and not parser.profile
+        )
+
+    def getKey(self, text: str, offsets: bool, parser: Parser) -> str:
+        fingerprint = self._fingerprints.get(parser)
+        if fingerprint is None:
+            fingerprint = self._fingerprints[parser] = parser.getFingerprint()
+        h = hashlib.sha256(text.encode("utf8"))
+        h.update(("%s:%s:%s" % (FORMAT_VERSION, offsets, fingerprint)).encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the serialized result stored with the given key, looking
+        in memory first and then on disk."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            elif self._db:
+                row = self._db.execute(
+                    "SELECT data FROM entries WHERE key=?", (key,)
+                ).fetchone()
+                if row:
+                    data = row[0]
+                    self._db.execute(
+                        "UPDATE entries SET used=? WHERE key=?", (time.time(), key)
+                    )
+                    self._db.commit()
+                    self._remember(key, data)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes):
+        with self._lock:
+            self._remember(key, data)
+            if self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                    (key, data, len(data), time.time()),
+                )
+                self._evict()
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db:
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.size:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        """Removes the least recently used entries from the database until
+        the entries fit in `maxBytes`."""
+        total = self._db.execute("SELECT SUM(size) FROM entries").fetchone()[0] or 0
+        if total <= self.maxBytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM entries ORDER BY used")
+        removed = []
+        for key, size in rows:
+            if total <= self.maxBytes:
+                break
+            removed.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM entries WHERE key=?", removed)
+
+
+# ------------------------------------------------------------------------------
+#
+# SERIALIZATION
+#
+# ------------------------------------------------------------------------------
+
+
+def dumpContext(context: ParsingContext) -> bytes:
+    """Serializes the document, offsets and metadata of the given parse
+    result."""
+    offsets = context.offsets
+    offsets = None if offsets is None else offsets.data.tobytes()
+    data = (FORMAT_VERSION, binary.dumps(context.document), offsets, context.meta)
+    return zlib.compress(marshal.dumps(data), 1)
+
+
+def loadContext(
+    data: bytes, text: str, offsets=False, parser: Optional[Parser] = None
+) -> ParsingContext:
+    """Returns a parse result of the given text out of the serialized
+    result. The result has the document, offsets and metadata of a parsed
+    one, but no parsing state (and thus can't be reparsed)."""
+    version, tree, offsetData, meta = marshal.loads(zlib.decompress(data))
+    assert version == FORMAT_VERSION, "Unsupported cache format: %s" % (version)
+    context = ParsingContext(text, markOffsets=offsets, parser=parser)
+    context.parser = parser
+    document = binary.loads(tree)
+    context.document = document
+    context.rootNode = document.documentElement
+    for name in ("header", "content", "references", "appendices"):
+        for node in context.rootNode.childNodes:
+            if node.nodeName == name:
+                break
+        else:
+            node = Element(name)
+        setattr(context, name, node)
+    context.currentNode = context.content
+    if offsetData is not None:
+        table = array("l")
+        table.frombytes(offsetData)
+        context.offsets = OffsetTable(table)
+    context.meta = meta
+    return context
+
+
+# EOF
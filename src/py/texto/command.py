@@ -11,14 +11,23 @@
 import os
 import sys
 import argparse
-from typing import Optional, List
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, List, Union
 from .formats import html, json, lout, markdown, twiki
 from .parser import Parser, ParsingContext
+from .cache import ParseCache
+from .stats import Stats
+from .tree import toDOM
 
 __doc__ = """Texto is an advanced markup text processor, which can be used as
 an embedded processor in any application. It is fast, extensible and outputs an
 XML DOM.
 
+Run `texto build SRC_DIR OUT_DIR` to convert only the files of a directory
+that changed since the last build, and `texto watch SRC_DIR OUT_DIR` to
+convert them as they change.
+
 See <http://www.github.com/sebastien/texto>
 """
 
@@ -35,12 +44,36 @@ FORMATS = {
 FORMATS["xml"] = True
 FORMATS["dom"] = True
 FORMATS["md"] = FORMATS.get("markdown")
+# The formats that can be rendered while parsing (see `stream`)
+STREAM_FORMATS = ("html",)
+# The extensions of the files written in the output directory by format
+EXTENSIONS = {
+    "xml": ".xml",
+    "dom": ".xml",
+    "md": ".md",
+    "json": ".json",
+    "lout": ".lout",
+    "twiki": ".twiki",
+    "html": ".html",
+}
+# The parser of a worker process, which is reused for all the files the
+# worker converts (see `convertAll`)
+WORKER_PARSER: Optional[Parser] = None
+WORKER_CACHE: Optional[ParseCache] = None
 
 
 def run(args=sys.argv[1:], name=None):
     """The command-line interface of this module."""
     if type(args) not in (type([]), type(())):
         args = [args]
+    if args and args[0] == "build":
+        from . import build
+
+        return build.run(args[1:])
+    elif args and args[0] == "watch":
+        from . import watch
+
+        return watch.run(args[1:])
     oparser = argparse.ArgumentParser(
         prog="texto",
         description=__doc__,
@@ -85,6 +118,47 @@ def run(args=sys.argv[1:], name=None):
         default=False,
         help="Outputs offsets in source file (HTML, XML)",
     )
+    oparser.add_argument(
+        "-s",
+        "--stream",
+        dest="stream",
+        action="store_true",
+        default=False,
+        help="Renders blocks as they are parsed, in bounded memory (HTML)",
+    )
+    oparser.add_argument(
+        "-d",
+        "--output-dir",
+        type=str,
+        dest="outputDir",
+        default=None,
+        help="Writes each file to the given directory, with the format extension",
+    )
+    oparser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        dest="jobs",
+        default=1,
+        help="Converts the files in the given number of processes (0 for all cores)",
+    )
+    oparser.add_argument(
+        "-c",
+        "--cache",
+        type=str,
+        dest="cache",
+        default=None,
+        help="Reuses the parse results stored in the given cache directory",
+    )
+    oparser.add_argument(
+        "-p",
+        "--profile",
+        type=str,
+        dest="profile",
+        default=None,
+        help="Writes the time spent by each parser and handler to the given file, "
+        "as JSON if it ends with .json (or is -), as collapsed stacks otherwise",
+    )
     oparser.add_argument(
         "-x",
         "--ext",
@@ -93,31 +167,215 @@ def run(args=sys.argv[1:], name=None):
         default=[],
         help="Uses the given extension (Python module name)",
     )
+    oparser.add_argument(
+        "--tree",
+        type=str,
+        dest="tree",
+        choices=("dom", "native"),
+        default=None,
+        help="The document tree the parser creates: dom (xml.dom.minidom) or "
+        "native (texto.tree, faster). Defaults to native with --cache, as only "
+        "native trees are cached, and to dom otherwise",
+    )
     # We create the parse and register the options
     args = oparser.parse_args(args=args)
+    if args.stream and (args.offsets or args.format not in STREAM_FORMATS):
+        oparser.error(
+            f"--stream only supports {', '.join(STREAM_FORMATS)} output, "
+            "without offsets"
+        )
+    inputs = args.files or ["-"]
+    jobs = os.cpu_count() if args.jobs == 0 else args.jobs
+    if jobs > 1 and args.stream:
+        oparser.error("--jobs can't be combined with --stream")
+    if "-" in inputs and (jobs > 1 or args.outputDir):
+        oparser.error("--jobs and --output-dir need files, not the standard input")
+    if args.profile and (jobs > 1 or args.stream):
+        oparser.error("--profile can't be combined with --jobs or --stream")
     out_path = args.output if args.output and args.output != "-" else None
     out = open(out_path, "wt") if out_path else sys.stdout
-    parser = extendParser(Parser, args.extensions or [])
-    inputs = args.files or ["-"]
-    for _ in inputs:
-        if _ == "-":
-            data = sys.stdin.read()
+    tree = args.tree or ("native" if args.cache else "dom")
+    parser = extendParser(Parser, args.extensions or []) or Parser(
+        tree=tree, profile=bool(args.profile)
+    )
+    stats = Stats() if args.profile else None
+    cache = ParseCache(args.cache) if args.cache and jobs <= 1 else None
+    outputs = (
+        outputPaths(inputs, args.outputDir, args.format)
+        if args.outputDir
+        else [None] * len(inputs)
+    )
+    if jobs > 1:
+        for r in convertAll(
+            inputs,
+            outputs,
+            args.format,
+            args.offsets,
+            jobs,
+            args.extensions,
+            args.cache,
+            tree=tree,
+        ):
+            if r is not None:
+                out.write(r)
+    else:
+        for _, output in zip(inputs, outputs):
+            if args.stream:
+                target = openOutput(output) if output else out
+                if _ == "-":
+                    stream(sys.stdin, target.write, args.format, parser)
+                else:
+                    with open(_) as f:
+                        stream(f, target.write, args.format, parser)
+                if output:
+                    target.close()
+            else:
+                convert(
+                    _, output, args.format, args.offsets, parser, out, cache, stats
+                )
+    if cache:
+        cache.close()
+    if stats:
+        if args.profile == "-":
+            stats.dump(sys.stderr)
         else:
-            with open(_) as f:
-                data = f.read()
-        result = parse(data, offsets=args.offsets, parser=parser)
-        r = render(result, args.format)
-        out.write(r)
+            with open(args.profile, "wt") as f:
+                stats.dump(f, "json" if args.profile.endswith(".json") else "collapsed")
     if out_path:
         out.close()
 
 
-def render(result: ParsingContext, format: str = "html"):
+def convert(
+    path: str,
+    output: Optional[str] = None,
+    format: str = "html",
+    offsets=False,
+    parser: Optional[Parser] = None,
+    writer=None,
+    cache: Optional[ParseCache] = None,
+    stats: Optional[Stats] = None,
+) -> Optional[str]:
+    """Parses and renders the file at the given path (`-` for the standard
+    input), using the given parse `cache` if any. The rendering is written
+    to the `output` path or to the `writer` when given, and returned
+    otherwise. When `stats` are given, the stats of the parsing (if the
+    parser profiles) and of the rendering are added to them."""
+    if path == "-":
+        data = sys.stdin.read()
+    else:
+        with open(path) as f:
+            data = f.read()
+    result = parse(data, offsets=offsets, parser=parser, cache=cache)
+    if stats is not None and result.stats:
+        stats.merge(result.stats)
+    if output:
+        with openOutput(output) as f:
+            render(result, format, f, stats)
+    elif writer is not None:
+        render(result, format, writer, stats)
+    else:
+        return render(result, format, stats=stats)
+    return None
+
+
+def convertAll(
+    paths: List[str],
+    outputs: Optional[List[Optional[str]]] = None,
+    format: str = "html",
+    offsets=False,
+    jobs: Optional[int] = None,
+    extensions: List[str] = [],
+    cache: Optional[str] = None,
+    errors=False,
+    tree: str = "dom",
+) -> Iterator[Union[str, None, Exception]]:
+    """Converts the given files in a pool of `jobs` processes (see `convert`),
+    yielding the renderings in the order of the given paths, or `None` for
+    the files written to their output path. Each process creates its parser
+    once, with the given kind of `tree`, along with a parse cache when a
+    `cache` directory is given, and the files are sent to the processes in
+    chunks.
+
+    When `errors` is set, the files that fail to convert yield their
+    exception instead of stopping the conversion of the other files."""
+    outputs = outputs or [None] * len(paths)
+    work = [(path, output, format, offsets) for path, output in zip(paths, outputs)]
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        jobs, initializer=_initWorker, initargs=(list(extensions), cache, tree)
+    ) as pool:
+        yield from pool.map(
+            functools.partial(_convertInWorker, errors=errors),
+            work,
+            chunksize=max(1, len(work) // (jobs * 4)),
+        )
+
+
+def _initWorker(extensions: List[str], cache: Optional[str] = None, tree="dom"):
+    global WORKER_PARSER, WORKER_CACHE
+    WORKER_PARSER = extendParser(Parser, extensions) or Parser(tree=tree)
+    WORKER_CACHE = ParseCache(cache) if cache else None
+
+
+def _convertInWorker(work, errors=False) -> Union[str, None, Exception]:
+    path, output, format, offsets = work
+    try:
+        return convert(
+            path, output, format, offsets, WORKER_PARSER, None, WORKER_CACHE
+        )
+    except Exception as e:
+        if not errors:
+            raise
+        return e
+
+
+def openOutput(path: str):
+    """Opens the given output file for writing, creating its directory."""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    return open(path, "wt")
+
+
+def outputPaths(paths: List[str], outputDir: str, format: str = "html") -> List[str]:
+    """Returns the paths of the files of the output directory to which the
+    given files are converted. The files keep their location relative to the
+    deepest directory that contains them all, with the format extension."""
+    paths = [os.path.abspath(_) for _ in paths]
+    base = os.path.commonpath([os.path.dirname(_) for _ in paths]) if paths else ""
+    ext = EXTENSIONS.get(format, "." + format)
+    return [
+        os.path.join(outputDir, os.path.splitext(os.path.relpath(_, base))[0] + ext)
+        for _ in paths
+    ]
+
+
+def render(
+    result: ParsingContext,
+    format: str = "html",
+    writer=None,
+    stats: Optional[Stats] = None,
+):
+    """Renders the parsed document in the given format. The rendering is
+    returned as a string, unless a `writer` (a file-like object or a list,
+    see `Processor.render`) is given, in which case it is written to it
+    as it is produced. The calls of the format handlers are recorded in the
+    given `stats`, if any. The `dom` format returns a DOM document, which is
+    written as XML when a `writer` is given."""
     xml_document = result.document
-    if format == "dom":
-        return xml_document
-    elif format == "xml":
-        return xml_document.toprettyxml("  ")
+    if format in ("dom", "xml"):
+        if format == "xml":
+            text = xml_document.toprettyxml("  ")
+        elif writer is None:
+            return toDOM(xml_document)
+        else:
+            text = toDOM(xml_document).toxml()
+        if writer is None:
+            return text
+        elif isinstance(writer, list):
+            writer.append(text)
+        else:
+            writer.write(text)
     elif format in FORMATS:
         # We use the dynamic formatters to dispatch that
         variables = {}
@@ -132,15 +390,42 @@ def render(result: ParsingContext, format: str = "html"):
                     "\n<link rel='stylesheet' type='text/css' href='%s' />" % (css_path)
                 )
         processor = FORMATS[format].processor
-        return processor.generate(xml_document, False, variables) or ""
+        if writer is None:
+            return processor.generate(xml_document, False, variables, stats) or ""
+        else:
+            processor.render(xml_document, writer, False, variables, stats)
     else:
         raise RuntimeError(
             f"Unknown output format: {format}, choose one of {', '.join(FORMATS.keys())}"
         )
 
 
-def parse(text: str, offsets=False, parser: Optional[Parser] = None) -> ParsingContext:
+def stream(
+    source, write, format: str = "html", parser: Optional[Parser] = None
+) -> None:
+    """Parses the given text or stream and passes its rendering to `write`
+    as the blocks are parsed, so that only the open sections are kept in
+    memory (see `Parser.iterparse`)."""
+    if format not in STREAM_FORMATS:
+        raise RuntimeError(
+            f"Unsupported streaming format: {format}, choose one of {', '.join(STREAM_FORMATS)}"
+        )
+    parser = parser or Parser()
+    events = parser.iterparse(
+        source, events=("open", "start", "end", "text", "comment")
+    )
+    FORMATS[format].processor.stream(events, write, False, {"LEVEL": 0})
+
+
+def parse(
+    text: str,
+    offsets=False,
+    parser: Optional[Parser] = None,
+    cache: Optional[ParseCache] = None,
+) -> ParsingContext:
     parser = parser or Parser()
+    if cache:
+        return cache.parse(text, offsets, parser)
     result = parser.parse(text, offsets=offsets)
     return result
 
@@ -11,10 +11,15 @@
 import os
 import glob
 import re
+import functools
+import threading
 import xml.dom
 
 
 RE_EXPRESSION = re.compile(r"\$\(([^\)]+)\)")
+# Stands for the streamed children of an element when it is rendered around
+# them (see `Processor.stream`), followed by a number.
+STREAM_MARKER = "\x00STREAM"
 
 __doc__ = """\
 The `formats` module implements a simple way to convert an XML document to another
@@ -49,16 +54,47 @@ will be expanded by processing the set of nodes indicated by the XXX expression.
 
 class Processor(object):
     """The processor is the core of the template engine. It registers handlers
-    to handle elements on a by-name basis."""
+    to handle elements on a by-name basis.
+
+    The state of a rendering is held by a `RenderContext` that each
+    `generate`, `render` and `stream` call creates for the current thread,
+    so that a processor can render several documents at once."""
 
     def __init__(self, module=None, default=None):
         self.expressionTable = {}
-        self.variables = {}
         self._defaultProcess = default
+        # Maps `(nodeName, selector)` to the function that processes the
+        # element, or `None` for the default processing. This is reset
+        # whenever functions are registered.
+        self._dispatch = {}
+        # Holds the render context of the current thread
+        self._local = RenderLocal()
         self.bindInstance(self)
         if module:
             self.bindModule(module)
 
+    @property
+    def context(self):
+        """The `RenderContext` of the current rendering in this thread, or a
+        default one when the processor is used outside of a rendering."""
+        return self._local.context
+
+    @property
+    def variables(self):
+        return self.context.variables
+
+    @variables.setter
+    def variables(self, variables):
+        self.context.variables = variables
+
+    @property
+    def bodyOnly(self):
+        return self.context.bodyOnly
+
+    @bodyOnly.setter
+    def bodyOnly(self, bodyOnly):
+        self.context.bodyOnly = bodyOnly
+
     def bindModule(self, module):
         # FIXME: legacy
         symbols = [_ for _ in dir(module) if _.startswith("convert")]
@@ -93,6 +129,7 @@ class Processor(object):
                 ename = name
             ename = ename.replace("__", ":")
             self.expressionTable[ename] = function
+        self._dispatch.clear()
 
     def registerElementProcessor(self, function, elementName, variant=None):
         """Registers the given function to process the given element name and
@@ -103,6 +140,7 @@ class Processor(object):
         if variant:
             elementName += ":" + variant
         self.expressionTable[elementName] = function
+        self._dispatch.clear()
 
     def resolveSet(self, element, names):
         """Resolves the set of names in the given element. When ["Paragraph"] is
@@ -112,6 +150,8 @@ class Processor(object):
         s = []
         if len(names) == 1:
             name = names[0]
+            if name == "*":
+                return list(element.childNodes)
             for child in element.childNodes:
                 if name != "*" and not child.nodeType == xml.dom.Node.ELEMENT_NODE:
                     continue
@@ -136,10 +176,18 @@ class Processor(object):
         if selector and selector[-1] == "?":
             selector = selector[:-1]
             selector_optional = True
+        return self._processElement(element, selector, selector_optional)
+
+    def _processElement(self, element, selector, isSelectorOptional):
+        stubs = self._local.context.stubs
+        if stubs:
+            stub = stubs.get(id(element))
+            if stub:
+                return stub(element, selector + "?" if isSelectorOptional else selector)
         if element.nodeType == xml.dom.Node.TEXT_NODE:
-            return self.processTextNode(element, selector, selector_optional)
+            return self.processTextNode(element, selector, isSelectorOptional)
         elif element.nodeType == xml.dom.Node.ELEMENT_NODE:
-            return self.processElementNode(element, selector, selector_optional)
+            return self.processElementNode(element, selector, isSelectorOptional)
         else:
             return ""
 
@@ -158,9 +206,28 @@ class Processor(object):
         self, element: xml.dom.Node, selector: str, isSelectorOptional=False
     ):
         """"""
-        # FIXME: Monkey patching objects is not ideal
-        element._processor = self
-        fname = element.nodeName.replace("-", "_")
+        key = (element.nodeName, selector)
+        try:
+            func = self._dispatch[key]
+        except KeyError:
+            func = self._dispatch[key] = self.resolveElementProcessor(*key)
+        # There is a function for the element in the EXPRESSION TABLE
+        if func:
+            stats = self._local.context.stats
+            if stats is None:
+                return func(element)
+            name = "%s:%s" % key if selector else key[0]
+            return stats.call("format:" + name, func, element)
+        elif isSelectorOptional:
+            return self.processElement(element)
+        # Otherwise we simply expand its text
+        else:
+            return self.defaultProcessElement(element, selector)
+
+    def resolveElementProcessor(self, nodeName, selector=None):
+        """Returns the function registered to process the elements with the
+        given name and selector, or `None`."""
+        fname = nodeName.replace("-", "_")
         if selector:
             fname += ":" + selector
         func = self.expressionTable.get(fname)
@@ -168,14 +235,13 @@ class Processor(object):
         # without the variant
         if not func:
             func = self.expressionTable.get(fname.split(":")[0])
-        # There is a function for the element in the EXPRESSION TABLE
-        if func:
-            return func(element)
-        elif isSelectorOptional:
-            self.processElement(element)
-        # Otherwise we simply expand its text
-        else:
-            return self.defaultProcessElement(element, selector)
+        return func or None
+
+    def countStreamed(self, element, names):
+        """Returns the number of children with one of the given names that
+        were streamed out of the given element and detached from it."""
+        counts = self.context.streamed.get(id(element))
+        return sum(counts.get(_, 0) for _ in names) if counts else 0
 
     def processTextNode(self, element, selector, isSelectorOptional=False) -> str:
         """Returns the text node"""
@@ -186,7 +252,7 @@ class Processor(object):
         if self._defaultProcess:
             return self._defaultProcess(element, selector, self)
         else:
-            return "".join([self.processElement(e) for e in element.childNodes])
+            return self.process(element, "$(*)")
 
     def first(self, element, expression):
         r = self.query(element, expression)
@@ -196,54 +262,386 @@ class Processor(object):
         """Queries the given expression at the given element, returning
         matching (element,selector) couples."""
         assert self.expressionTable
+        names, selector, optional = parseExpression(expression)
         # =VARIABLE means that we replace the expression by the content of the
         # variable in the variables directory
-        if expression.startswith("="):
-            vname = expression[1:].upper()
-            return [(self.variables.get(vname) or "", None)]
-        # Otherwise, the expression is a node selection expression, which may also
-        # have a selector
-        elif expression.rfind(":") != -1:
-            names, selector = expression.split(":")
-        # There may be no selector as well
-        else:
-            names = expression
-            selector = None
-        names = names.split("/")
+        if names is None:
+            return [(self.variables.get(selector) or "", None)]
+        if optional:
+            selector += "?"
         return [(_, selector) for _ in self.resolveSet(element, names)]
 
     # SYNTAX: $(EXPRESSION)
     # Where EXPRESSION is a "/" separated list of element names, optionally followed
     # by a colon ':' and a name
     def process(self, element, template: str):
-        """Expands the given template string with the given element as data."""
-        i = 0
-        r = ""
-        while i < len(template):
-            m = RE_EXPRESSION.search(template, i)
-            if m:
-                r += template[i : m.start()]
-                # Call the query with the template expression
-                for e, s in self.query(element, m.group(1)):
-                    r += e if isinstance(e, str) else self.processElement(e, s)
-                i = m.end()
+        """Expands the given template string with the given element as data.
+        The template is compiled once (see `compileTemplate`)."""
+        # When rendering to a writer, the output is written instead of
+        # being returned (see `render`).
+        write = self._local.context.write
+        if write is None:
+            r = []
+            write = r.append
+        else:
+            r = None
+        for op in compileTemplate(template):
+            if op.__class__ is str:
+                write(op)
             else:
-                r += template[i:]
-                break
-        return r
-
-    def generate(self, xmlDocument, bodyOnly=False, variables={}):
+                names, selector, optional = op
+                if names is None:
+                    write(self.variables.get(selector) or "")
+                else:
+                    for e in self.resolveSet(element, names):
+                        write(self._processElement(e, selector, optional))
+        return "" if r is None else "".join(r)
+
+    def generate(self, xmlDocument, bodyOnly=False, variables={}, stats=None):
+        """Returns the rendering of the given document. When a `Stats` object
+        is given (see `texto.stats`), the calls of the element handlers are
+        recorded in it."""
+        previous = self._enter(RenderContext(variables, bodyOnly, stats=stats))
+        try:
+            if stats:
+                return stats.call("render", self.processDocument, xmlDocument)
+            return self.processDocument(xmlDocument)
+        finally:
+            self._local.context = previous
+
+    def processDocument(self, xmlDocument):
+        """Processes the given document within the current render context.
+        This is what processors override to customize the processing of the
+        whole document."""
         node = xmlDocument.getElementsByTagName("document")[0]
-        self.variables = variables
-        # FIXME: Not ideal for multithreading
-        self.bodyOnly = bodyOnly
-        if bodyOnly:
+        if self.bodyOnly:
             for child in node.childNodes:
                 if child.nodeName == "content":
                     return self.processElement(node)
         else:
             return self.processElement(node)
 
+    def render(self, xmlDocument, writer, bodyOnly=False, variables={}, stats=None):
+        """Like `generate`, but passes the output to the given `writer` as it
+        is produced instead of returning it. The writer is either a file-like
+        object with a `write` method (an `io.TextIOBase`, a socket file), a
+        list to which the fragments are appended, or a function.
+
+        The templates expanded by `process` are then written directly, and
+        `process` returns an empty string: handlers that return
+        `self.process(...)` write their output, and the output is not copied
+        again by each parent element. Handlers that need the output of
+        `process` as a string must get it through `capture`."""
+        if isinstance(writer, list):
+            write = writer.append
+        else:
+            write = getattr(writer, "write", writer)
+        previous = self._enter(RenderContext(variables, bodyOnly, write, stats))
+        try:
+            if stats:
+                result = stats.call("render", self.processDocument, xmlDocument)
+            else:
+                result = self.processDocument(xmlDocument)
+            if result:
+                write(result)
+        finally:
+            self._local.context = previous
+
+    def capture(self, function, *args):
+        """Calls the given function with the given arguments and returns the
+        output it produces as a string, even when rendering to a writer."""
+        context = self.context
+        previous = context.write
+        context.write = None
+        try:
+            return function(*args)
+        finally:
+            context.write = previous
+
+    def _enter(self, context):
+        """Makes the given render context the current one in this thread,
+        returning the previous one, which is restored once done."""
+        previous = self._local.context
+        self._local.context = context
+        return previous
+
+    # STREAMING________________________________________________________________
+
+    def stream(self, events, write, bodyOnly=False, variables={}):
+        """Renders the document given as the `(event, node)` pairs of
+        `Parser.iterparse`, including the "open" events, passing the output
+        to `write` as it is produced. The output is the same as `generate`.
+
+        An element that is started before it is complete is rendered around
+        its children: the output that precedes its first streamed child is
+        written first, and its children are then rendered as they complete.
+        A child that the template of the element does not expand right after
+        the previous one is deferred until the element is complete."""
+        previous = self._enter(RenderContext(variables, bodyOnly))
+        try:
+            self._stream(events, write)
+        finally:
+            self._local.context = previous
+
+    def _stream(self, events, write):
+        frames = []
+        # The complete node whose events we skip until its end
+        skipped = None
+        is_open = False
+        for event, node in events:
+            if skipped:
+                if event == "end" and node is skipped:
+                    self._streamChild(frames[-1], node)
+                    skipped = None
+            elif event == "open":
+                is_open = True
+            elif event == "start":
+                if not is_open:
+                    skipped = node
+                elif frames:
+                    frames.append(self._streamChild(frames[-1], node, True))
+                else:
+                    frames.append(StreamFrame(node, None, write))
+                is_open = False
+            elif event == "end":
+                self._closeStreamed(frames.pop())
+            else:
+                self._streamChild(frames[-1], node)
+
+    def _streamChild(self, frame, node, isOpen=False):
+        """Renders the given child of the element of the given frame once it
+        is complete, or returns a new frame for it when it is open."""
+        if frame.hole:
+            text, selectors = self._renderStreamed(
+                frame,
+                [frame.hole] + [_[0] for _ in frame.deferred] + [node],
+                {id(frame.hole): 0, id(node): 1},
+            )
+            selector = selectors.get(id(node), False)
+            if selector is False:
+                # The template does not render the child
+                pass
+            elif not self._isStreamedNext(text):
+                frame.deferred.append([node, None])
+                if isOpen:
+                    return StreamFrame(node, selector, None, frame, [])
+                return None
+        elif isOpen:
+            # The first open child is where the streamed children go
+            text, selectors = self._renderStreamed(
+                frame, frame.pending + [node], {id(node): 0}
+            )
+            selector = selectors.get(id(node), False)
+            if selector is not False:
+                frame.write(text.split(STREAM_MARKER)[0])
+                self._countStreamed(frame, frame.pending)
+                frame.pending = []
+                frame.hole = node
+        elif frame.pending:
+            # So is the last pending child, when the template expands the
+            # next one right after it.
+            last = frame.pending[-1]
+            text, selectors = self._renderStreamed(
+                frame, frame.pending + [node], {id(last): 0, id(node): 1}
+            )
+            if not self._isStreamedNext(text):
+                frame.pending.append(node)
+                return None
+            frame.write(text.split(STREAM_MARKER)[0])
+            self._countStreamed(frame, frame.pending[:-1])
+            frame.write(
+                self._renderStreamed(frame, [last], None, last, selectors[id(last)])
+            )
+            self._countStreamed(frame, [last])
+            frame.pending = []
+            frame.hole = last
+            selector = selectors[id(node)]
+        else:
+            frame.pending.append(node)
+            return None
+        if isOpen:
+            write = None if selector is False else frame.write
+            return StreamFrame(node, selector, write, frame)
+        elif selector is not False:
+            frame.write(self.processElement(node, selector) or "")
+        self._countStreamed(frame, [node])
+        return None
+
+    def _closeStreamed(self, frame):
+        """Writes the output of the element of the given frame that follows
+        its streamed children, once it is complete."""
+        element = frame.node
+        if frame.hole:
+            text, selectors = self._renderStreamed(
+                frame,
+                [frame.hole] + [_[0] for _ in frame.deferred],
+                {id(frame.hole): 0},
+            )
+            frame.write(text.split(STREAM_MARKER + "0", 1)[-1])
+        # Like `generate`, we render nothing when only the body is requested
+        # and there is no content.
+        elif (
+            frame.parent
+            or not self.bodyOnly
+            or any(_.nodeName == "content" for _ in frame.pending)
+        ):
+            frame.write(self._renderStreamed(frame, frame.pending))
+        self.context.streamed.pop(id(element), None)
+        if frame.buffer is not None:
+            for deferred in frame.parent.deferred:
+                if deferred[0] is element:
+                    deferred[1] = "".join(frame.buffer)
+        elif frame.parent:
+            self._countStreamed(frame.parent, [element])
+
+    def _countStreamed(self, frame, nodes):
+        counts = self.context.streamed.setdefault(id(frame.node), {})
+        for node in nodes:
+            counts[node.nodeName] = counts.get(node.nodeName, 0) + 1
+
+    def _isStreamedNext(self, text):
+        """Tells if the first two markers appear once in the given text, one
+        right after the other."""
+        first = STREAM_MARKER + "0"
+        second = STREAM_MARKER + "1"
+        return (
+            text.count(first) == 1
+            and text.count(second) == 1
+            and first + second in text
+        )
+
+    def _renderStreamed(self, frame, children, markers=None, node=None, selector=None):
+        """Renders the element of the given frame (or the given `node`) with
+        the given children temporarily attached to it instead of its own. The
+        children in `markers` are rendered as `STREAM_MARKER` followed by the
+        given number, in which case the selectors they were rendered with are
+        returned along with the text. The deferred children that were
+        streamed are rendered as their output."""
+        element = frame.node
+        if node is None:
+            node = element
+            selector = frame.selector
+        stubs = dict(
+            (id(_[0]), self._createStub(_[1]))
+            for _ in frame.deferred
+            if _[1] is not None
+        )
+        selectors = {}
+        for key, number in (markers or {}).items():
+            stubs[key] = self._createMarker(selectors, key, number)
+        context = self.context
+        saved = (element.childNodes, [_.parentNode for _ in children], context.stubs)
+        element.childNodes = list(children)
+        for child in children:
+            child.parentNode = element
+        context.stubs = stubs
+        try:
+            text = self.processElement(node, selector) or ""
+        finally:
+            element.childNodes, parents, context.stubs = saved
+            for child, parent in zip(children, parents):
+                child.parentNode = parent
+        return text if markers is None else (text, selectors)
+
+    def _createMarker(self, selectors, key, number):
+        def marker(element, selector):
+            selectors.setdefault(key, selector)
+            return STREAM_MARKER + str(number)
+
+        return marker
+
+    def _createStub(self, text):
+        return lambda element, selector: text
+
+
+# ------------------------------------------------------------------------------
+#
+#  RENDER CONTEXT
+#
+# ------------------------------------------------------------------------------
+
+
+class RenderContext:
+    """Holds the state of a single rendering by a `Processor`:
+
+    - variables: the variables expanded by the `$(=VARIABLE)` expressions.
+    - bodyOnly: tells if only the body of the document is rendered.
+    - write: the function to which `process` passes its output (see
+      `Processor.render`), or `None` when the output is returned.
+    - stubs: maps node ids to the functions that replace their processing
+      (see `Processor.stream`).
+    - streamed: maps the ids of the streamed elements to the number of
+      children they had by name (see `Processor.countStreamed`).
+    - stats: the `Stats` in which the calls of the element handlers are
+      recorded (see `texto.stats`), or `None`.
+    """
+
+    __slots__ = ("variables", "bodyOnly", "write", "stubs", "streamed", "stats")
+
+    def __init__(self, variables=None, bodyOnly=False, write=None, stats=None):
+        self.variables = {} if variables is None else variables
+        self.bodyOnly = bodyOnly
+        self.write = write
+        self.stubs = {}
+        self.streamed = {}
+        self.stats = stats
+
+
+class RenderLocal(threading.local):
+    """Holds the current `RenderContext` of each thread."""
+
+    def __init__(self):
+        self.context = RenderContext()
+
+
+# ------------------------------------------------------------------------------
+#
+#  STREAM FRAME
+#
+# ------------------------------------------------------------------------------
+
+
+class StreamFrame:
+    """Holds the state of an element that is being streamed by
+    `Processor.stream`:
+
+    - node: the element, which was started before being complete.
+    - selector: the selector the element is rendered with.
+    - write: the function to which its output is passed, which is the
+      `buffer` list when the element is deferred, or ignores the output when
+      the element is not rendered.
+    - parent: the frame of the parent element.
+    - pending: the complete children that precede the first streamed child.
+    - hole: the first streamed child, that gives where the streamed children
+      go in the output of the element.
+    - deferred: the `[child, output]` children that are rendered once the
+      element is complete, where `output` is given for deferred open
+      children.
+    """
+
+    __slots__ = (
+        "node",
+        "selector",
+        "write",
+        "parent",
+        "buffer",
+        "pending",
+        "hole",
+        "deferred",
+    )
+
+    def __init__(self, node, selector, write, parent=None, buffer=None):
+        self.node = node
+        self.selector = selector
+        self.parent = parent
+        self.buffer = buffer
+        if buffer is not None:
+            write = buffer.append
+        self.write = write or (lambda text: None)
+        self.pending = []
+        self.hole = None
+        self.deferred = []
+
 
 # ------------------------------------------------------------------------------
 #
@@ -252,6 +650,45 @@ class Processor(object):
 # ------------------------------------------------------------------------------
 
 
+@functools.lru_cache(maxsize=1024)
+def parseExpression(expression):
+    """Parses a template expression into a `(names, selector, optional)`
+    triple, where `names` is the tuple of element names (or `None` for a
+    `=VARIABLE` expression, in which case `selector` is the variable name),
+    and `optional` tells if the selector ends with `?`."""
+    if expression.startswith("="):
+        return (None, expression[1:].upper(), False)
+    # The expression is a node selection expression, which may also have a
+    # selector
+    elif expression.rfind(":") != -1:
+        names, selector = expression.split(":")
+    else:
+        names = expression
+        selector = None
+    optional = False
+    if selector and selector[-1] == "?":
+        selector = selector[:-1]
+        optional = True
+    return (tuple(names.split("/")), selector, optional)
+
+
+@functools.lru_cache(maxsize=1024)
+def compileTemplate(template):
+    """Compiles the given template into a tuple of operations, which are
+    either literal strings or the parsed `$(EXPRESSION)` (see
+    `parseExpression`)."""
+    ops = []
+    i = 0
+    for m in RE_EXPRESSION.finditer(template):
+        if m.start() > i:
+            ops.append(template[i : m.start()])
+        ops.append(parseExpression(m.group(1)))
+        i = m.end()
+    if i < len(template):
+        ops.append(template[i:])
+    return tuple(ops)
+
+
 def escapeHTML(text):
     """Escapes &, < and > into corresponding HTML entities."""
     text = text.replace("&", "&amp;")
@@ -12,6 +12,7 @@ import sys
 import re
 import xml.dom
 import texto.formats
+from texto.tree import getOffsets, getNumber, getAttributes
 
 # ------------------------------------------------------------------------------
 #
@@ -26,17 +27,13 @@ class Processor(texto.formats.Processor):
         """We override this for elements with the 'html' attribute."""
         if element.getAttributeNS(None, "_html"):
             res = "<" + element.nodeName
-            att = element.attributes
-            for i in range(att.length):
-                a = att.item(i)
-                if a.name == "_html":
+            for name, value in getAttributes(element):
+                if name == "_html":
                     continue
-                res += " %s='%s'" % (a.name,
-                                     element.getAttributeNS(None, a.name))
+                res += " %s='%s'" % (name, value)
             if element.childNodes:
                 res += ">"
-                for e in element.childNodes:
-                    res += self.processElement(e)
+                res += self.capture(self.process, element, "$(*)")
                 res += "</%s>" % (element.tagName)
             else:
                 res += "/>"
@@ -72,11 +69,12 @@ class Processor(texto.formats.Processor):
     def _elementNumber(self, element):
         """Utility function that returns the element number (part of the element
         offset attributes)"""
-        number = element.getAttributeNS(None, "_number")
-        if number:
-            return int(number)
-        else:
-            return None
+        return getNumber(element)
+
+    def _elementOffsets(self, element):
+        """Returns the start and end offsets of the element, as strings that
+        are empty when the offset is not defined."""
+        return tuple("" if _ is None else str(_) for _ in getOffsets(element))
 
     def _wdiv(self, element, text):
         """Wraps the given text in a DIV extended with offsets attributes if the
@@ -85,10 +83,7 @@ class Processor(texto.formats.Processor):
         if number == None:
             return text
         return "<div class='texto N%s' ostart='%s' oend='%s'>%s</div>" % (
-            element.getAttributeNS(None, '_number'),
-            element.getAttributeNS(None, '_start'),
-            element.getAttributeNS(None, '_end'),
-            text
+            (number,) + self._elementOffsets(element) + (text,)
         )
 
     def _wspan(self, element, text):
@@ -98,10 +93,7 @@ class Processor(texto.formats.Processor):
         if number == None:
             return text
         return "<div class='texto N%s' ostart='%s' oend='%s'>%s</div>" % (
-            element.getAttributeNS(None, '_number'),
-            element.getAttributeNS(None, '_start'),
-            element.getAttributeNS(None, '_end'),
-            text
+            (number,) + self._elementOffsets(element) + (text,)
         )
 
     def _wattrs(self, element):
@@ -110,9 +102,7 @@ class Processor(texto.formats.Processor):
         number = self._elementNumber(element)
         if number != None:
             res = " class='texto N%s' ostart='%s' oend='%s'" % (
-                element.getAttributeNS(None, '_number'),
-                element.getAttributeNS(None, '_start'),
-                element.getAttributeNS(None, '_end')
+                (number,) + self._elementOffsets(element)
             )
         if element.attributes:
             for k, v in element.attributes.items():
@@ -129,7 +119,7 @@ class Processor(texto.formats.Processor):
         if not element.nodeName in ("chapter", "section"):
             return ""
         parent = element.parentNode
-        section_count = 1
+        section_count = 1 + self.countStreamed(parent, ("chapter", "section"))
         for child in parent.childNodes:
             if child == element:
                 break
@@ -160,7 +150,7 @@ class Processor(texto.formats.Processor):
         return self.process(element, self._wspan(element, "$(*)"))
 
     def on_section(self, element):
-        offset = element._processor.variables.get("LEVEL") or 0
+        offset = self.variables.get("LEVEL") or 0
         level = int(element.getAttributeNS(None, "depth")) + offset
         return self.process(element,
                             '<div class="section level-%d" data-level="%d">' % (
@@ -285,7 +275,7 @@ class Processor(texto.formats.Processor):
 
     def on_email(self, element):
         mail = ""
-        for c in process(element, """$(*)"""):
+        for c in self.capture(self.process, element, """$(*)"""):
             mail += "&#%d;" % (ord(c))
         return """<a href="mailto:%s">%s</a>""" % (mail, mail)
 
@@ -293,7 +283,7 @@ class Processor(texto.formats.Processor):
         return self.process(element, """<a href="$(*)" target="_blank">$(*)</a>""")
 
     def on_url_header(self, element):
-        return self.process(element, """<div class='url'>%s</div>""" % (self.on_url(element)))
+        return self.process(element, """<div class='url'>%s</div>""" % (self.capture(self.on_url, element)))
 
     def on_term(self, element):
         return self.process(element, """<span class='term'>$(*)</span>""")
@@ -319,7 +309,7 @@ class Processor(texto.formats.Processor):
 
     def on_pre(self, element):
         lang = ""
-        return self.process(element, """<pre%s><code%s>$(*)</code></pre>""" % (self._wattrs(element), lang)).replace("\r\n", "\n")
+        return self.capture(self.process, element, """<pre%s><code%s>$(*)</code></pre>""" % (self._wattrs(element), lang)).replace("\r\n", "\n")
 
     def on_code(self, element):
         return self.process(element, """<code>$(*)</code>""")
@@ -8,6 +8,7 @@
 # Last mod.         : 2021-06-12
 # -----------------------------------------------------------------------------
 from texto.formats import Processor as BaseProcessor
+from texto.tree import getAttributes
 import json
 
 
@@ -15,8 +16,7 @@ class Processor(BaseProcessor):
 
     def processElementNode(self, element, selector, isSelectorOptional=False):
         name = element.nodeName
-        attr = dict((_.name, _.value) for _ in (element.attributes.item(_)
-                                                for _ in range(len(element.attributes))))
+        attr = dict(getAttributes(element))
         children = [self.processElement(_) for _ in element.childNodes]
         node = [name]
         if children:
@@ -26,8 +26,8 @@ class Processor(BaseProcessor):
         else:
             return [name]
 
-    def generate(self, xmlDocument, bodyOnly=False, variables={}):
-        return json.dumps(super().generate(xmlDocument, bodyOnly, variables))
+    def processDocument(self, xmlDocument):
+        return json.dumps(super().processDocument(xmlDocument))
 
 
 processor = Processor()
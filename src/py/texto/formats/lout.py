@@ -20,10 +20,9 @@ import texto.formats as templates
 
 class Processor(templates.Processor):
 
-    def generate(self, xmlDocument, bodyOnly=False, variables={}):
+    def processDocument(self, xmlDocument):
         node = xmlDocument.getElementsByTagName("document")[0]
-        self.variables = variables
-        if bodyOnly:
+        if self.bodyOnly:
             for child in node.childNodes:
                 if child.nodeName == "content":
                     return convertContent_bodyonly(child)
@@ -189,7 +188,7 @@ def convertmeta(element):
 
 def convertemail(element):
     mail = ""
-    for c in process(element, """$(*)"""):
+    for c in processor.capture(process, element, """$(*)"""):
         mail += "&#%d;" % (ord(c))
     return """<a href="mailto:%s">%s</a>""" % (mail, mail)
 
@@ -200,7 +199,7 @@ def converturl(element):
 
 def converturl_header(element):
     return process(element, """<div class='url'>%s</div>""" % (
-        converturl(element)))
+        processor.capture(converturl, element)))
 
 
 def convertterm(element):
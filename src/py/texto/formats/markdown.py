@@ -94,7 +94,7 @@ def convertCell(element):
     suffix = ""
     if element.hasAttributeNS(None, "colspan"):
         suffix = " " + "|" * (int(element.getAttributeNS(None, "colspan")) - 2)
-    cell = process(element, "$(*:cell)")[:-1]
+    cell = processor.capture(process, element, "$(*:cell)")[:-1]
     return ("| " + cell + suffix)
 
 
@@ -141,7 +141,7 @@ def converttarget(element):
 
 def convertemail(element):
     mail = ""
-    for c in process(element, """$(*)"""):
+    for c in processor.capture(process, element, """$(*)"""):
         mail += c
     return """[%s]<mailto:%s>""" % (mail, mail)
 
@@ -224,7 +224,7 @@ def defaultProcess(element, selector, processor):
         else:
             return element.toprettyxml("")
     else:
-        return "".join([processor.processElement(e) for e in element.childNodes])
+        return processor.process(element, "$(*)")
 
 
 # We create the processor, register the rules and define the process variable
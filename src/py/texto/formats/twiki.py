@@ -91,7 +91,7 @@ def convertCell(element):
     suffix = ""
     if element.hasAttributeNS(None, "colspan"):
         suffix = " " + "|" * (int(element.getAttributeNS(None, "colspan")) - 2)
-    cell = process(element, "$(*:cell)")[:-1]
+    cell = processor.capture(process, element, "$(*:cell)")[:-1]
     return ("| " + cell + suffix)
 
 
@@ -130,7 +130,7 @@ def converttarget(element):
 
 def convertemail(element):
     mail = ""
-    for c in process(element, """$(*)"""):
+    for c in processor.capture(process, element, """$(*)"""):
         mail += c
     return """[[mailto:%s][%s]]""" % (mail, mail)
 
@@ -12,10 +12,22 @@
 
 import sys
 import re
+import hashlib
 import operator
 import xml.dom.minidom
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
 from .inlines import *
 from .blocks import *
+from ..stats import Stats, instrumentParser, instrumentContext
+from ..tree import (
+    Document,
+    getOffsets,
+    setOffsets,
+    getIndent,
+    setNumber,
+)
 
 dom = xml.dom.minidom.getDOMImplementation()
 
@@ -35,6 +47,8 @@ TAB_SIZE = 4
 # ------------------------------------------------------------------------------
 
 RE_BLOCK_SEPARATOR = re.compile("[ \t\r]*\n[ \t\r]*\n", re.MULTILINE)
+# The first newline of each block separator
+RE_BLOCK_SEPARATOR_NEWLINE = re.compile("\n(?=[ \t\r]*\n)")
 RE_SPACES = re.compile(r"[\s\n]+", re.MULTILINE)
 RE_TABS = re.compile("\t+")
 NAME = r"[A-Za-z0-9\-_]+"
@@ -44,6 +58,227 @@ STR_DQ = r'"(\\"|[^"])*"'
 VALUE = f"({STR_SQ}|{STR_DQ}|" r"[^ \t\r\n]+)"
 RE_ATTR = re.compile(f"[ \t]*((?P<ns>{NAME}):)?(?P<name>{NAME})=(?P<value>{VALUE})?")
 
+# ------------------------------------------------------------------------------
+#
+# OFFSET TABLE
+#
+# ------------------------------------------------------------------------------
+
+
+class OffsetTable:
+    """A compact table of the `(start, end)` source offsets of the elements
+    of a document, indexed by element number (the `_number` attribute). The
+    offsets are stored as consecutive pairs in an `array('l')`, with `-1`
+    for undefined offsets."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data=None):
+        self.data = array("l") if data is None else data
+
+    def append(self, start, end):
+        self.data.append(-1 if start is None else start)
+        self.data.append(-1 if end is None else end)
+
+    def __len__(self):
+        return len(self.data) // 2
+
+    def __getitem__(self, number):
+        if number < 0:
+            number += len(self)
+        if number < 0 or number >= len(self):
+            raise IndexError("Element number out of range: %s" % (number))
+        return (self.data[2 * number], self.data[2 * number + 1])
+
+    def __iter__(self):
+        data = self.data
+        for i in range(0, len(data), 2):
+            yield (data[i], data[i + 1])
+
+    def __repr__(self):
+        return "<OffsetTable:%d>" % (len(self))
+
+
+class SourceMap:
+    """An index of the elements of a document by source offset, built from
+    the document and its `OffsetTable`. Elements span the half-open range
+    `[start, end)` and are stored in a nested containment list: each list
+    is sorted by start offset and contains no element that contains another,
+    so that both its starts and its ends are increasing and can be bisected.
+    The elements that are contained by an element are in the sublist of that
+    element."""
+
+    def __init__(self, root, offsets):
+        self.offsets = offsets
+        # Elements are listed in document order, which is the order of the
+        # element numbers given by the offset annotation pass.
+        self.nodes = []
+        self.depths = array("l")
+        stack = [(root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            self.nodes.append(node)
+            self.depths.append(depth)
+            stack.extend(
+                (_, depth + 1)
+                for _ in reversed(node.childNodes)
+                if _.nodeType == node.ELEMENT_NODE
+            )
+        assert len(self.nodes) == len(offsets), "Offsets do not match the document"
+        # Each list is a `(starts, ends, numbers)` triple, `sublists` maps an
+        # element number to the list of the elements it contains.
+        self.sublists = {}
+        self.top = self._createList()
+        data = offsets.data
+        numbers = [_ for _ in range(len(self.nodes)) if data[2 * _] != -1]
+        # Containers come before their contents, and parents before their
+        # children when they have the same range.
+        numbers.sort(key=lambda _: (data[2 * _], -data[2 * _ + 1]))
+        containers = []
+        for number in numbers:
+            start, end = data[2 * number], data[2 * number + 1]
+            while containers and data[2 * containers[-1] + 1] < end:
+                containers.pop()
+            if containers:
+                parent = containers[-1]
+                sublist = self.sublists.get(parent)
+                if sublist is None:
+                    sublist = self.sublists[parent] = self._createList()
+            else:
+                sublist = self.top
+            sublist[0].append(start)
+            sublist[1].append(end)
+            sublist[2].append(number)
+            containers.append(number)
+
+    def _createList(self):
+        return (array("l"), array("l"), array("l"))
+
+    def _query(self, start, end):
+        """Returns the numbers of the elements such that `element.start < end`
+        and `element.end > start`."""
+        res = []
+        lists = [self.top]
+        while lists:
+            starts, ends, numbers = lists.pop()
+            i = bisect_right(ends, start)
+            while i < len(starts) and starts[i] < end:
+                res.append(numbers[i])
+                sublist = self.sublists.get(numbers[i])
+                if sublist:
+                    lists.append(sublist)
+                i += 1
+        return res
+
+    def getNode(self, number):
+        """Returns the element with the given number."""
+        return self.nodes[number]
+
+    def getNumberAt(self, offset):
+        """Returns the number of the deepest element that contains the given
+        offset, or `None`."""
+        numbers = self._query(offset, offset + 1)
+        if not numbers:
+            return None
+        return max(numbers, key=lambda _: (self.depths[_], _))
+
+    def getNodeAt(self, offset):
+        """Returns the deepest element that contains the given offset, or
+        `None`."""
+        number = self.getNumberAt(offset)
+        return None if number is None else self.nodes[number]
+
+    def getNodesIn(self, start, end):
+        """Returns the elements that overlap the `[start, end)` range, in
+        document order. For an empty range, these are the elements that
+        contain `start`."""
+        numbers = self._query(start, max(end, start + 1))
+        numbers.sort()
+        return [self.nodes[_] for _ in numbers]
+
+
+# ------------------------------------------------------------------------------
+#
+# BLOCK TABLE
+#
+# ------------------------------------------------------------------------------
+
+
+class BlockTable:
+    """The block boundaries of a document text. The block separators (see
+    `RE_BLOCK_SEPARATOR`) are found in a single pass over the text, and the
+    offsets of their first newline are stored in an array, so that the
+    separator that follows any offset is found by bisection.
+
+    The `blocks` map the start offset of each block to its `(end, next)`
+    offsets, once `Parser._findNextBlockSeparator` has delimited it taking
+    the markup elements that span separators into account. Each block is
+    thus only delimited once, however many times it is looked up."""
+
+    def __init__(self, text=""):
+        self.text = text
+        self.newlines = array(
+            "l", [_.start() for _ in RE_BLOCK_SEPARATOR_NEWLINE.finditer(text)]
+        )
+        self.blocks = {}
+
+    def _scan(self, offset, limit):
+        """Adds the separators found from the given offset that start before
+        the given limit (included)."""
+        for match in RE_BLOCK_SEPARATOR_NEWLINE.finditer(self.text, offset):
+            newline = match.start()
+            if self._getStart(newline) > limit:
+                break
+            self.newlines.append(newline)
+
+    def getSeparator(self, offset):
+        """Returns the `(start, end)` offsets of the first block separator
+        found from the given offset, as `RE_BLOCK_SEPARATOR.search` would, or
+        None."""
+        i = bisect_left(self.newlines, offset)
+        if i == len(self.newlines):
+            return None
+        newline = self.newlines[i]
+        return (self._getStart(newline, offset), self.text.index("\n", newline + 1) + 1)
+
+    def update(self, start, end, text):
+        """Returns the block table of the given text, which is the text of
+        this table where the `[start, end)` range was replaced. Only the
+        separators around the replaced range are searched again, the others
+        are reused (see `Parser.reparse`)."""
+        newlines = self.newlines
+        delta = len(text) - len(self.text)
+        table = BlockTable()
+        table.text = text
+        # The separators that end before the range are left as they are (a
+        # separator ends at most at the first newline of the next one)
+        i = max(0, bisect_left(newlines, start) - 1)
+        table.newlines = newlines[:i]
+        table._scan(newlines[i - 1] + 1 if i else 0, end + delta)
+        # and the ones that start after the range are shifted.
+        j = bisect_right(newlines, end)
+        while j < len(newlines) and self._getStart(newlines[j]) <= end:
+            j += 1
+        table.newlines.extend(_ + delta for _ in newlines[j:])
+        return table
+
+    def _getStart(self, newline, offset=0):
+        """Returns the start of the separator with the given first newline,
+        which includes the spaces before the newline, from the given offset
+        on."""
+        text = self.text
+        start = newline
+        while start > offset and text[start - 1] in " \t\r":
+            start -= 1
+        return start
+
+    def __len__(self):
+        return len(self.newlines)
+
+    def __repr__(self):
+        return "<BlockTable:%d>" % (len(self))
+
+
 # ------------------------------------------------------------------------------
 #
 # PARSING CONTEXT
@@ -68,9 +303,19 @@ class ParsingContext:
             - blockEndOffset: the offset in the text where the currently parsed block
             ends.
             - parser: a reference to the Texto parser instance using the context.
+            - blocks: the `(start, end, node)` top-level blocks of the document,
+            used by `Parser.reparse`.
+            - stats: the `Stats` of the parsing when the parser profiles (see
+            `texto.stats`), or None.
     """
 
     def __init__(self, documentText, markOffsets=False, parser=None):
+        # The `(end, delta, number)` shifts that `Parser.reparse` has yet to
+        # apply to the offsets at or after `end` and to the numbers from
+        # `number` on, and the number of these shifts that already apply to
+        # the elements it created (see `Parser._applyShifts`).
+        self._shifts = []
+        self._shiftEpochs = {}
         self.parser = parser
         self.document = None
         self.rootNode = None
@@ -81,12 +326,24 @@ class ParsingContext:
         self.currentNode = None
         self.lastBlockNode = None
         self._offset = 0
+        self._inlineMemo = {}
+        self._markupIndex = None
+        self._blockTable = None
+        self.stats = None
         self.blockStartOffset = 0
         self.blockEndOffset = -1
         self.setDocumentText(documentText)
         self._currentFragment = None
         self.parser = None
         self.markOffsets = markOffsets
+        # The `OffsetTable` of the document, when parsed with offsets
+        self._offsets = None
+        self._sourceMap = None
+        # The top-level blocks of the document as `(start, end, node)`, where
+        # `node` is the element of paragraph blocks (see `Parser.reparse`)
+        self.blocks = []
+        self._offsetNodes = None
+        self._elements = None
         self.meta = {}
         self.sections = []
         # These are convenience attributes used to make it easy for
@@ -95,6 +352,30 @@ class ParsingContext:
         self._targets = []
         self._keys = {}
 
+    @property
+    def document(self):
+        """The document being parsed. The offset shifts that `Parser.reparse`
+        left pending are applied when it is accessed."""
+        if self._shifts:
+            self.parser._applyShifts(self)
+        return self._document
+
+    @document.setter
+    def document(self, document):
+        self._document = document
+
+    @property
+    def offsets(self):
+        """The `OffsetTable` of the document when parsed with offsets, which
+        is rebuilt after the pending shifts are applied."""
+        if self._shifts:
+            self.parser._applyShifts(self)
+        return self._offsets
+
+    @offsets.setter
+    def offsets(self, offsets):
+        self._offsets = offsets
+
     def asKey(self, text, node=None):
         key = "".join(
             [
@@ -158,7 +439,7 @@ class ParsingContext:
             section_node = section[0]
             section_content = section[1]
             section_depth = section[2]
-            section_indent = int(section_node.getAttributeNS(None, "_indent"))
+            section_indent = getIndent(section_node)
             if indent > section_indent:
                 return section_content
             elif section_indent <= indent and section_depth < depth:
@@ -176,11 +457,59 @@ class ParsingContext:
 
     def setDocumentText(self, text):
         """Sets the text of the current document. This should only be called
-        at context initialisation."""
+        at context initialisation, or once the document has been updated by
+        `Parser.reparse`."""
         self.documentText = text
         self.documentTextLength = len(text)
         self.blockEndOffset = self.documentTextLength
         self.setOffset(0)
+        self.resetInlineMemo()
+        self._markupIndex = None
+        self._blockTable = None
+
+    def getSourceMap(self):
+        """Returns the `SourceMap` of the document, which is built on first
+        use. The document must have been parsed with offsets."""
+        assert self.offsets is not None, "Source maps require offsets=True"
+        if self._sourceMap is None:
+            self._sourceMap = SourceMap(self.document.childNodes[0], self.offsets)
+        return self._sourceMap
+
+    def getMarkupIndex(self):
+        """Returns the `MarkupIndex` of the document text, which is built on
+        first use."""
+        if self._markupIndex is None:
+            self._markupIndex = MarkupIndex(self.documentText)
+        return self._markupIndex
+
+    def getBlockTable(self):
+        """Returns the `BlockTable` of the document text, which is built on
+        first use."""
+        if self._blockTable is None:
+            self._blockTable = BlockTable(self.documentText)
+        return self._blockTable
+
+    def getInlineMemo(self):
+        """Returns the dictionary in which the inline scanner memoizes the
+        matches of the inline parsers for the current block. The memo is keyed
+        by the block range, so that nested blocks (links, markup) do not
+        clear the memo of their enclosing block."""
+        key = (self.blockStartOffset, self.blockEndOffset)
+        memo = self._inlineMemo.get(key)
+        if memo is None:
+            memo = self._inlineMemo[key] = {}
+        return memo
+
+    def resetInlineMemo(self, offset=None):
+        """Clears the memoized inline matches, or only the ones of the blocks
+        that end before the given offset. The latter is done for every new
+        block, so that the memos of the enclosing blocks are kept."""
+        if offset is None:
+            self._inlineMemo = {}
+        else:
+            memos = self._inlineMemo
+            for key in [_ for _ in memos if _[1] <= offset]:
+                del memos[key]
 
     def setOffset(self, offset):
         """Sets the current offset."""
@@ -204,14 +533,9 @@ class ParsingContext:
 
     def increaseOffset(self, increase):
         """Increases the current offset"""
-        # We get the current fragment, because it will be freed by changing the
-        # offset
-        fragment = self.currentFragment()
+        # The current fragment is only sliced again if it is requested, as
+        # inline parsing works on the document text directly.
         self.setOffset(self.getOffset() + increase)
-        # We optimise current fragment access, by restoring it with a proper
-        # value when possible
-        if self.getOffset() < self.blockEndOffset:
-            self._currentFragment = fragment[increase:]
 
     def decreaseOffset(self, decrease):
         """Decreases the offset."""
@@ -224,7 +548,10 @@ class ParsingContext:
 
     def currentFragment(self):
         """Returns the current text fragment, from the current offset to the
-        block end offset."""
+        block end offset.
+
+        This is a copy of the document text, prefer `search` and `match`
+        which work on the document text directly."""
         assert (
             self.getOffset() < self.blockEndOffset
         ), "Offset greater than block end: %s >= %s" % (
@@ -237,6 +564,41 @@ class ParsingContext:
             ]
         return self._currentFragment
 
+    def search(self, regexp, offset=None):
+        """Searches the given compiled regexp in the document text, from the
+        given offset (the current offset by default) to the current block end,
+        without copying the fragment. The returned match has absolute
+        offsets.
+
+        Note that, unlike when searching the current fragment, `^` only
+        matches at the beginning of a line and lookbehinds see the text
+        before the offset."""
+        return regexp.search(
+            self.documentText,
+            self._offset if offset is None else offset,
+            self.blockEndOffset,
+        )
+
+    def match(self, regexp, offset=None):
+        """Like `search`, but the regexp has to match at the given offset."""
+        return regexp.match(
+            self.documentText,
+            self._offset if offset is None else offset,
+            self.blockEndOffset,
+        )
+
+    def searchText(self, regexp, text, offset=0):
+        """Searches the given compiled regexp in the given text (like the
+        current fragment or one of its lines) from the given offset. Block
+        parsers search their text with this method (and `matchText`), so
+        that their searches are recorded when the parser profiles."""
+        return regexp.search(text, offset)
+
+    def matchText(self, regexp, text, offset=0):
+        """Like `searchText`, but the regexp has to match at the given
+        offset."""
+        return regexp.match(text, offset)
+
     def documentEndReached(self):
         """Returns true if the current offset is greater than the document
         length"""
@@ -305,20 +667,29 @@ class ParsingContext:
         clone.document = self.document
         clone.setOffset(self.getOffset())
         clone.setCurrentBlock(self.blockStartOffset, self.blockEndOffset)
+        instrumentContext(clone, self.stats)
         return clone
 
-    def findNextInline(self, inlineParsers):
+    def findNextInline(self, inlineParsers, active=None):
         """Finds the next inline in the given context, using the given list of
-        inline parsers. This does not modifies the context.
+        inline parsers, or only the ones that are in the given set of `active`
+        parsers (see `InlineScanner.getActiveParsers`). This does not modifies
+        the context.
 
         Returns either None or a triple (offset, information, parser), where
         the offset is relative to the context offset and indicates the start
         offset where the parser recognised its tag and information is the
         information returned by the parser."""
+        # The parser's scanner finds the leftmost inline in a single pass,
+        # which is what the loop below does by polling every parser.
+        if self.parser:
+            return self.parser.getInlineScanner(inlineParsers).find(self, active)
         # We look for the inline parser that parses an inline with the lowest
         # offset
         results = []
         for inlineParser in inlineParsers:
+            if active is not None and inlineParser not in active:
+                continue
             match_offset, result = inlineParser.recognises(self)
             if match_offset != None:
                 assert match_offset >= 0
@@ -400,14 +771,29 @@ class Parser:
         customParsers=None,
         document=None,
         root=None,
+        tree="dom",
+        profile=False,
     ):
+        assert tree in ("native", "dom"), "Unsupported tree backend: %s" % (tree)
         self.document = document
         self.root = root
+        # The kind of document tree that is created when no `document` is
+        # given, either `dom` (xml.dom.minidom) or the faster `native` tree
+        # (see `texto.tree`), which is opt-in as it only implements the part
+        # of the DOM API that the parsers and the `formats` use.
+        self.tree = tree
+        # Tells if the parsing contexts record the calls of the parsers in
+        # their `stats` (see `texto.stats`)
+        self.profile = profile
         self.blockParsers = []
         self.inlineParsers = []
         self.customParsers = {}
         self.baseDirectory = baseDirectory
         self.defaultBlockParser = ParagraphBlockParser()
+        # Inline scanners and block indexes are built lazily for each list of
+        # inline and block parsers
+        self._inlineScanners = {}
+        self._blockIndexes = {}
         if blockParsers is not None:
             self.blockParsers.extend(blockParsers)
         else:
@@ -417,6 +803,8 @@ class Parser:
         else:
             self.createInlineParsers()
         self.createCustomParsers()
+        if profile:
+            instrumentParser(self)
 
     def createBlockParsers(self):
         self.blockParsers.extend(
@@ -492,11 +880,61 @@ class Parser:
             )
         )
 
+    def getInlineScanner(self, inlineParsers):
+        """Returns the `InlineScanner` for the given list of inline parsers,
+        creating it on first use. Scanners are keyed by the parsers they
+        contain, so that changes to `inlineParsers` are taken into account."""
+        key = tuple(inlineParsers)
+        scanner = self._inlineScanners.get(key)
+        if scanner is None:
+            scanner = self._inlineScanners[key] = InlineScanner(key)
+        return scanner
+
+    def getBlockIndex(self, blockParsers):
+        """Returns the `BlockIndex` for the given list of block parsers,
+        creating it on first use, like `getInlineScanner`."""
+        key = tuple(blockParsers)
+        index = self._blockIndexes.get(key)
+        if index is None:
+            index = self._blockIndexes[key] = BlockIndex(key)
+        return index
+
+    def getFingerprint(self) -> str:
+        """Returns a hash of what determines the documents this parser
+        produces: its tree kind and base directory, its block, inline and
+        custom parsers with their settings, and the code of the modules that
+        define them. Two parsers with the same fingerprint parse a text the
+        same way, which is what allows to reuse their results (see
+        `texto.cache`)."""
+        h = hashlib.sha256()
+        h.update(repr((self.tree, self.baseDirectory)).encode())
+        modules = set((__name__, Document.__module__))
+        parsers = [("block", _) for _ in self.blockParsers]
+        parsers += [("inline", _) for _ in self.inlineParsers]
+        parsers += sorted(self.customParsers.items(), key=lambda _: _[0])
+        parsers.append(("default", self.defaultBlockParser))
+        for role, parser in parsers:
+            h.update(role.encode())
+            h.update(_describe(parser).encode())
+            for base in type(parser).__mro__:
+                modules.add(base.__module__)
+        for module in sorted(modules):
+            h.update(_getModuleHash(module).encode())
+        return h.hexdigest()
+
+    def createDocument(self):
+        """Creates an empty document using the tree backend selected by the
+        `tree` parameter."""
+        if self.tree == "dom":
+            return dom.createDocument(None, None, None)
+        else:
+            return Document()
+
     def _initialiseContextDocument(self, context):
         """Creates the XML document that will be populated by Texto
         parsing."""
         if not self.document:
-            document = dom.createDocument(None, None, None)
+            document = self.createDocument()
         else:
             document = self.document
         if not self.root:
@@ -539,16 +977,22 @@ class Parser:
     def parse(self, text, offsets=False) -> ParsingContext:
         """Parses the given text, and returns an XML document. If `offsets` is
         set to True, then all nodes of the document are annotated with their
-        position in the original text as well with a number. The document will
-        also have an `offsets` attribute that will contain a list of (start,
-        end) offset tuples for each element."""
+        position in the original text as well with a number. The context will
+        also have an `offsets` attribute, an `OffsetTable` that gives the
+        (start, end) offsets of each element by number.
+
+        When the parser profiles, the context has the `Stats` of the parsing
+        as `stats`."""
         # Text MUST be unicode
         assert isinstance(text, str)
         context = ParsingContext(text, markOffsets=offsets, parser=self)
         self._initialiseContextDocument(context)
         context.parser = self
-        while not context.documentEndReached():
-            self._parseNextBlock(context)
+        if self.profile:
+            instrumentContext(context, Stats())
+            context.stats.call("parse", self.parseContext, context, size=len(text))
+        else:
+            self.parseContext(context)
         # We remove unnecessary nodes
         for node in (
             context.header,
@@ -558,21 +1002,30 @@ class Parser:
         ):
             if len(node.childNodes) == 0:
                 context.rootNode.removeChild(node)
-        if offsets:
-            context.offsets = self._updateElementOffsets(context, offsets=[])
+        if offsets and context.stats:
+            context.offsets = context.stats.call(
+                "offsets", self._updateElementOffsets, context, size=len(text)
+            )
+        elif offsets:
+            context.offsets = self._updateElementOffsets(context)
         return context
 
     def parseContext(self, context):
         while not context.documentEndReached():
-            self._parseNextBlock(context)
+            block = self._parseNextBlock(context)
+            if block:
+                context.blocks.append(block)
 
     def _parseNextBlock(self, context, end=None):
         """Parses the block identified in the given context, ending at the given
-        'end' (if 'end' is not None)."""
+        'end' (if 'end' is not None). Returns `(start, end, node)` for non-empty
+        blocks, where `node` is the created element for paragraphs."""
         assert context != None
+        context.resetInlineMemo(context.getOffset())
         # This variable indicates if at least one block parser recognised the
         # current block
         recognised = None
+        block = None
         # We find block start and end
         block_start_offset = context.getOffset()
         block_end_offset, next_block_start_offset = self._findNextBlockSeparator(
@@ -596,8 +1049,10 @@ class Parser:
             context.setCurrentBlock(block_start_offset, block_end_offset)
             assert block_start_offset < block_end_offset <= next_block_start_offset
             # We first look for a block parser that recognises the current
-            # context
-            for blockParser in self.blockParsers:
+            # context, among the ones that can recognise its first line
+            for blockParser in self.getBlockIndex(self.blockParsers).getCandidates(
+                context.documentText, block_start_offset, block_end_offset
+            ):
                 context.setOffset(block_start_offset)
                 recognised = blockParser.recognises(context)
                 context.setOffset(block_start_offset)
@@ -610,44 +1065,76 @@ class Parser:
                 recognised = self.defaultBlockParser.recognises(context)
                 context.setOffset(block_start_offset)
                 assert recognised
-            start_offset = str(context.getOffset())
             blockParser.process(context, recognised)
             # Just in case the parser modified the end offset, we update
             # the next block start offset
             next_block_start_offset = context.blockEndOffset
-            node = context.currentNode
+            # Some block parsers leave the context without a current node
+            node = (
+                context.currentNode.lastChild
+                if context.currentNode is not None
+                else None
+            )
+            if (
+                blockParser is not self.defaultBlockParser
+                or node is None
+                or node.nodeName != blockParser.name
+                or getOffsets(node)[0] != block_start_offset
+            ):
+                node = None
+            block = (block_start_offset, next_block_start_offset, node)
         # Anyway, we set the offset to the next block start
         context.setOffset(next_block_start_offset)
+        return block
 
     def parseBlock(self, context, node, textProcessor):
-        """Parses the current block, looking for the inlines it may contain."""
+        """Parses the current block, looking for the inlines it may contain.
+        The inline parsers whose triggers are not in the block are skipped
+        (see `InlineScanner.getActiveParsers`)."""
         # if context.markOffsets and not node.getAttributeNS(None,"_start"):
         # 	node.setAttributeNS(None, "_start", str(context.getOffset()))
+        scanner = self.getInlineScanner(self.inlineParsers)
+        end = active = None
         while not context.blockEndReached():
-            self._parseNextInline(context, node, textProcessor)
+            # The active parsers are found again if the block end changed
+            if context.blockEndOffset != end:
+                end = context.blockEndOffset
+                active = scanner.getActiveParsers(context)
+            self._parseNextInline(context, node, textProcessor, active)
         # if context.markOffsets and not node.getAttributeNS(None,"_end"):
         # 	node.setAttributeNS(None, "_end", str(context.getOffset()))
 
-    def _parseNextInline(self, context, node, textProcessor):
+    def _parseNextInline(self, context, node, textProcessor, active=None):
         """Parses the content of the current block, starting at the context
-        offset, modifying the given node and updating the context offset.
-        This returns the a triple (offset, information, parser) where
-        information is the result of the parser `recognises' method."""
+        offset, modifying the given node and updating the context offset,
+        using the given `active` inline parsers if any (see
+        `ParsingContext.findNextInline`). This returns the a triple (offset,
+        information, parser) where information is the result of the parser
+        `recognises' method."""
         assert context and node and textProcessor
         assert not context.blockEndReached()
         parse_offset = context.getOffset()
-        matchedResult = context.findNextInline(self.inlineParsers)
+        matchedResult = context.findNextInline(self.inlineParsers, active)
         # If an inline parser recognised the block content then we can parse
         # it without problem
         if matchedResult:
             # We append the text between the search start offset and the matched
             # block start
-            text = context.currentFragment()[: matchedResult[0]]
+            text = context.fragment(parse_offset, parse_offset + matchedResult[0])
             if text:
                 text = textProcessor(context, text)
                 text_node = context.document.createTextNode(text)
                 node.appendChild(text_node)
+            children_count = len(node.childNodes)
             new_offset = matchedResult[2].parse(context, node, matchedResult[1])
+            # When offsets are requested, the nodes created by the inline
+            # parser span the text it has consumed.
+            if context.markOffsets:
+                inline_start = parse_offset + matchedResult[0]
+                inline_end = parse_offset + new_offset
+                for child in node.childNodes[children_count:]:
+                    if child.nodeType == child.ELEMENT_NODE:
+                        self._nodeEnsureOffsets(child, inline_start, inline_end)
             # We increase the offset so that the next parsing offset will be
             # the end of the parsed inline.
             context.increaseOffset(new_offset)
@@ -667,43 +1154,52 @@ class Parser:
         return matchedResult
 
     def _findNextBlockSeparator(self, context):
-        """Returns a match object that matches the next block separator, taking
-        into account possible custom block objects."""
+        """Returns the `(end, next start)` offsets of the block that starts at
+        the current offset, taking into account possible custom block objects.
+        Blocks are delimited once and then looked up in the block table of
+        the context (see `BlockTable`)."""
+        offset = context.getOffset()
+        table = context.getBlockTable()
+        block = table.blocks.get(offset)
+        if block is None:
+            block = self._delimitBlock(context, table.getSeparator(offset))
+            table.blocks[offset] = block
+        return block
+
+    def _delimitBlock(self, context, separator):
+        """Returns the `(end, next start)` offsets of the block that starts at
+        the current offset and that is followed by the given `(start, end)`
+        block separator, if any."""
         # FIXME: Should check if the found block separator is contained in a
         # custom block or not.
-        block_match = RE_BLOCK_SEPARATOR.search(
-            context.documentText, context.getOffset()
-        )
-        if block_match:
+        if separator:
             local_offset = context.getOffset()
             # We look for a markup inline between the current offset and the
             # next block separator
-            while local_offset < block_match.start():
+            while local_offset < separator[0]:
                 markup_match = RE_MARKUP.search(
-                    context.documentText, local_offset, block_match.start()
+                    context.documentText, local_offset, separator[0]
                 )
                 # If we have not found a markup, we break
                 if not markup_match:
                     break
-                if markup_match:
-                    # We have specified that markup inlines should not be searched
-                    # after the block separator
-                    local_offset, result = self._delimitXMLMarkupBlock(
-                        context, markup_match, block_match, local_offset
-                    )
-                    if not result is None:
-                        return result
+                # We have specified that markup inlines should not be searched
+                # after the block separator
+                local_offset, result = self._delimitXMLMarkupBlock(
+                    context, markup_match, separator, local_offset
+                )
+                if not result is None:
+                    return result
             # We have found a block with no nested markup
-            return (block_match.start(), block_match.end())
+            return separator
         # There was no block separator, so we reached the document end
         else:
             return (context.documentTextLength, context.documentTextLength)
 
-    def _delimitXMLMarkupBlock(self, context, markupMatch, blockMatch, localOffset):
+    def _delimitXMLMarkupBlock(self, context, markupMatch, separator, localOffset):
         markup_match = markupMatch
-        block_match = blockMatch
         local_offset = localOffset
-        assert markup_match.start() < block_match.start()
+        assert markup_match.start() < separator[0]
         # Case 1: Markup is a start tag
         if Markup_isStartTag(markup_match):
             # We look for the markup end inline
@@ -727,7 +1223,7 @@ class Parser:
                 # If the end is greater than the block end, then we have
                 # to recurse to look for a new block separator
                 # after the block end
-                if markup_end > block_match.start():
+                if markup_end > separator[0]:
                     offsets = context.saveOffsets()
                     context.setOffset(markup_end)
                     result = self._findNextBlockSeparator(context)
@@ -747,123 +1243,510 @@ class Parser:
             local_offset = markup_match.end()
         return local_offset, None
 
+    # STREAMING PARSING________________________________________________________
+
+    def iterparse(self, textOrStream, events=("start", "end", "text", "comment")):
+        """Parses the given text (or stream with a `read` method) and yields
+        `(event, node)` pairs as blocks are parsed, where event is one of
+        "start", "end", "text" or "comment". The events are the same as the
+        ones of a preorder walk of the document returned by `parse`.
+
+        Nodes are streamed as soon as no later block can modify them, and are
+        then detached from their parent so that memory stays bounded by the
+        blocks that are still open (the current section chain and list). The
+        `references` node and the content that follows it are streamed once
+        the whole document is parsed. A stream is read in full before parsing,
+        as block separators need to look ahead in the text.
+
+        Only the given `events` are yielded. The "open" event can be added
+        to be notified of the nodes that are started before they are complete:
+        it comes right before their "start" event, and their children are then
+        detached as they are streamed."""
+        text = textOrStream.read() if hasattr(textOrStream, "read") else textOrStream
+        assert isinstance(text, str)
+        context = ParsingContext(text, parser=self)
+        self._initialiseContextDocument(context)
+        context.parser = self
+        for event in self._iterparseEvents(context):
+            if event[0] in events:
+                yield event
+
+    def _iterparseEvents(self, context):
+        # The elements for which a "start" event was yielded, these always
+        # form the chain of first children from the root node.
+        started = set()
+        root = context.rootNode
+        started.add(id(root))
+        keys_count = 0
+        yield ("open", root)
+        yield ("start", root)
+        while not context.documentEndReached():
+            self._parseNextBlock(context)
+            # Links and targets are only kept for `reparse`, and keys only
+            # need to be unique: we don't want them to retain the nodes we
+            # have streamed.
+            del context._links[:]
+            del context._targets[:]
+            keys = context._keys
+            for key in islice(reversed(keys), len(keys) - keys_count):
+                keys[key] = None
+            keys_count = len(keys)
+            yield from self._flushEvents(
+                context, root, self._getOpenNodes(context), started
+            )
+        yield from self._iterEvents(context, root, started)
+
+    def _getOpenNodes(self, context):
+        """Returns the set of ids of the nodes that the next blocks may still
+        modify: the current and last block nodes, the sections that
+        `getParentSection` may return and the top-level containers, along with
+        their ancestors. This also forgets about the sections that
+        `getParentSection` can no longer return."""
+        # A section is shadowed by any later section with a lower or equal
+        # depth and indentation, as the later one will always match first.
+        sections = []
+        for section in reversed(context.sections):
+            indent = getIndent(section[0])
+            if not any(
+                getIndent(_[0]) <= indent and _[2] <= section[2] for _ in sections
+            ):
+                sections.append(section)
+        sections.reverse()
+        context.sections[:] = sections
+        nodes = [
+            context.currentNode,
+            context.lastBlockNode,
+            context.content,
+            context.references,
+            context.appendices,
+        ] + [_[1] for _ in sections]
+        # The title can only be added while the content is empty
+        if not context.content.childNodes:
+            nodes.append(context.header)
+        result = set()
+        for node in nodes:
+            while node is not None and id(node) not in result:
+                result.add(id(node))
+                node = node.parentNode
+        return result
+
+    def _flushEvents(self, context, node, openNodes, started):
+        """Yields the events of the children of the given started `node` that
+        are complete, detaching them, until an open child is found, into
+        which it recurses. The last child is always kept, as block parsers
+        look at it to decide where to attach the next block."""
+        children = node.childNodes
+        while children:
+            child = children[0]
+            if id(child) in openNodes:
+                # The type of a list is given by its items and titles are
+                # numbered by the header, so we can only stream them once
+                # they are complete.
+                if child.nodeName == "list" or child is context.header:
+                    return
+                elif id(child) not in started:
+                    # Open nodes are only started once they have children,
+                    # as `parse` removes empty top-level containers.
+                    if not child.childNodes:
+                        return
+                    started.add(id(child))
+                    yield ("open", child)
+                    yield ("start", child)
+                yield from self._flushEvents(context, child, openNodes, started)
+                return
+            elif len(children) == 1:
+                return
+            else:
+                yield from self._iterEvents(context, child, started)
+                node.removeChild(child)
+
+    def _iterEvents(self, context, node, started):
+        """Yields the events for the given node and its descendants. When the
+        node was already started, its "start" event is skipped and its
+        children are detached as they are streamed."""
+        if node.nodeType == node.TEXT_NODE:
+            yield ("text", node)
+        elif node.nodeType == node.COMMENT_NODE:
+            yield ("comment", node)
+        elif id(node) in started:
+            started.discard(id(node))
+            while node.childNodes:
+                child = node.childNodes[0]
+                yield from self._iterEvents(context, child, started)
+                node.removeChild(child)
+            yield ("end", node)
+        elif node.childNodes or not any(
+            node is _
+            for _ in (
+                context.header,
+                context.content,
+                context.references,
+                context.appendices,
+            )
+        ):
+            yield ("start", node)
+            for child in node.childNodes:
+                yield from self._iterEvents(context, child, started)
+            yield ("end", node)
+
+    # INCREMENTAL PARSING______________________________________________________
+
+    def reparse(self, context, editStart, editEnd, text) -> ParsingContext:
+        """Updates the given context, as returned by `parse`, after the source
+        text between `editStart` and `editEnd` was replaced by `text`. Edits
+        that stay within a single paragraph are reparsed in place: the
+        paragraph element is replaced and the updated context is returned.
+        The offsets that follow the paragraph are shifted when the document
+        or offsets of the context are next accessed, so that the elements
+        taken from the document before the edit may have stale offsets until
+        then. Any other edit, including those that would turn the paragraph
+        into another kind of block or change its indentation (and thus the
+        section or list nesting), falls back to a full `parse` of the new
+        text, which returns a new context."""
+        assert isinstance(text, str)
+        assert 0 <= editStart <= editEnd <= context.documentTextLength
+        document_text = (
+            context.documentText[:editStart] + text + context.documentText[editEnd:]
+        )
+        if context.parser is self and self._reparseParagraph(
+            context, editStart, editEnd, document_text
+        ):
+            return context
+        return self.parse(document_text, offsets=context.markOffsets)
+
+    def _reparseParagraph(self, context, editStart, editEnd, text):
+        """Reparses the paragraph block that contains the given edit, where
+        `text` is the new document text. Returns False, leaving the context
+        untouched, when the edit cannot be applied to the paragraph alone."""
+        blocks = context.blocks
+        i = bisect_right(blocks, (editStart, sys.maxsize)) - 1
+        if i < 0:
+            return False
+        start, end, node = blocks[i]
+        if node is None or node.parentNode is None or editEnd > end:
+            return False
+        delta = len(text) - context.documentTextLength
+        new_end = end + delta
+        if new_end <= start:
+            return False
+        # Markup and embed inlines may span or create blocks outside of the
+        # paragraph, so we leave these to the full parse.
+        for block_text in (context.documentText[start:end], text[start:new_end]):
+            if RE_MARKUP.search(block_text) or RE_EMBED.search(block_text):
+                return False
+        # The paragraph is parsed in a scratch context that shares the
+        # document, so that the new nodes use the same tree backend.
+        scratch = ParsingContext(text, markOffsets=context.markOffsets, parser=self)
+        scratch.parser = self
+        # We use the `_document` field so as not to apply the pending shifts.
+        scratch.document = context._document
+        scratch.content = context._document.createElementNS(None, "content")
+        scratch.currentNode = scratch.content
+        scratch._blockTable = context.getBlockTable().update(editStart, editEnd, text)
+        scratch.setOffset(start)
+        if self._findNextBlockSeparator(scratch)[0] != new_end:
+            return False
+        # Some block parsers (like fenced pre blocks) look for their end past
+        # the block separator, in which case the previous block may depend on
+        # the paragraph text.
+        if i > 0:
+            previous_start, previous_end, _ = blocks[i - 1]
+            scratch.setOffset(previous_start)
+            if self._findNextBlockSeparator(scratch)[0] != previous_end:
+                return False
+        scratch.setCurrentBlock(start, new_end)
+        for blockParser in self.blockParsers:
+            scratch.setOffset(start)
+            if blockParser.recognises(scratch):
+                return False
+        scratch.setCurrentBlock(start, new_end)
+        if scratch.getBlockIndentation() != getIndent(node):
+            return False
+        self.defaultBlockParser.process(scratch, True)
+        new_nodes = scratch.content.childNodes
+        if len(new_nodes) != 1 or new_nodes[0].nodeName != node.nodeName:
+            return False
+        new_node = new_nodes[0]
+        # From now on, we update the context, making sure that the offset
+        # nodes are listed before the tree changes.
+        self._getOffsetNodes(context)
+        if context.markOffsets and context._elements is None:
+            context._elements = self._getElements(context)
+        node.parentNode.replaceChild(new_node, node)
+        for name, tag_name in (("_links", "link"), ("_targets", "target")):
+            self._replaceInlineNodes(
+                context, name, tag_name, node, getattr(scratch, name), start
+            )
+        blocks[i] = (start, new_end, new_node)
+        if delta:
+            blocks[i + 1 :] = [(s + delta, e + delta, n) for s, e, n in blocks[i + 1 :]]
+        self._shiftElementOffsets(context, node, new_node, end, delta)
+        context.setDocumentText(text)
+        context._blockTable = scratch._blockTable
+        return True
+
+    def _replaceInlineNodes(self, context, name, tagName, node, newNodes, start):
+        """Replaces the `tagName` elements within `node` by `newNodes` in the
+        `context` list with the given `name`, keeping their position. When
+        `node` had no such elements, the new ones are inserted before the
+        first element that follows the `start` offset of `node`."""
+        nodes = getattr(context, name)
+        removed = set(node.getElementsByTagName(tagName))
+        if not removed:
+            if newNodes:
+                index = next(
+                    (
+                        i
+                        for i, _ in enumerate(nodes)
+                        if self._getSourceStart(context, _) > start
+                    ),
+                    len(nodes),
+                )
+                nodes[index:index] = newNodes
+            return
+        index = next(i for i, _ in enumerate(nodes) if _ in removed)
+        nodes = [_ for _ in nodes if _ not in removed]
+        nodes[index:index] = newNodes
+        setattr(context, name, nodes)
+
+    def _getSourceStart(self, context, node):
+        """Returns the start offset of the given element or, when it has none
+        (like inlines parsed without `markOffsets`), of its closest ancestor
+        that has one."""
+        while node is not None and node.nodeType == node.ELEMENT_NODE:
+            start = self._getShiftedOffsets(context, node)[0]
+            if start is not None:
+                return start
+            node = node.parentNode
+        return 0
+
+    def _getOffsetNodes(self, context):
+        """Returns the elements of the document whose offsets are shifted by
+        `reparse`, in document order. These are the elements that have
+        offsets, except for the ones within tables, as their offsets are
+        relative to the text of their cells (see `TableBlockParser`). The list
+        is built on first use and then kept up to date by `reparse`."""
+        if context._offsetNodes is None:
+            nodes = []
+            stack = [context._document.childNodes[0]]
+            while stack:
+                node = stack.pop()
+                if getOffsets(node) != (None, None):
+                    nodes.append(node)
+                if node.nodeName != "table":
+                    stack.extend(
+                        _
+                        for _ in reversed(node.childNodes)
+                        if _.nodeType == node.ELEMENT_NODE
+                    )
+            context._offsetNodes = nodes
+        return context._offsetNodes
+
+    def _getElements(self, context, root=None):
+        """Returns the elements of the given subtree (or of the document) in
+        document order, which is the order of their numbers."""
+        nodes = []
+        stack = [context._document.childNodes[0] if root is None else root]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(
+                _ for _ in reversed(node.childNodes) if _.nodeType == node.ELEMENT_NODE
+            )
+        return nodes
+
+    def _shiftElementOffsets(self, context, node, newNode, end, delta):
+        """Updates the offsets after `node` was replaced by `newNode`. Rather
+        than shifting the offsets at or after the old `end` by `delta` in every
+        element that follows, which would make each edit as slow as the
+        document is long, the shift is added to the pending shifts of the
+        context, which are applied on the next access to its document or
+        offsets (see `_applyShifts`)."""
+        if context.markOffsets:
+            self._fillElementOffsets(newNode)
+        old_nodes = self._getElements(context, node)
+        new_nodes = self._getElements(context, newNode)
+        offset_nodes = self._getOffsetNodes(context)
+        index = offset_nodes.index(node)
+        count = sum(1 for _ in old_nodes if getOffsets(_) != (None, None))
+        offset_nodes[index : index + count] = [
+            _ for _ in new_nodes if getOffsets(_) != (None, None)
+        ]
+        # The elements are numbered in document order, so the numbers only
+        # change after the paragraph when it has a different number of
+        # elements, in which case they are renumbered with the shift.
+        renumber = sys.maxsize
+        if context.markOffsets:
+            elements = context._elements
+            index = elements.index(node)
+            elements[index : index + len(old_nodes)] = new_nodes
+            for i, element in enumerate(new_nodes, index):
+                setNumber(element, i)
+            if len(old_nodes) != len(new_nodes):
+                renumber = index + len(new_nodes)
+        epochs = context._shiftEpochs
+        for _ in old_nodes:
+            epochs.pop(_, None)
+        if delta or context.markOffsets:
+            context._shifts.append((end, delta, renumber))
+            context._sourceMap = None
+        # The offsets of the new elements already take the shift into account
+        epoch = len(context._shifts)
+        for _ in new_nodes:
+            epochs[_] = epoch
+
+    def _getShiftedOffsets(self, context, node):
+        """Returns the `(start, end)` offsets of the given element once the
+        pending shifts of the context are applied."""
+        start, end = getOffsets(node)
+        for shift_end, delta, _ in context._shifts[context._shiftEpochs.get(node, 0) :]:
+            if start is not None and start >= shift_end:
+                start += delta
+            if end is not None and end >= shift_end:
+                end += delta
+        return start, end
+
+    def _applyShifts(self, context):
+        """Applies the offset shifts that `reparse` left pending to the
+        elements of the document. With `markOffsets`, the elements that follow
+        the paragraphs whose number of elements changed are renumbered and the
+        offset table is rebuilt."""
+        shifts = context._shifts
+        epochs = context._shiftEpochs
+        # All the offset nodes are shifted, as the ancestors and some of the
+        # preceding nodes (like the sections that the paragraph follows) may
+        # end after the paragraph, but the new ones only by the later shifts.
+        for node in self._getOffsetNodes(context):
+            offsets = getOffsets(node)
+            shifted = self._getShiftedOffsets(context, node)
+            if shifted != offsets:
+                setOffsets(node, *shifted)
+        for section in context.sections:
+            section_start = start = int(section[0].getAttribute("_sstart") or -1)
+            for shift_end, delta, _ in shifts[epochs.get(section[0], 0) :]:
+                if start >= shift_end:
+                    start += delta
+            if start != section_start:
+                section[0].setAttribute("_sstart", str(start))
+        if context.markOffsets:
+            elements = context._elements
+            for i in range(min(_[2] for _ in shifts), len(elements)):
+                setNumber(elements[i], i)
+            if isinstance(context._document, Document):
+                # All the elements have offsets at this point
+                table = OffsetTable(
+                    array("l", [_ for e in elements for _ in (e.start, e.end)])
+                )
+            else:
+                table = OffsetTable()
+                for element in elements:
+                    table.append(*getOffsets(element))
+            context.offsets = table
+        context._shifts = []
+        context._shiftEpochs = {}
+
     def _nodeHasOffsets(self, node):
         start, end = self._nodeGetOffsets(node)
         return start != None and end != None
 
     def _nodeGetOffsets(self, node):
-        start = node.getAttributeNS(None, "_start")
-        end = node.getAttributeNS(None, "_end")
-        if start == "":
-            start = None
-        if end == "":
-            end = None
-        if start != None:
-            start = int(start)
-        else:
-            start = None
-        if end != None:
-            end = int(end)
-        else:
-            end = None
-        return (start, end)
+        return getOffsets(node)
 
     def _nodeEnsureOffsets(self, node, start=None, end=None):
-        nstart, nend = self._nodeGetOffsets(node)
-        if nstart is None and start != None:
-            node.setAttributeNS(None, "_start", str(start))
-        if nend is None and end != None:
-            node.setAttributeNS(None, "_end", str(end))
-
-    def _updateElementOffsets(self, context, node=None, counter=0, offsets=None):
-        """This function ensures that every element has a _start and _end
-        attribute indicating the bit of original data it comes from."""
-        if node == None:
-            node = context.document.childNodes[0]
-            self._nodeEnsureOffsets(node, 0, context.documentTextLength)
-        node.setAttributeNS(None, "_number", str(counter))
-        # The given offsets parameter is an array with the node number and the
-        # offsets. It can be used by embedders to easily access nods by offset
-        if offsets != None:
-            assert len(offsets) == counter, "%s != %s" % (len(offsets), counter)
-            this_offsets = [None, None]
-            offsets.append(this_offsets)
-        # The first step is to fill an array with the child nodes offsets
-        # Each child node may or may not have an offset
-        child_nodes = tuple(
-            [n for n in node.childNodes if n.nodeType == n.ELEMENT_NODE]
+        nstart, nend = getOffsets(node)
+        setOffsets(
+            node, start if nstart is None else None, end if nend is None else None
         )
-        nstart, nend = self._nodeGetOffsets(node)
-        if child_nodes:
-            self._nodeEnsureOffsets(child_nodes[0], start=nstart)
-            self._nodeEnsureOffsets(child_nodes[-1], end=nend)
-        child_offsets = []
-        start = end = None
-        for e in child_nodes:
-            counter = self._updateElementOffsets(context, e, counter + 1)
-            child_offsets.append(self._nodeGetOffsets(e))
-        # Once this list is created, we retried the start offset of the earliest
-        # child that has a start offset, same for the end offset of the latest
-        # child
-        child_start = None
-        child_end = None
-        if child_offsets:
-            i = 0
-            j = len(child_offsets) - 1
-            while i < len(child_offsets) and child_offsets[i][0] == None:
-                i += 1
-            while j >= 0 and child_offsets[j][1] == None:
-                j -= 1
-            if i < len(child_offsets):
-                child_start = child_offsets[i][0]
-            if j >= 0:
-                child_end = child_offsets[j][1]
-        # We update the current node with the child offsets (this allows node
-        # that have incomplete offsets to be completed)
-        self._nodeEnsureOffsets(node, child_start, child_end)
-        # And now we update the children offsets again (so that they actually
-        # all have offsets), because we have all the information we need to
-        # actually update the children offsets
-        start, end = self._nodeGetOffsets(node)
-        self._propagateElementOffsets(node, start, end)
-        # As we now the current node offsets, we can set the real values in the
-        # fiven offsets array, by simply updating the offsets value in the
-        # `this_offsets` list.
-        if offsets != None:
-            o = self._nodeGetOffsets(node)
-            this_offsets[0] = o[0]
-            this_offsets[1] = o[1]
-        # And we return the number of this node
-        return counter
-
-    def _propagateElementOffsets(self, element, start=None, end=None):
-        """Used by the _updateElementOffsets to ensure start and end offsets in
-        all children and descendants."""
-        # if start is None or end is None: return
-        child_nodes = list(
-            [n for n in element.childNodes if n.nodeType == n.ELEMENT_NODE]
+
+    def _updateElementOffsets(self, context):
+        """Numbers the elements of the document in document order and ensures
+        that every element has start and end offsets indicating the bit of
+        original data it comes from. Most offsets are set by the parsers as
+        the nodes are created; the missing ones are taken from the first and
+        last children that have offsets, and then from the previous/next
+        siblings or the parent. Returns the `OffsetTable` of the document."""
+        root = context.document.childNodes[0]
+        start, end = getOffsets(root)
+        setOffsets(
+            root,
+            0 if start is None else None,
+            context.documentTextLength if end is None else None,
         )
-        self._nodeEnsureOffsets(element, start, end)
-        # At first, we set the bounds properly, so that the first child node
-        # start is this node start, and the last node end is this node end
-        if child_nodes:
-            self._nodeEnsureOffsets(child_nodes[0], start=start)
-            self._nodeEnsureOffsets(child_nodes[-1], end=end)
-        # Now
-        for child in child_nodes:
-            self._propagateElementOffsets(child, start=start)
-            if self._nodeGetOffsets(child)[1] != None:
-                _, nstart = self._nodeGetOffsets(child)
-                if nstart != None:
-                    start = nstart
-        child_nodes.reverse()
-        for child in child_nodes:
-            self._propagateElementOffsets(child, end=end)
-            if self._nodeGetOffsets(child)[0] != None:
-                nend, _ = self._nodeGetOffsets(child)
-                if nend != None:
-                    end = nend
-        # TODO: Maybe update the element offsetsd
+        table = OffsetTable()
+        for i, node in enumerate(self._fillElementOffsets(root)):
+            setNumber(node, i)
+            table.append(*getOffsets(node))
+        return table
+
+    def _fillElementOffsets(self, root):
+        """Sets the missing offsets of the elements in the given subtree, whose
+        root must have offsets, and returns these elements in document
+        order."""
+        # We flatten the tree in document order, so that the number of an
+        # element is its index in the `nodes` list.
+        nodes = []
+        children = []
+        stack = [(root, None)]
+        while stack:
+            node, parent = stack.pop()
+            if parent is not None:
+                children[parent].append(len(nodes))
+            stack.extend(
+                (_, len(nodes))
+                for _ in reversed(node.childNodes)
+                if _.nodeType == node.ELEMENT_NODE
+            )
+            nodes.append(node)
+            children.append([])
+        count = len(nodes)
+        starts = [None] * count
+        ends = [None] * count
+        for i, node in enumerate(nodes):
+            starts[i], ends[i] = getOffsets(node)
+        # Top-down, the first and last children without offsets take the
+        # start and end of their parent, so that the elements that contain
+        # the rest of the document (like `content`) end where it ends.
+        for i in range(count):
+            kids = children[i]
+            if kids:
+                if starts[kids[0]] is None:
+                    starts[kids[0]] = starts[i]
+                if ends[kids[-1]] is None:
+                    ends[kids[-1]] = ends[i]
+        # Bottom-up, elements without offsets take the start of their
+        # first child and the end of their last child that have offsets.
+        for i in range(count - 1, -1, -1):
+            kids = children[i]
+            if kids and starts[i] is None:
+                starts[i] = next(
+                    (starts[_] for _ in kids if starts[_] is not None), None
+                )
+            if kids and ends[i] is None:
+                ends[i] = next(
+                    (ends[_] for _ in reversed(kids) if ends[_] is not None), None
+                )
+        # Top-down, the remaining gaps are filled with the end of the
+        # previous sibling (or the parent start) and with the start of the
+        # next sibling (or the parent end).
+        for i in range(count):
+            kids = children[i]
+            if not kids:
+                continue
+            start = starts[i]
+            for k in kids:
+                if starts[k] is None:
+                    starts[k] = start
+                if ends[k] is not None:
+                    start = ends[k]
+            end = ends[i]
+            for k in reversed(kids):
+                if ends[k] is None:
+                    ends[k] = end
+                if starts[k] is not None:
+                    end = starts[k]
+        for i, node in enumerate(nodes):
+            setOffsets(node, starts[i], ends[i])
+        return nodes
 
     # TEXT PROCESSING UTILITIES________________________________________________
 
@@ -971,4 +1854,52 @@ class Parser:
         return new_text
 
 
+# ------------------------------------------------------------------------------
+#
+# FINGERPRINTS
+#
+# ------------------------------------------------------------------------------
+
+# Maps module names to the hash of their source (see `Parser.getFingerprint`)
+MODULE_HASHES = {}
+
+
+def _describe(value, fields=True) -> str:
+    """Returns a description of the given parser (or parser setting) that
+    changes when its settings change. The objects found in the settings are
+    only described by their class."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return repr(value)
+    elif isinstance(value, re.Pattern):
+        return "re(%r,%d)" % (value.pattern, value.flags)
+    elif isinstance(value, (list, tuple)):
+        return "[%s]" % (",".join(_describe(_, False) for _ in value))
+    elif callable(value) and hasattr(value, "__qualname__"):
+        return "%s.%s" % (value.__module__, value.__qualname__)
+    name = "%s.%s" % (value.__class__.__module__, value.__class__.__qualname__)
+    if fields and hasattr(value, "__dict__"):
+        return "%s(%s)" % (
+            name,
+            ",".join(
+                "%s=%s" % (k, _describe(v, False))
+                for k, v in sorted(vars(value).items())
+            ),
+        )
+    return name
+
+
+def _getModuleHash(name) -> str:
+    digest = MODULE_HASHES.get(name)
+    if digest is None:
+        module = sys.modules.get(name)
+        path = getattr(module, "__file__", None)
+        if path:
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        else:
+            digest = name
+        MODULE_HASHES[name] = digest
+    return digest
+
+
 # EOF - vim: tw=80 ts=4 sw=4 et
@@ -14,6 +14,8 @@ import re
 
 # FIXME: Not great
 from . import *
+from .inlines import firstCharacters
+from ..tree import setOffsets, getIndent, setIndent
 
 __pychecker__ = "unusednames=recogniseInfo,content"
 
@@ -107,6 +109,16 @@ RE_REFERENCE_ENTRY = re.compile(REFERENCE_ENTRY, re.MULTILINE)
 TABLE_ROW_SEPARATOR = r"^\s*([\-\+]+|[\=\+]+)\s*$"
 RE_TABLE_ROW_SEPARATOR = re.compile(TABLE_ROW_SEPARATOR)
 
+# Block signatures, matched at the first non-space character of a block (see
+# `BlockParser.signature`)
+RE_NOT_SPACE = re.compile(r"\S")
+RE_SIGNATURE_SECTION = re.compile(
+    r"[0-9A-z]+\.|#|[\*\-\=#]{3}|.*?\n\s*[\*\-\=#]{3}", re.DOTALL
+)
+RE_SIGNATURE_DEFINITION = re.compile(r".*?::", re.DOTALL)
+RE_SIGNATURE_LIST_ITEM = re.compile(r"-|\*\)|[0-9A-z]+[\)/]|\[[ \-\~xX]\]")
+RE_SIGNATURE_TAGGED_BLOCK = re.compile(r".*___")
+
 LANGUAGE_CODES = ("EN", "FR", "DE", "UK")
 
 # ------------------------------------------------------------------------------
@@ -126,6 +138,13 @@ ERROR_TITLE_TOO_DEEPLY_NESTED = "Title too deeply nested"
 
 class BlockParser:
 
+    # What the first non-space character of the blocks this parser recognises
+    # looks like: either a string of the characters it can be, or a compiled
+    # regexp that matches there, or None when it can be anything. This is
+    # used by the `BlockIndex` to skip the parsers that cannot recognise a
+    # block, and so must hold for every block `recognises` accepts.
+    signature = None
+
     def __init__(self, name=None):
         self.name = name or self.__class__.__name__.rsplit(".", 1)[-1]
 
@@ -167,8 +186,8 @@ class ParagraphBlockParser(BlockParser):
         # is lower or equal to this paragraph
         while (
             context.currentNode.nodeName not in BLOCK_ELEMENTS
-            or context.currentNode.getAttribute("_indent")
-            and int(context.currentNode.getAttribute("_indent")) > paragraph_depth
+            or getIndent(context.currentNode) is not None
+            and getIndent(context.currentNode) > paragraph_depth
         ):
             context.currentNode = context.currentNode.parentNode
         # If the currentNode last element is a paragraph with a higher
@@ -178,19 +197,17 @@ class ParagraphBlockParser(BlockParser):
         if (
             context.currentNode.childNodes
             and context.currentNode.childNodes[-1].nodeName == "p"
-            and context.currentNode.childNodes[-1].getAttribute("_indent")
-            and int(context.currentNode.childNodes[-1].getAttribute("_indent"))
-            < paragraph_depth
+            and getIndent(context.currentNode.childNodes[-1]) is not None
+            and getIndent(context.currentNode.childNodes[-1]) < paragraph_depth
         ):
             block_node = context.document.createElementNS(None, "Block")
-            block_node.setAttributeNS(None, "_indent", str(paragraph_depth))
+            setIndent(block_node, paragraph_depth)
             context.currentNode.appendChild(block_node)
             context.currentNode = block_node
         # Now we can process the document
         para_node = context.document.createElementNS(None, self.name)
-        para_node.setAttributeNS(None, "_indent", str(paragraph_depth))
-        para_node.setAttributeNS(None, "_start", str(context.blockStartOffset))
-        para_node.setAttributeNS(None, "_end", str(context.blockEndOffset))
+        setIndent(para_node, paragraph_depth)
+        setOffsets(para_node, context.blockStartOffset, context.blockEndOffset)
         context.parser.parseBlock(context, para_node, self.processText)
         # Now we suppress leading and trailing whitespaces
         if para_node.childNodes:
@@ -246,6 +263,8 @@ class TaggedBlockParser(BlockParser):
     """Parses a tagged block. Notes are the common example of tagged
     block."""
 
+    signature = RE_SIGNATURE_TAGGED_BLOCK
+
     def __init__(self):
         BlockParser.__init__(self, "tagged-block")
 
@@ -253,7 +272,7 @@ class TaggedBlockParser(BlockParser):
         lines = [l for l in context.currentFragment().split("\n") if l.strip()]
         if not lines:
             return
-        return RE_TAGGED_BLOCK.match(lines[0])
+        return context.matchText(RE_TAGGED_BLOCK, lines[0])
 
     def _goToParent(self, parent):
         if not parent:
@@ -272,7 +291,7 @@ class TaggedBlockParser(BlockParser):
             block_depth = context.getBlockIndentation()
             block_node = context.document.createElementNS(None, "block")
             block_node.setAttributeNS(None, "type", tagname.strip().lower())
-            block_node.setAttributeNS(None, "_indent", str(block_depth))
+            setIndent(block_node, block_depth)
             if tagtitle:
                 block_node.setAttributeNS(None, "title", tagtitle[1:].strip())
             # We get to a content node
@@ -300,6 +319,8 @@ class TaggedBlockParser(BlockParser):
 class CommentBlockParser(BlockParser):
     """Parses a comment markup block."""
 
+    signature = "/"
+
     def __init__(self):
         BlockParser.__init__(self, "comment-block")
 
@@ -336,6 +357,8 @@ class CommentBlockParser(BlockParser):
 class MarkupBlockParser(BlockParser):
     """Parses a custom markup block."""
 
+    signature = "<"
+
     def __init__(self):
         BlockParser.__init__(self, "markup")
 
@@ -394,6 +417,8 @@ class MarkupBlockParser(BlockParser):
 class TitleBlockParser(BlockParser):
     """Parses a title object"""
 
+    signature = "=-"
+
     def __init__(self):
         BlockParser.__init__(self, "title")
 
@@ -402,7 +427,7 @@ class TitleBlockParser(BlockParser):
         if context.content.childNodes:
             return None
         while not context.blockEndReached():
-            match = RE_TITLES.match(context.currentFragment())
+            match = context.matchText(RE_TITLES, context.currentFragment())
             if match != None:
                 context.increaseOffset(match.end())
                 matches.append(match)
@@ -469,11 +494,13 @@ class TitleBlockParser(BlockParser):
 class SeparatedBlockParser(BlockParser):
     """Look for `-- block attr=value` and creates a new content block for it."""
 
+    signature = "-"
+
     def __init__(self):
         super().__init__(name="content")
 
     def recognises(self, context):
-        match = RE_BLOCK_SEPARATOR.match(context.currentFragment())
+        match = context.matchText(RE_BLOCK_SEPARATOR, context.currentFragment())
         return [match] if match else None
 
     def _processLine(self, line):
@@ -487,9 +514,8 @@ class SeparatedBlockParser(BlockParser):
         end = context.getOffset() + match.end()
         node = context.document.createElementNS(None, "content")
         node.setAttributeNS(None, "type", str(match.group("name")))
-        node.setAttributeNS(None, "_start", str(start))
-        node.setAttributeNS(None, "_end", str(end))
-        node.setAttributeNS(None, "_indent", str(-1))
+        setOffsets(node, start, end)
+        setIndent(node, -1)
         node.setAttributeNS(None, "depth", str(0))
         for k, v in context.parseAttributes(match.group("attributes")).items():
             node.setAttributeNS(None, k, v)
@@ -509,25 +535,29 @@ class SeparatedBlockParser(BlockParser):
 class SectionBlockParser(BlockParser):
     """Parses a section markup element."""
 
+    signature = RE_SIGNATURE_SECTION
+
     def __init__(self):
         BlockParser.__init__(self, "section")
 
     def recognises(self, context):
         # We look for the number prefix
-        match = RE_SECTION_HEADING.match(context.currentFragment())
+        match = context.matchText(RE_SECTION_HEADING, context.currentFragment())
         # We return directly if there are at least two section numbers (2.3)
         if match:
-            match_underline = RE_SECTION_UNDERLINE.search(context.currentFragment())
+            match_underline = context.searchText(
+                RE_SECTION_UNDERLINE, context.currentFragment()
+            )
             if match_underline:
                 return (RE_SECTION_UNDERLINE, match_underline)
             else:
                 return (RE_SECTION_HEADING, match)
         # We return directly for a section prefixed by '=='
-        match_alt = RE_SECTION_HEADING_ALT.match(context.currentFragment())
+        match_alt = context.matchText(RE_SECTION_HEADING_ALT, context.currentFragment())
         if match_alt:
             return (RE_SECTION_HEADING_ALT, match_alt)
         # Or a separator followed by blank space
-        match = RE_SECTION_UNDERLINE.search(context.currentFragment())
+        match = context.searchText(RE_SECTION_UNDERLINE, context.currentFragment())
         if match:
             # If we reached the end of the block, and that there is something
             # before, this OK
@@ -538,7 +568,9 @@ class SectionBlockParser(BlockParser):
                 return (RE_SECTION_UNDERLINE, match)
             # Otherwise the rest must be blank
             else:
-                blank_match = RE_BLANK.match(context.currentFragment()[match.end() :])
+                blank_match = context.matchText(
+                    RE_BLANK, context.currentFragment()[match.end() :]
+                )
                 # The rest is blank, it's OK
                 if (
                     blank_match.end() + match.end() + context.getOffset()
@@ -587,7 +619,7 @@ class SectionBlockParser(BlockParser):
 
         # We look for a number prefix
         heading_text = context.fragment(block_start, block_end)
-        prefix_match = RE_SECTION_HEADING.match(heading_text)
+        prefix_match = context.matchText(RE_SECTION_HEADING, heading_text)
         dots_count = 0
         if prefix_match:
             res = prefix_match.group()
@@ -596,7 +628,9 @@ class SectionBlockParser(BlockParser):
         if matched_type == RE_SECTION_HEADING_ALT:
             dots_count += len(match.group(1))
         # We make sure that we end the section before the block delimiter
-        delim_match = RE_SECTION_UNDERLINE.search(context.currentFragment())
+        delim_match = context.searchText(
+            RE_SECTION_UNDERLINE, context.currentFragment()
+        )
         if delim_match:
             block_end = context.getOffset() + delim_match.start()
         context.currentNode = context.getParentSection(
@@ -607,10 +641,9 @@ class SectionBlockParser(BlockParser):
         # SECOND STEP - We create the section
         #
         section_node = context.document.createElementNS(None, section_type)
-        section_node.setAttributeNS(None, "_indent", str(section_indent))
+        setIndent(section_node, section_indent)
         section_node.setAttributeNS(None, "depth", str(section_depth))
-        section_node.setAttributeNS(None, "_start", str(block_start))
-        section_node.setAttributeNS(None, "_end", str(block_end))
+        setOffsets(section_node, block_start, block_end)
         section_node.setAttributeNS(None, "_sstart", str(block_start))
         section_node.setAttributeNS(
             None, "id", str(context.asKey(heading_text, section_node))
@@ -624,7 +657,7 @@ class SectionBlockParser(BlockParser):
         context.restoreOffsets(offsets)
         # Now we create a Content node
         content_node = context.document.createElementNS(None, "content")
-        content_node.setAttributeNS(None, "_indent", str(section_indent))
+        setIndent(content_node, section_indent)
         section_node.appendChild(content_node)
         # We append the section node and assign it as current node
         context.currentNode.appendChild(section_node)
@@ -645,11 +678,13 @@ class SectionBlockParser(BlockParser):
 class DefinitionBlockParser(BlockParser):
     """Parses a definition markup element."""
 
+    signature = RE_SIGNATURE_DEFINITION
+
     def __init__(self):
         BlockParser.__init__(self, "definition-list")
 
     def recognises(self, context):
-        return RE_DEFINITION_ITEM.match(context.currentFragment())
+        return context.matchText(RE_DEFINITION_ITEM, context.currentFragment())
 
     def _getParentDefinition(self, node):
         while node and node.nodeName != "definition-list":
@@ -667,25 +702,26 @@ class DefinitionBlockParser(BlockParser):
                     break
                 if parent_node.parentNode.nodeType == parent_node.DOCUMENT_NODE:
                     break
-                if not parent_node.getAttributeNS(None, "_indent"):
+                if getIndent(parent_node) is None:
                     break
-                if int(parent_node.getAttributeNS(None, "_indent")) <= _indent:
+                if getIndent(parent_node) <= _indent:
                     break
                 parent_node = parent_node.parentNode
                 if parent_node.nodeName not in BLOCK_ELEMENTS:
                     continue
             context.currentNode = parent_node
             definition_node = context.document.createElementNS(None, "definition-list")
-            definition_node.setAttributeNS(None, "_indent", str(_indent))
+            setIndent(definition_node, _indent)
             context.currentNode.appendChild(definition_node)
             parent_node = definition_node
         # Creates the definition item
         definition_item = context.document.createElementNS(None, "definition-item")
-        definition_item.setAttributeNS(None, "_indent", str(_indent + 1))
+        setIndent(definition_item, _indent + 1)
         definition_title = context.document.createElementNS(None, "title")
-        definition_title.setAttributeNS(None, "_start", str(context.blockStartOffset))
-        definition_title.setAttributeNS(
-            None, "_end", str(context.blockStartOffset + len(match.group()))
+        setOffsets(
+            definition_title,
+            context.blockStartOffset,
+            context.blockStartOffset + len(match.group()),
         )
         # Parse the content of the definition title
         offsets = context.saveOffsets()
@@ -696,11 +732,12 @@ class DefinitionBlockParser(BlockParser):
         context.restoreOffsets(offsets)
         # And continue the processing
         definition_content = context.document.createElementNS(None, "content")
-        definition_content.setAttributeNS(None, "_indent", str(_indent + 1))
-        definition_content.setAttributeNS(
-            None, "_start", str(context.blockStartOffset + match.end())
+        setIndent(definition_content, _indent + 1)
+        setOffsets(
+            definition_content,
+            context.blockStartOffset + match.end(),
+            context.blockEndOffset,
         )
-        definition_content.setAttributeNS(None, "_end", str(context.blockEndOffset))
         definition_item.appendChild(definition_title)
         definition_item.appendChild(definition_content)
         parent_node.appendChild(definition_item)
@@ -733,11 +770,13 @@ class DefinitionBlockParser(BlockParser):
 class ListItemBlockParser(BlockParser):
     """Parses a list item. A list item is an element within a list."""
 
+    signature = RE_SIGNATURE_LIST_ITEM
+
     def __init__(self):
         BlockParser.__init__(self, "list-item")
 
     def recognises(self, context):
-        return RE_LIST_ITEM.match(context.currentFragment())
+        return context.matchText(RE_LIST_ITEM, context.currentFragment())
 
     def process(self, context, itemMatch):
         # These two lines will reuse a previous list item as the current node
@@ -766,7 +805,9 @@ class ListItemBlockParser(BlockParser):
         # current fragment, or at the beginning of the next fragment.
         next_eol = context.currentFragment().find("\n")
         if next_eol != -1:
-            next_item_match = RE_LIST_ITEM.search(context.currentFragment(), next_eol)
+            next_item_match = context.searchText(
+                RE_LIST_ITEM, context.currentFragment(), next_eol
+            )
         else:
             next_item_match = None
 
@@ -780,7 +821,7 @@ class ListItemBlockParser(BlockParser):
         indent = context.parser.getIndentation(itemMatch.group(0))
 
         # We look for the optional list heading
-        heading = RE_LIST_ITEM_HEADING.match(current_item_text)
+        heading = context.matchText(RE_LIST_ITEM_HEADING, current_item_text)
         heading_offset = 0
         list_type = STANDARD_LIST
         item_type = STANDARD_ITEM
@@ -804,7 +845,7 @@ class ListItemBlockParser(BlockParser):
             elif head == "[X]":
                 item_type = TODO_DONE_ITEM
                 list_type = TODO_LIST
-            elif RE_NUMBER.match(head):
+            elif context.matchText(RE_NUMBER, head):
                 list_type = ORDERED_LIST
 
         # The current_item_text is no longer used in the following code
@@ -819,9 +860,9 @@ class ListItemBlockParser(BlockParser):
         # or a ListItem.
         while (
             context.currentNode.nodeName == "list"
-            and int(context.currentNode.getAttributeNS(None, "_indent")) > indent
+            and getIndent(context.currentNode) > indent
             or context.currentNode.nodeName == "list-item"
-            and int(context.currentNode.getAttributeNS(None, "_indent")) >= indent
+            and getIndent(context.currentNode) >= indent
         ):
             context.currentNode = context.currentNode.parentNode
 
@@ -833,7 +874,7 @@ class ListItemBlockParser(BlockParser):
             # A List should always have a least one ListItem
             items = context._getElementsByTagName(context.currentNode, "list-item")
             assert len(items) > 0
-            if int(items[-1].getAttributeNS(None, "_indent")) < indent:
+            if getIndent(items[-1]) < indent:
                 context.currentNode = items[-1]
 
         # We may need to create a new "list" node to hold our list items
@@ -841,23 +882,21 @@ class ListItemBlockParser(BlockParser):
         # If the current node is not a list, then we must create a new list
         if context.currentNode.nodeName != "list":
             list_node = context.document.createElementNS(None, "list")
-            list_node.setAttributeNS(None, "_indent", str(indent))
+            setIndent(list_node, indent)
             context.currentNode.appendChild(list_node)
             context.currentNode = list_node
         # We create the list item
         list_item_node = context.document.createElementNS(None, "list-item")
-        list_item_node.setAttributeNS(None, "_indent", str(indent))
+        setIndent(list_item_node, indent)
         if item_type == TODO_ITEM:
             list_item_node.setAttributeNS(None, "todo", "true")
         elif item_type == TODO_DONE_ITEM:
             list_item_node.setAttributeNS(None, "todo", "done")
-        list_item_node.setAttributeNS(None, "_start", str(context.getOffset()))
         if next_item_match:
-            list_item_node.setAttributeNS(
-                None, "_end", str(context.getOffset() + next_item_match.start() - 1)
-            )
+            list_item_end = context.getOffset() + next_item_match.start() - 1
         else:
-            list_item_node.setAttributeNS(None, "_end", str(context.blockEndOffset))
+            list_item_end = context.blockEndOffset
+        setOffsets(list_item_node, context.getOffset(), list_item_end)
         # and the optional heading
         if heading:
             offsets = context.saveOffsets()
@@ -928,19 +967,21 @@ class PreBlockParser(BlockParser):
     """Parses the content of a preformatted block, where every line is
     prefixed by '>   '."""
 
+    signature = ">"
+
     def __init__(self):
         BlockParser.__init__(self, "pre")
 
     def recognises(self, context):
         for line in context.currentFragment().split("\n"):
-            if line and not RE_PREFORMATTED.match(line):
+            if line and not context.matchText(RE_PREFORMATTED, line):
                 return False
         return True
 
     def process(self, context, recogniseInfo):
         text = ""
         for line in context.currentFragment().split("\n"):
-            match = RE_PREFORMATTED.match(line)
+            match = context.matchText(RE_PREFORMATTED, line)
             if match:
                 text += match.group(3) + "\n"
             else:
@@ -949,8 +990,7 @@ class PreBlockParser(BlockParser):
             text = text[:-1]
         pre_node = context.document.createElementNS(None, self.name)
         pre_node.appendChild(context.document.createTextNode(text))
-        pre_node.setAttributeNS(None, "_start", str(context.getOffset()))
-        pre_node.setAttributeNS(None, "_end", str(context.blockEndOffset))
+        setOffsets(pre_node, context.getOffset(), context.blockEndOffset)
         context.currentNode.appendChild(pre_node)
 
 
@@ -967,6 +1007,7 @@ class PreBlockParser2(BlockParser):
 
     START_PATTERN = PREFORMATTED_2_START
     END_PATTERN = PREFORMATTED_2_END
+    signature = "`"
 
     def __init__(self):
         BlockParser.__init__(self, "pre")
@@ -984,13 +1025,13 @@ class PreBlockParser2(BlockParser):
             return False
 
     def isStartLine(self, context, line):
-        return self.START_PATTERN.match(line)
+        return context.matchText(self.START_PATTERN, line)
 
     def isEndLine(self, context, line, indent):
         line_indent = context.parser.getIndentation(line)
         if line_indent != indent:
             return False
-        return self.END_PATTERN.match(line)
+        return context.matchText(self.END_PATTERN, line)
 
     def findBlockEnd(self, context, indent):
         # FIXME: Issue a warning if no end is found
@@ -1028,14 +1069,6 @@ class PreBlockParser2(BlockParser):
             cur_offset = block_end
         return block_end - 1
 
-    def getLeadingSpaces(self, context, offset):
-        e = offset
-        o = e
-        t = context.documentText
-        while o > 0 and t[o] in " \t":
-            o -= 1
-        return t[o + 1 : e]
-
     def process(self, context, recognised):
         result = []
         _, indent, match = recognised
@@ -1047,20 +1080,21 @@ class PreBlockParser2(BlockParser):
         while not lines[0]:
             lines = lines[1:]
         lines = lines[1:-1]
-        prefix = self.getLeadingSpaces(
-            context, context.blockStartOffset - len(match.group(0)) - 1
-        )
+        # The lines are unindented by the leading spaces of the start line,
+        # which are the first group of the start pattern. Lines that are less
+        # indented than the start line only lose the spaces they have.
+        width = len(match.group(1))
         if lines:
             for line in lines:
-                line = line[len(prefix) :].replace("\t", TAB_VALUE)
-                result.append(line)
+                head = line[:width]
+                line = line[len(head) - len(head.lstrip(" \t")) :]
+                result.append(line.replace("\t", TAB_VALUE))
         text = "\n".join(result)
         pre_node = context.document.createElementNS(None, self.name)
         pre_node.appendChild(context.document.createTextNode(text))
         if lang:
             pre_node.setAttributeNS(None, "data-lang", lang)
-        pre_node.setAttributeNS(None, "_start", str(context.getOffset()))
-        pre_node.setAttributeNS(None, "_end", str(context.blockEndOffset))
+        setOffsets(pre_node, context.getOffset(), context.blockEndOffset)
         context.currentNode.appendChild(pre_node)
 
 
@@ -1184,6 +1218,8 @@ class Table:
 class TableBlockParser(BlockParser):
     """Parses the content of a tables"""
 
+    signature = "=-+"
+
     def __init__(self):
         BlockParser.__init__(self, "table")
 
@@ -1191,14 +1227,14 @@ class TableBlockParser(BlockParser):
         lines = context.currentFragment().strip().split("\n")
         if not len(lines) > 1:
             return False
-        title_match = RE_TITLE.match(lines[0])
+        title_match = context.matchText(RE_TITLE, lines[0])
         if title_match:
             if not len(lines) >= 3:
                 return False
-            start_match = RE_TABLE_ROW_SEPARATOR.match(lines[1])
+            start_match = context.matchText(RE_TABLE_ROW_SEPARATOR, lines[1])
         else:
-            start_match = RE_TABLE_ROW_SEPARATOR.match(lines[0])
-        end_match = RE_TABLE_ROW_SEPARATOR.match(lines[-1])
+            start_match = context.matchText(RE_TABLE_ROW_SEPARATOR, lines[0])
+        end_match = context.matchText(RE_TABLE_ROW_SEPARATOR, lines[-1])
         return start_match and end_match
 
     def process(self, context, recogniseInfo):
@@ -1207,7 +1243,7 @@ class TableBlockParser(BlockParser):
         # For each cell in a row
         rows = context.currentFragment().strip().split("\n")[:-1]
         # We take care of the title
-        title_match = RE_TITLE.match(rows[0])
+        title_match = context.matchText(RE_TITLE, rows[0])
         if title_match:
             title_name = title_match.group(2).split("#", 1)
             title_id = None
@@ -1228,7 +1264,7 @@ class TableBlockParser(BlockParser):
             # Empty rows are simply ignored
             if not row.strip():
                 continue
-            separator = RE_TABLE_ROW_SEPARATOR.match(row)
+            separator = context.matchText(RE_TABLE_ROW_SEPARATOR, row)
             # If we have not found a separator yet, we simply ensure that the
             # cell exists and appends content to it
             if not separator:
@@ -1296,6 +1332,7 @@ class MetaBlockParser(BlockParser):
 
     START_PATTERN = RE_META_START
     END_PATTERN = RE_META_END
+    signature = "-"
 
     def __init__(self):
         BlockParser.__init__(self, "meta")
@@ -1306,7 +1343,7 @@ class MetaBlockParser(BlockParser):
             head_lines = head_lines[1:]
         if not head_lines:
             return False
-        match = self.START_PATTERN.match(head_lines[0])
+        match = context.matchText(self.START_PATTERN, head_lines[0])
         if match:
             return True, context.parser.getIndentation(head_lines[0]), match
         else:
@@ -1343,12 +1380,14 @@ class MetaBlockParser(BlockParser):
 class ReferenceEntryBlockParser(BlockParser):
     """Parses the content of a Reference entry"""
 
+    signature = "["
+
     def __init__(self):
         BlockParser.__init__(self, "entry")
 
     def recognises(self, context):
         assert context
-        return RE_REFERENCE_ENTRY.match(context.currentFragment())
+        return context.matchText(RE_REFERENCE_ENTRY, context.currentFragment())
 
     def process(self, context, match):
         offsets = context.saveOffsets()
@@ -1356,7 +1395,9 @@ class ReferenceEntryBlockParser(BlockParser):
         offset = 0
         # We get the start and end offsets of entry blocks
         while True:
-            m = RE_REFERENCE_ENTRY.search(context.currentFragment(), offset)
+            m = context.searchText(
+                RE_REFERENCE_ENTRY, context.currentFragment(), offset
+            )
             if not m:
                 break
             ranges.append((m, m.start()))
@@ -1382,4 +1423,63 @@ class ReferenceEntryBlockParser(BlockParser):
         context.restoreOffsets(offsets)
 
 
+# ------------------------------------------------------------------------------
+#
+# BLOCK INDEX
+#
+# ------------------------------------------------------------------------------
+
+
+class BlockIndex:
+    """Gives the block parsers of a list that may recognise a block, in the
+    order of the list, out of the first non-space character of the block and
+    the `signature` of the parsers. The candidates of each character are
+    computed on first use.
+
+    Plain paragraphs usually start with a letter that only the parsers with
+    a regexp signature accept, and these regexps are matched in the document
+    text without copying the block, so that most paragraphs go to the default
+    block parser without any parser splitting them into lines."""
+
+    def __init__(self, blockParsers):
+        self.parsers = tuple(blockParsers)
+        # A list of (parser, characters, regexp) where characters is a
+        # compiled class of the characters the block can start with, or None
+        self.signatures = []
+        for parser in self.parsers:
+            signature = parser.signature
+            if signature is None:
+                self.signatures.append((parser, None, None))
+            elif isinstance(signature, str):
+                characters = re.compile("[%s]" % (re.escape(signature)))
+                self.signatures.append((parser, characters, None))
+            else:
+                start = firstCharacters(signature)
+                characters = re.compile("[%s]" % (start)) if start else None
+                self.signatures.append((parser, characters, signature))
+        # Maps a character to the (parser, regexp) of its candidates
+        self._candidates = {}
+
+    def getCandidates(self, text, start, end):
+        """Yields the parsers that may recognise the block of the given text
+        from `start` to `end`. Blank blocks may be recognised by any
+        parser."""
+        match = RE_NOT_SPACE.search(text, start, end)
+        if not match:
+            yield from self.parsers
+            return
+        character = match.group()
+        offset = match.start()
+        candidates = self._candidates.get(character)
+        if candidates is None:
+            candidates = self._candidates[character] = tuple(
+                (parser, regexp)
+                for parser, characters, regexp in self.signatures
+                if characters is None or characters.match(character)
+            )
+        for parser, regexp in candidates:
+            if regexp is None or regexp.match(text, offset, end):
+                yield parser
+
+
 # EOF
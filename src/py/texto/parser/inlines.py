@@ -9,6 +9,15 @@
 # -----------------------------------------------------------------------------
 
 import re
+import functools
+from ..tree import setOffsets, setIndent
+from ..stats import getInlineFrameName
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
 
 # ------------------------------------------------------------------------------
 #
@@ -138,6 +147,77 @@ def _processText(context, text):
     return text
 
 
+# ------------------------------------------------------------------------------
+#
+# FRAGMENT MATCH
+#
+# ------------------------------------------------------------------------------
+
+
+class FragmentMatch:
+    """Wraps a match found in the document text (with absolute offsets) so
+    that it behaves like a match found in the current fragment, ie. with
+    offsets relative to the context offset at recognition time. This is what
+    allows inline parsers to keep the relative `recognises`/`parse` protocol
+    while the document text is never copied.
+
+    The absolute match is available as `match`."""
+
+    __slots__ = ("match", "offset")
+
+    def __init__(self, match, offset):
+        self.match = match
+        self.offset = offset
+
+    @property
+    def string(self):
+        return self.match.string[self.offset : self.match.endpos]
+
+    @property
+    def re(self):
+        return self.match.re
+
+    @property
+    def lastindex(self):
+        return self.match.lastindex
+
+    @property
+    def lastgroup(self):
+        return self.match.lastgroup
+
+    def start(self, group=0):
+        start = self.match.start(group)
+        return start if start == -1 else start - self.offset
+
+    def end(self, group=0):
+        end = self.match.end(group)
+        return end if end == -1 else end - self.offset
+
+    def span(self, group=0):
+        return (self.start(group), self.end(group))
+
+    def group(self, *groups):
+        return self.match.group(*groups)
+
+    def groups(self, default=None):
+        return self.match.groups(default)
+
+    def groupdict(self, default=None):
+        return self.match.groupdict(default)
+
+    def expand(self, template):
+        return self.match.expand(template)
+
+    def __getitem__(self, group):
+        return self.match[group]
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return "<FragmentMatch span=%s, match=%r>" % (self.span(), self.group())
+
+
 # ------------------------------------------------------------------------------
 #
 # INLINE PARSER
@@ -176,7 +256,7 @@ class InlineParser:
         'requiresLeadingSpace'."""
         if match.start() == 0:
             return True
-        previous_char = context.currentFragment()[match.start() - 1]
+        previous_char = context.documentText[context.getOffset() + match.start() - 1]
         return previous_char in " \t();:-!?"
 
     def recognises(self, context):
@@ -185,17 +265,69 @@ class InlineParser:
         otherwise it returns the offset of the matching element in the current
         context, plus information that will be given as argument to the parse
         method. This means that the returned offset is RELATIVE TO THE CURRENT
-        CONTEXT OFFSET."""
-        match = self.regexp.search(context.currentFragment())
-        fragment = context.currentFragment()
+        CONTEXT OFFSET.
+
+        The regexp is searched in the document text rather than in a copy of
+        the current fragment, and the returned match is a `FragmentMatch`
+        that has offsets relative to the context offset. The anchors of
+        positional parsers (see `isPositional`) still match at the current
+        offset, first trying the regexp there, which only copies the rest of
+        the block when the offset is not at a line start."""
+        offset = context.getOffset()
+        match = None
+        if self.isPositional():
+            if offset == 0 or context.documentText[offset - 1] == "\n":
+                match = context.match(self.regexp)
+            else:
+                match = context.matchText(self.regexp, context.currentFragment())
+                offset = 0 if match else offset
+        if not match:
+            match = context.search(self.regexp)
         if match:
-            match_start = max(0, match.start() - 1)
+            match = FragmentMatch(match, offset)
             if self.requiresLeadingSpace and not self._recognisesBefore(context, match):
                 return (None, None)
             return (match.start(), match)
         else:
             return (None, None)
 
+    def isScannable(self):
+        """Tells if this parser can be folded into the master expression of an
+        `InlineScanner`. This is only the case for parsers that rely on the
+        default `recognises` implementation, as the scanner then knows that
+        the parser matches wherever its regexp matches."""
+        return (
+            self.regexp is not None
+            and not self.requiresLeadingSpace
+            and type(self).recognises is InlineParser.recognises
+            and not self.isPositional()
+        )
+
+    def isPositional(self):
+        """Tells if the regexp of this parser is anchored with `^`, in which
+        case it also matches at the current offset (see `recognises`). As
+        that offset moves with the parsed inlines, positional parsers are
+        neither scannable nor monotonic."""
+        return self.regexp is not None and isPositional(self.regexp)
+
+    def isMonotonic(self):
+        """Tells if `recognises` behaves like a forward search within the
+        current block: the match found from an offset is also the next match
+        from any later offset up to its start, and no match means that there
+        is none for the rest of the block. The matches of monotonic parsers
+        are memoized by the `InlineScanner`."""
+        return self.isScannable()
+
+    def getTriggers(self):
+        """Returns the literal strings one of which at least is part of any
+        inline this parser recognises, or None when they are not known. The
+        `InlineScanner` skips the parser for the blocks that contain none of
+        them. The triggers are derived from the regexp, so parsers that
+        define their own `recognises` have to define their triggers too."""
+        if self.regexp is None or type(self).recognises is not InlineParser.recognises:
+            return None
+        return literalTriggers(self.regexp)
+
     def endOf(self, recogniseInfo):
         """Returns the end of this inline using the given recogniseInfo."""
         return recogniseInfo.end()
@@ -307,9 +439,6 @@ class PreInlineParser(InlineParser):
     def __init__(self):
         InlineParser.__init__(self, "pre", PRE)
 
-    def recognises(self, context):
-        return InlineParser.recognises(self, context)
-
     def parse(self, context, node, match):
         lines = []
         for text in match.group().split("\n"):
@@ -369,18 +498,28 @@ class EscapedInlineParser(InlineParser):
         InlineParser.__init__(self, "escaped", None)
 
     def recognises(self, context):
-        start_match = RE_ESCAPED_START.search(context.currentFragment())
+        start_match = context.search(RE_ESCAPED_START)
         if start_match:
             # And search the escape starting from the end of the escaped
-            end_match = RE_ESCAPED_END.search(
-                context.currentFragment(), start_match.end()
-            )
+            end_match = context.search(RE_ESCAPED_END, start_match.end())
             if end_match:
-                return (start_match.start(), (start_match, end_match))
+                offset = context.getOffset()
+                return (
+                    start_match.start() - offset,
+                    (FragmentMatch(start_match, offset), FragmentMatch(end_match, offset)),
+                )
             else:
                 return (None, None)
         return (None, None)
 
+    def isMonotonic(self):
+        # If there is no end after the first start, there is no end after
+        # any of the following starts either.
+        return True
+
+    def getTriggers(self):
+        return ("<[",)
+
     def endOf(self, recogniseInfo):
         return recogniseInfo[1].end()
 
@@ -390,8 +529,9 @@ class EscapedInlineParser(InlineParser):
         assert start_match != None and end_match != None
 
         # Create a text node with the escaped text
+        offset = context.getOffset()
         escaped_node = context.document.createTextNode(
-            context.currentFragment()[start_match.end() : end_match.start()]
+            context.fragment(offset + start_match.end(), offset + end_match.start())
         )
         node.appendChild(escaped_node)
         # And increase the offset
@@ -438,6 +578,10 @@ class LinkInlineParser(InlineParser):
                 return (None, None)
         return result
 
+    def getTriggers(self):
+        # We only reject some of the matches of the regexp
+        return literalTriggers(self.regexp)
+
     def parse(self, context, node, match):
         assert match
         # We detect wether the link is an URL or Ref link
@@ -521,9 +665,8 @@ class EmbedInlineParser(InlineParser):
         end = context.getOffset() + match.end()
         node = context.document.createElementNS(None, "embed")
         node.setAttributeNS(None, "type", str(match.group("name")))
-        node.setAttributeNS(None, "_start", str(start))
-        node.setAttributeNS(None, "_end", str(end))
-        node.setAttributeNS(None, "_indent", str(-1))
+        setOffsets(node, start, end)
+        setIndent(node, -1)
         for k, v in context.parseAttributes(match.group("attributes")).items():
             node.setAttributeNS(None, k, v)
         context.currentNode.appendChild(node)
@@ -684,7 +827,29 @@ class MarkupInlineParser(InlineParser):
         parameter tells the number of characters to skip before searching for
         the end markup. This has no impact on the result.
 
+        The end is looked up in the markup index of the document (see
+        `MarkupIndex`) when the index applies to the current block, and is
+        searched otherwise.
+
         The context offsets are left unchanged."""
+        offset = context.getOffset()
+        start = offset + offsetIncr
+        pairs = context.getMarkupIndex().pairs
+        if start in pairs:
+            pair = pairs[start]
+            if pair is None:
+                # The start tag has no end in the whole document
+                if context.blockEndOffset == context.documentTextLength:
+                    return None
+            elif pair[1] <= context.blockEndOffset:
+                if pair[2] != blockName:
+                    return None
+                return (pair[0] - offset, pair[1] - offset)
+        return self._scanEnd(blockName, context, offsetIncr)
+
+    def _scanEnd(self, blockName, context, offsetIncr=0):
+        """Implements `findEnd` by searching the markup inlines that follow
+        the current offset in the current block."""
         depth = markup_match = 1
         block_name = None
         offsets = context.saveOffsets()
@@ -715,4 +880,461 @@ class MarkupInlineParser(InlineParser):
         return context.parser.normaliseText(text)
 
 
+# ------------------------------------------------------------------------------
+#
+# MARKUP INDEX
+#
+# ------------------------------------------------------------------------------
+
+
+class MarkupIndex:
+    """Pairs the start tags of a document with their end tags, in a single
+    scan of the markup inlines of the whole document that skips the escaped
+    text, like `MarkupInlineParser._searchMarkup` does. An end tag closes the
+    last open start tag, whatever its name.
+
+    The `pairs` map the end offset of each start tag to the
+    `(start, end, name)` of its end tag, or to None when it has no end. As
+    the escapes and tags are scanned from the start of the document, the
+    index gives the same ends as a scan starting after a start tag of the
+    index, as long as that scan can see the whole end tag."""
+
+    def __init__(self, text, regexp=RE_MARKUP):
+        self.pairs = {}
+        stack = []
+        offset = 0
+        length = len(text)
+        # The next escaped text as (start, end), or False when there is none
+        escape = None
+        while offset < length:
+            if escape is None or escape and escape[0] < offset:
+                start = RE_ESCAPED_START.search(text, offset)
+                end = start and RE_ESCAPED_END.search(text, start.end())
+                escape = (start.start(), end.end()) if end else False
+            match = regexp.search(text, offset)
+            if escape and (not match or escape[0] <= match.start()):
+                offset = escape[1]
+                continue
+            elif not match:
+                break
+            elif Markup_isEndTag(match):
+                if stack:
+                    self.pairs[stack.pop()] = (
+                        match.start(),
+                        match.end(),
+                        match.group(4).strip(),
+                    )
+            elif Markup_isStartTag(match):
+                stack.append(match.end())
+            offset = match.end()
+        for start in stack:
+            self.pairs[start] = None
+
+
+# ------------------------------------------------------------------------------
+#
+# INLINE SCANNER
+#
+# ------------------------------------------------------------------------------
+
+CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: r"\d",
+    sre_constants.CATEGORY_NOT_DIGIT: r"\D",
+    sre_constants.CATEGORY_SPACE: r"\s",
+    sre_constants.CATEGORY_NOT_SPACE: r"\S",
+    sre_constants.CATEGORY_WORD: r"\w",
+    sre_constants.CATEGORY_NOT_WORD: r"\W",
+}
+
+# Characters that are too common in regular text for a master alternative
+# to start with them, as the master expression would then be tried at
+# almost every offset.
+COMMON_CHARACTERS = "aZ0 \n"
+
+
+def _firstCharacters(items):
+    """Returns a couple `(classes, nullable)` where `classes` is a list of
+    character class items (as regexp source) covering the characters that
+    the given parsed regexp `items` can start with, and `nullable` tells if
+    the items can match an empty string. `classes` is None when the
+    characters cannot be determined."""
+    classes = []
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            return classes + [re.escape(chr(av))], False
+        elif op is sre_constants.IN:
+            for iop, iav in av:
+                if iop is sre_constants.LITERAL:
+                    classes.append(re.escape(chr(iav)))
+                elif iop is sre_constants.RANGE:
+                    classes.append("%s-%s" % (re.escape(chr(iav[0])), re.escape(chr(iav[1]))))
+                elif iop is sre_constants.CATEGORY and iav in CATEGORIES:
+                    classes.append(CATEGORIES[iav])
+                else:
+                    return None, False
+            return classes, False
+        elif op is sre_constants.SUBPATTERN:
+            sub, nullable = _firstCharacters(av[-1])
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            sub, nullable = _firstCharacters(av[2])
+            nullable = nullable or av[0] == 0
+        elif op is sre_constants.BRANCH:
+            sub, nullable = [], False
+            for branch in av[1]:
+                branch_classes, branch_nullable = _firstCharacters(branch)
+                if branch_classes is None:
+                    return None, False
+                sub += branch_classes
+                nullable = nullable or branch_nullable
+        elif op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            # Zero-width items only restrict where a match can start
+            continue
+        else:
+            return None, False
+        if sub is None:
+            return None, False
+        classes += sub
+        if not nullable:
+            return classes, False
+    return classes, True
+
+
+def firstCharacters(regexp):
+    """Returns the content of a regexp character class (without the
+    brackets) matching the characters a match of the given compiled regexp
+    can start with, or None if it cannot be determined (in which case the
+    regexp can start anywhere)."""
+    return _getFirstCharacters(regexp.pattern, regexp.flags)
+
+
+@functools.lru_cache(maxsize=1024)
+def _getFirstCharacters(pattern, flags):
+    if flags & re.IGNORECASE:
+        return None
+    items = _parseRegexp(pattern, flags)
+    if items is None:
+        return None
+    classes, nullable = _firstCharacters(items)
+    if classes is None or nullable or not classes:
+        return None
+    return "".join(classes)
+
+
+def _literalTriggers(items):
+    """Returns the sets of literal strings found in the given parsed regexp
+    `items`, such that any match of the items contains at least one string
+    of each set. Literals are stripped of their spaces, as they would be
+    found almost everywhere."""
+    sets = []
+    run = []
+    for op, av in items + [(None, None)]:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        literal = "".join(run).strip()
+        if literal:
+            sets.append({literal})
+        run = []
+        if op is sre_constants.IN:
+            if all(iop is sre_constants.LITERAL for iop, _ in av):
+                chars = set(chr(iav) for _, iav in av if not chr(iav).isspace())
+                if len(chars) == len(av):
+                    sets.append(chars)
+            continue
+        elif op is sre_constants.SUBPATTERN:
+            sub = _bestTriggers(_literalTriggers(list(av[-1])))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0]:
+            sub = _bestTriggers(_literalTriggers(list(av[2])))
+        elif op is sre_constants.BRANCH:
+            sub = set()
+            for branch in av[1]:
+                branch_triggers = _bestTriggers(_literalTriggers(list(branch)))
+                if not branch_triggers:
+                    sub = None
+                    break
+                sub |= branch_triggers
+        else:
+            continue
+        if sub:
+            sets.append(sub)
+    return sets
+
+
+def _bestTriggers(sets):
+    """Returns the set of triggers that is the least likely to be found in
+    regular text, preferring the ones that don't start with letters and the
+    longest ones."""
+    if not sets:
+        return None
+    return min(
+        sets,
+        key=lambda _: (
+            sum(1 for t in _ if t[0].isalnum()),
+            -min(len(t) for t in _),
+            len(_),
+        ),
+    )
+
+
+def literalTriggers(regexp):
+    """Returns a tuple of literal strings such that any match of the given
+    compiled regexp contains at least one of them, or None if there are no
+    such strings (or they start with letters, and would not help)."""
+    return _getLiteralTriggers(regexp.pattern, regexp.flags)
+
+
+@functools.lru_cache(maxsize=1024)
+def _getLiteralTriggers(pattern, flags):
+    if flags & re.IGNORECASE:
+        return None
+    items = _parseRegexp(pattern, flags)
+    if items is None:
+        return None
+    triggers = _bestTriggers(_literalTriggers(items))
+    if not triggers or any(_[0].isalnum() for _ in triggers):
+        return None
+    return tuple(sorted(triggers))
+
+
+def isPositional(regexp):
+    """Tells if the given compiled regexp has a `^` anchor, which matches at
+    the current offset of the inline parsers, as it used to when regexps were
+    searched in a copy of the current fragment."""
+    return _isPositional(regexp.pattern, regexp.flags)
+
+
+@functools.lru_cache(maxsize=1024)
+def _isPositional(pattern, flags):
+    items = _parseRegexp(pattern, flags)
+    # A regexp that can't be analysed is considered positional when it may
+    # have an anchor.
+    return _hasStartAnchor(items) if items is not None else "^" in pattern
+
+
+def _hasStartAnchor(items):
+    for op, av in items:
+        if op is sre_constants.AT:
+            if av is sre_constants.AT_BEGINNING:
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if _hasStartAnchor(av[-1]):
+                return True
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            if _hasStartAnchor(av[2]):
+                return True
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if _hasStartAnchor(av[1]):
+                return True
+        elif op is sre_constants.BRANCH:
+            if any(_hasStartAnchor(_) for _ in av[1]):
+                return True
+    return False
+
+
+def _parseRegexp(pattern, flags):
+    # The analyses of the regexps are cached by pattern and flags, as every
+    # parser creates its own inline parsers, and thus its own scanners.
+    try:
+        return list(sre_parse.parse(pattern, flags))
+    except re.error:
+        return None
+
+
+class InlineScanner:
+    """Finds the next inline recognised by a list of inline parsers in a single
+    pass over the current block.
+
+    The regexps of the scannable parsers are folded into one master
+    alternation, ordered as the parsers are. As the regexp engine stops at
+    the leftmost offset where any alternative matches, and picks the first
+    alternative that matches there, the master expression yields the same
+    parser as polling every parser and keeping the lowest offset.
+
+    The master expression is guarded by a lookahead on the characters its
+    alternatives can start with, so that the regexp engine skips plain text
+    quickly. Parsers that could start on common characters (letters, spaces),
+    define their own `recognises` or require a leading space are polled
+    individually, and their results are merged with the master's by offset
+    and then by priority.
+
+    The matches of the master expression and of the monotonic polled parsers
+    are memoized in the context for the current block, with absolute
+    offsets, so that they are only searched again once the parsed inlines
+    have gone past them. A parser that found no match is not searched again
+    in the block.
+
+    The polled parsers whose triggers (see `InlineParser.getTriggers`) are
+    not in a block can be excluded from the whole block, using the parsers
+    returned by `getActiveParsers`. The alternatives of the master
+    expression don't need to be, as they are only tried where they start."""
+
+    FLAGS = ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"))
+
+    def __init__(self, inlineParsers):
+        self.parsers = tuple(inlineParsers)
+        # A list of (priority, parser, monotonic) for the parsers that are
+        # polled
+        self.polled = []
+        # Maps the index of a master alternative group to (priority, parser)
+        self.groups = {}
+        self.master = None
+        alternatives = []
+        starts = []
+        names = set()
+        group = 1
+        for priority, parser in enumerate(self.parsers):
+            alternative, start = self._alternative(parser, names)
+            if alternative is None:
+                self.polled.append((priority, parser, parser.isMonotonic()))
+            else:
+                alternatives.append(alternative)
+                starts.append(start)
+                names.update(parser.regexp.groupindex.keys())
+                self.groups[group] = (priority, parser)
+                group += parser.regexp.groups + 1
+        if alternatives:
+            self.master = re.compile(
+                "(?=[%s])(?:%s)" % ("".join(starts), "|".join(alternatives))
+            )
+        # The parsers that are always active, and the polled parsers by
+        # trigger, with the triggers by first character.
+        self.active = frozenset(self.parsers)
+        self.triggers = {}
+        for _, parser, _ in self.polled:
+            triggers = parser.getTriggers()
+            if triggers:
+                for trigger in triggers:
+                    self.triggers.setdefault(trigger, []).append(parser)
+        self.triggerStarts = {}
+        for trigger in self.triggers:
+            self.triggerStarts.setdefault(trigger[0], []).append(trigger)
+        if self.triggers:
+            self.active = self.active.difference(
+                parser for _ in self.triggers.values() for parser in _
+            )
+            self.triggerStart = re.compile(
+                "[%s]" % ("".join(re.escape(_) for _ in self.triggerStarts))
+            )
+
+    def _alternative(self, parser, names):
+        """Returns a couple `(alternative, start)` with the master alternative
+        for the given parser and the class of characters it starts with, or
+        `(None, None)` if the parser has to be polled."""
+        if not parser.isScannable() or not parser.isMonotonic():
+            return None, None
+        regexp = parser.regexp
+        # Named groups must be unique within the master expression, and only
+        # the flags that can be scoped are supported.
+        if names.intersection(regexp.groupindex.keys()):
+            return None, None
+        return self._getAlternative(regexp.pattern, regexp.flags)
+
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def _getAlternative(cls, pattern, flags):
+        # The alternatives are cached by pattern and flags, see `_parseRegexp`
+        if flags & (re.VERBOSE | re.ASCII | re.LOCALE):
+            return None, None
+        start = _getFirstCharacters(pattern, flags)
+        if not start or re.search("[%s]" % (start), COMMON_CHARACTERS):
+            return None, None
+        on = "".join(c for f, c in cls.FLAGS if flags & f)
+        off = "".join(c for f, c in cls.FLAGS if not flags & f)
+        alternative = "((?%s%s:%s))" % (on, "-" + off if off else "", pattern)
+        try:
+            re.compile(alternative)
+        except re.error:
+            return None, None
+        return alternative, start
+
+    def _findMaster(self, context, offset, memo):
+        """Returns the best `(position, priority, parser, info)` candidate of
+        the master expression, where `position` is absolute and `info` is
+        None as the parser's match has to be re-created."""
+        entry = memo.get(self)
+        # The memoized match is still valid if it has not been consumed
+        if entry and entry[0] <= offset and (entry[1] is None or offset <= entry[1]):
+            return None if entry[1] is None else entry[1:] + (None,)
+        match = context.search(self.master, offset)
+        if match:
+            priority, parser = self.groups[match.lastindex]
+            memo[self] = (offset, match.start(), priority, parser)
+            return (match.start(), priority, parser, None)
+        else:
+            memo[self] = (offset, None, None, None)
+            return None
+
+    def getActiveParsers(self, context):
+        """Returns the set of the parsers that may recognise an inline in the
+        rest of the current block, out of a single pass over its text that
+        looks for the triggers of the polled parsers."""
+        if not self.triggers:
+            return self.active
+        active = set(self.active)
+        # Maps the triggers that were not found to their parsers
+        pending = dict(self.triggers)
+        text = context.documentText
+        end = context.blockEndOffset
+        for match in self.triggerStart.finditer(text, context.getOffset(), end):
+            start = match.start()
+            for trigger in self.triggerStarts[match.group()]:
+                if trigger in pending and text.startswith(trigger, start, end):
+                    active.update(pending.pop(trigger))
+            if not pending:
+                break
+        return active
+
+    def find(self, context, active=None):
+        """Returns the same as `ParsingContext.findNextInline`, that is either
+        None or a triple (offset, information, parser) where offset is
+        relative to the context offset. The polled parsers that are not in
+        the given set of `active` parsers, if any, are skipped."""
+        offset = context.getOffset()
+        memo = context.getInlineMemo()
+        best = self._findMaster(context, offset, memo) if self.master else None
+        for priority, parser, monotonic in self.polled:
+            if active is not None and parser not in active:
+                continue
+            if monotonic:
+                entry = memo.get(parser)
+                # The parser has no match in the rest of the block, or its
+                # next match cannot win over the current best.
+                if entry and entry[0] <= offset and (entry[1] is None or offset <= entry[1]):
+                    if entry[1] is None:
+                        continue
+                    if best and best[:2] < (entry[1], priority):
+                        continue
+            match_offset, info = parser.recognises(context)
+            if monotonic:
+                memo[parser] = (
+                    offset,
+                    None if match_offset is None else offset + match_offset,
+                )
+            if match_offset is None:
+                continue
+            assert match_offset >= 0
+            if not best or (offset + match_offset, priority) < best[:2]:
+                best = (offset + match_offset, priority, parser, info)
+        if not best:
+            return None
+        position, _, parser, info = best
+        if info is None:
+            # The match is re-created with the parser's own regexp, so that
+            # group numbers are the ones the parser expects. As the parser is
+            # not polled, this match is recorded as its `recognises` call.
+            if context.stats is None:
+                info = context.match(parser.regexp, position)
+            else:
+                info = context.stats.call(
+                    getInlineFrameName(parser) + ".recognises",
+                    context.match,
+                    parser.regexp,
+                    position,
+                    size=context.blockEndOffset - offset,
+                )
+            assert info, "Master and parser expressions disagree"
+            info = FragmentMatch(info, offset)
+        return (position - offset, info, parser)
+
+
 # EOF - vim: ts=4 sw=4 tw=80 et
@@ -0,0 +1,278 @@
+# -----------------------------------------------------------------------------
+# Project           :   Texto
+# -----------------------------------------------------------------------------
+# Author            :   Sebastien Pierre           <sebastien.pierre@gmail.com>
+# License           :   Revised BSD License
+# -----------------------------------------------------------------------------
+# Creation date     :   2026-10-17
+# Last mod.         :   2026-10-17
+# -----------------------------------------------------------------------------
+
+import json
+import functools
+from time import perf_counter_ns
+from typing import Dict, List, Optional, Tuple
+
+__doc__ = """\
+The `stats` module records where the time goes when parsing and rendering a
+document. A parser created with `Parser(profile=True)` gives each parsing
+context a `Stats` object (as `context.stats`) that records, for every call
+of the `recognises` and `process` methods of the block parsers and of the
+`recognises` and `parse` methods of the inline parsers:
+
+- the number of calls,
+- the cumulative time (including the nested calls) and the self time,
+- the number of bytes the call was given (from the offset to the block end),
+- the number of regexp searches made through `ParsingContext.search`,
+  `ParsingContext.match` and their `searchText` and `matchText` variants,
+  and the number of bytes they searched.
+
+The search for the next inline of a block is recorded as `inline:scan`. The
+inline parsers whose expression is folded in the scanner's master expression
+are not polled: the match of their expression where the master expression
+found them is recorded as their `recognises` call. The whole parsing is
+recorded as `parse`, followed by `offsets` when offsets are annotated.
+The handlers of the `formats` processors are recorded in the same way when
+a `Stats` object is given to `Processor.generate` or `Processor.render`.
+
+Calls are recorded by call stack, so that the stats can be dumped as JSON
+(see `asDict`) or as collapsed stacks (see `toCollapsed`), the input format
+of flame graph tools.
+
+```python
+context = Parser(profile=True).parse(text)
+html.processor.generate(context.document, stats=context.stats)
+print(context.stats.toJSON())
+```
+
+Parsers created without `profile` are not instrumented at all.
+"""
+
+# The fields of an entry, in order
+FIELDS = ("calls", "time", "self", "bytes", "searches", "searched")
+
+# ------------------------------------------------------------------------------
+#
+# STATS
+#
+# ------------------------------------------------------------------------------
+
+
+class Stats:
+    """Records the calls made by parsers and processors by call stack. Each
+    entry maps a stack (a tuple of frame names) to a list of the values
+    named by `FIELDS`, with times in nanoseconds."""
+
+    def __init__(self):
+        self.entries: Dict[Tuple[str, ...], List[int]] = {}
+        # The frames of the current calls, as [stack, entry, start, children]
+        self._frames = []
+
+    def enter(self, name: str, size=0):
+        """Starts recording a call of the given frame, which was given `size`
+        bytes of text."""
+        stack = self._frames[-1][0] + (name,) if self._frames else (name,)
+        entry = self.entries.get(stack)
+        if entry is None:
+            entry = self.entries[stack] = [0, 0, 0, 0, 0, 0]
+        entry[0] += 1
+        entry[3] += size
+        self._frames.append([stack, entry, perf_counter_ns(), 0])
+
+    def leave(self):
+        """Stops recording the current call."""
+        ended = perf_counter_ns()
+        _, entry, started, children = self._frames.pop()
+        elapsed = ended - started
+        entry[1] += elapsed
+        entry[2] += elapsed - children
+        if self._frames:
+            self._frames[-1][3] += elapsed
+
+    def search(self, size: int):
+        """Records a regexp search over `size` bytes in the current call."""
+        if self._frames:
+            entry = self._frames[-1][1]
+            entry[4] += 1
+            entry[5] += size
+
+    def call(self, name: str, function, *args, size=0):
+        """Calls the given function with the given arguments, recording the
+        call as a `name` frame."""
+        self.enter(name, size)
+        try:
+            return function(*args)
+        finally:
+            self.leave()
+
+    def merge(self, stats: "Stats") -> "Stats":
+        """Adds the entries of the given stats to these ones."""
+        for stack, values in stats.entries.items():
+            entry = self.entries.get(stack)
+            if entry is None:
+                self.entries[stack] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    entry[i] += value
+        return self
+
+    def getTotals(self) -> Dict[str, Dict[str, int]]:
+        """Returns the values of each frame name over all the stacks. The
+        cumulative time of a recursive frame only counts its outermost
+        calls."""
+        totals = {}
+        for stack, values in self.entries.items():
+            name = stack[-1]
+            total = totals.get(name)
+            if total is None:
+                total = totals[name] = dict.fromkeys(FIELDS, 0)
+            for field, value in zip(FIELDS, values):
+                if field != "time" or name not in stack[:-1]:
+                    total[field] += value
+        return totals
+
+    def asDict(self) -> dict:
+        """Returns the stats as JSON-compatible data: the totals by frame
+        name and the entries by stack, with times in seconds."""
+
+        def convert(values):
+            return dict(
+                (k, v / 1e9 if k in ("time", "self") else v) for k, v in values.items()
+            )
+
+        return {
+            "unit": "seconds",
+            "totals": dict(
+                (name, convert(total))
+                for name, total in sorted(
+                    self.getTotals().items(), key=lambda _: -_[1]["self"]
+                )
+            ),
+            "stacks": [
+                dict(stack=list(stack), **convert(dict(zip(FIELDS, values))))
+                for stack, values in self.entries.items()
+            ],
+        }
+
+    def toJSON(self) -> str:
+        return json.dumps(self.asDict(), indent=1)
+
+    def toCollapsed(self) -> str:
+        """Returns the stacks in the collapsed format of flame graph tools,
+        one `frame;frame;frame COUNT` line per stack, where the count is the
+        self time in microseconds."""
+        return "".join(
+            "%s %d\n" % (";".join(stack), values[2] // 1000)
+            for stack, values in self.entries.items()
+        )
+
+    def dump(self, file, format: str = "json"):
+        """Writes the stats to the given text file object, either as JSON or
+        as collapsed stacks (`collapsed`)."""
+        if format == "json":
+            file.write(self.toJSON())
+            file.write("\n")
+        elif format == "collapsed":
+            file.write(self.toCollapsed())
+        else:
+            raise ValueError("Unsupported stats format: %s" % (format))
+
+
+# ------------------------------------------------------------------------------
+#
+# INSTRUMENTATION
+#
+# ------------------------------------------------------------------------------
+
+
+def instrumentParser(parser):
+    """Wraps the methods of the block, custom and inline parsers of the given
+    `Parser` so that their calls are recorded in the stats of the context
+    they are given, if any. Parsers that are already instrumented are left
+    as they are."""
+    blocks = list(parser.blockParsers) + list(parser.customParsers.values())
+    blocks.append(parser.defaultBlockParser)
+    for blockParser in blocks:
+        name = "block:" + blockParser.__class__.__name__
+        _instrument(blockParser, "recognises", name)
+        _instrument(blockParser, "process", name)
+    for inlineParser in parser.inlineParsers:
+        name = getInlineFrameName(inlineParser)
+        _instrument(inlineParser, "recognises", name)
+        _instrument(inlineParser, "parse", name)
+
+
+def getInlineFrameName(inlineParser) -> str:
+    """Returns the name of the frames of the given inline parser, like
+    `inline:code`."""
+    return "inline:" + (inlineParser.name or inlineParser.__class__.__name__)
+
+
+def instrumentContext(context, stats: Optional[Stats]):
+    """Sets the stats of the given parsing context, recording the regexp
+    searches it makes."""
+    context.stats = stats
+    if stats is None:
+        return
+    search = context.search
+    match = context.match
+    searchText = context.searchText
+    matchText = context.matchText
+    findNextInline = context.findNextInline
+
+    def instrumentedSearch(regexp, offset=None):
+        start = context._offset if offset is None else offset
+        stats.search(context.blockEndOffset - start)
+        return search(regexp, offset)
+
+    def instrumentedMatch(regexp, offset=None):
+        start = context._offset if offset is None else offset
+        stats.search(context.blockEndOffset - start)
+        return match(regexp, offset)
+
+    def instrumentedSearchText(regexp, text, offset=0):
+        stats.search(len(text) - offset)
+        return searchText(regexp, text, offset)
+
+    def instrumentedMatchText(regexp, text, offset=0):
+        stats.search(len(text) - offset)
+        return matchText(regexp, text, offset)
+
+    def instrumentedFindNextInline(inlineParsers, active=None):
+        return stats.call(
+            "inline:scan",
+            findNextInline,
+            inlineParsers,
+            active,
+            size=context.blockEndOffset - context._offset,
+        )
+
+    context.search = instrumentedSearch
+    context.match = instrumentedMatch
+    context.searchText = instrumentedSearchText
+    context.matchText = instrumentedMatchText
+    context.findNextInline = instrumentedFindNextInline
+
+
+def _instrument(parser, method: str, name: str):
+    function = getattr(parser, method)
+    if getattr(function, "isInstrumented", False):
+        return
+    frame = "%s.%s" % (name, method)
+
+    @functools.wraps(function)
+    def instrumented(context, *args):
+        stats = context.stats
+        if stats is None:
+            return function(context, *args)
+        stats.enter(frame, context.blockEndOffset - context._offset)
+        try:
+            return function(context, *args)
+        finally:
+            stats.leave()
+
+    instrumented.isInstrumented = True
+    setattr(parser, method, instrumented)
+
+
+# EOF
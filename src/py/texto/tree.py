@@ -0,0 +1,496 @@
+#!/usr/bin/env python
+# -----------------------------------------------------------------------------
+# Project           :   Texto
+# -----------------------------------------------------------------------------
+# Author            :   Sebastien Pierre           <sebastien.pierre@gmail.com>
+# License           :   Revised BSD License
+# -----------------------------------------------------------------------------
+# Creation date     :   17-Oct-2026
+# Last mod.         :   17-Oct-2026
+# -----------------------------------------------------------------------------
+
+import io
+import xml.dom
+import xml.dom.minidom
+
+__doc__ = """\
+The `tree` module implements a lightweight document tree that the parser can
+populate instead of an `xml.dom.minidom` document. Nodes use `__slots__` and
+a plain dictionary for attributes, and implement the subset of the DOM API
+that is used by the Texto parsers and the `formats` processors (`childNodes`,
+`parentNode`, `nodeType`, `nodeName`, `getAttributeNS`, `setAttributeNS`,
+`appendChild`, `toprettyxml`, etc), so that both tree kinds can be used
+interchangeably.
+
+The source offsets, indentation and number of elements are stored as
+integer fields rather than as attributes, and are only turned into the
+`_start`, `_end`, `_indent` and `_number` attributes on serialization. Use
+the `getOffsets`, `setOffsets`, `getIndent`, `setIndent`, `getNumber` and
+`setNumber` accessors, which also work with minidom elements.
+
+Use `toDOM` to get an `xml.dom.minidom` version of a native document.
+"""
+
+ELEMENT_NODE = xml.dom.Node.ELEMENT_NODE
+TEXT_NODE = xml.dom.Node.TEXT_NODE
+COMMENT_NODE = xml.dom.Node.COMMENT_NODE
+DOCUMENT_NODE = xml.dom.Node.DOCUMENT_NODE
+
+# The source information that the parser stores on elements. Native elements
+# keep these as integer fields, which are exposed as the given attributes
+# (and serialized as such), while minidom elements store them as attributes.
+FIELDS = {"_indent": "indent", "_start": "start", "_end": "end", "_number": "number"}
+
+# ------------------------------------------------------------------------------
+#
+# ATTRIBUTES
+#
+# ------------------------------------------------------------------------------
+
+
+class Attr:
+    """A name/value pair, as returned by `Attributes.item`."""
+
+    __slots__ = ("name", "value")
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class Attributes(dict):
+    """The attributes of a native element. This is a regular dictionary that
+    also supports the `length` and `item(i)` accessors of minidom's
+    `NamedNodeMap`."""
+
+    __slots__ = ()
+
+    @property
+    def length(self):
+        return len(self)
+
+    def item(self, index):
+        for i, name in enumerate(self):
+            if i == index:
+                return Attr(name, self[name])
+        return None
+
+
+# ------------------------------------------------------------------------------
+#
+# NODES
+#
+# ------------------------------------------------------------------------------
+
+
+class Node:
+    """The base class for native tree nodes."""
+
+    __slots__ = ("parentNode",)
+
+    ELEMENT_NODE = ELEMENT_NODE
+    TEXT_NODE = TEXT_NODE
+    COMMENT_NODE = COMMENT_NODE
+    DOCUMENT_NODE = DOCUMENT_NODE
+
+    def writexml(self, writer, indent="", addindent="", newl=""):
+        raise NotImplementedError
+
+    def toprettyxml(self, indent="\t", newl="\n"):
+        """Returns the XML serialization of this node, formatted exactly like
+        `xml.dom.minidom` would."""
+        writer = io.StringIO()
+        self.writexml(writer, "", indent, newl)
+        return writer.getvalue()
+
+    def toxml(self):
+        return self.toprettyxml("", "")
+
+
+class Text(Node):
+
+    __slots__ = ("data",)
+
+    nodeType = TEXT_NODE
+    nodeName = "#text"
+    childNodes = ()
+
+    def __init__(self, data):
+        self.parentNode = None
+        self.data = data
+
+    @property
+    def nodeValue(self):
+        return self.data
+
+    def writexml(self, writer, indent="", addindent="", newl=""):
+        writeData(writer, "%s%s%s" % (indent, self.data, newl))
+
+    def __repr__(self):
+        return "<Text %r>" % (self.data[:20])
+
+
+class Comment(Text):
+
+    __slots__ = ()
+
+    nodeType = COMMENT_NODE
+    nodeName = "#comment"
+
+    def writexml(self, writer, indent="", addindent="", newl=""):
+        if "--" in self.data:
+            raise ValueError("'--' is not allowed in a comment node")
+        writer.write("%s<!--%s-->%s" % (indent, self.data, newl))
+
+    def __repr__(self):
+        return "<Comment %r>" % (self.data[:20])
+
+
+class Element(Node):
+    """An element, which has the `indent`, `start`, `end` and `number` integer
+    fields (see `FIELDS`) in addition to its attributes."""
+
+    __slots__ = (
+        "nodeName",
+        "childNodes",
+        "attributes",
+        "indent",
+        "start",
+        "end",
+        "number",
+    )
+
+    nodeType = ELEMENT_NODE
+    namespaceURI = None
+
+    def __init__(self, name):
+        self.parentNode = None
+        self.nodeName = name
+        self.childNodes = []
+        self.attributes = Attributes()
+        self.indent = None
+        self.start = None
+        self.end = None
+        self.number = None
+
+    @property
+    def tagName(self):
+        return self.nodeName
+
+    @tagName.setter
+    def tagName(self, name):
+        self.nodeName = name
+
+    @property
+    def localName(self):
+        return self.nodeName
+
+    @property
+    def firstChild(self):
+        return self.childNodes[0] if self.childNodes else None
+
+    @property
+    def lastChild(self):
+        return self.childNodes[-1] if self.childNodes else None
+
+    # ATTRIBUTES______________________________________________________________
+
+    def getAttribute(self, name):
+        field = FIELDS.get(name)
+        if field:
+            value = getattr(self, field)
+            return "" if value is None else str(value)
+        else:
+            return self.attributes.get(name, "")
+
+    def getAttributeNS(self, namespace, name):
+        return self.getAttribute(name)
+
+    def setAttribute(self, name, value):
+        field = FIELDS.get(name)
+        if field:
+            setattr(self, field, int(value))
+        else:
+            self.attributes[name] = value
+
+    def setAttributeNS(self, namespace, name, value):
+        self.setAttribute(name, value)
+
+    def hasAttribute(self, name):
+        field = FIELDS.get(name)
+        if field:
+            return getattr(self, field) is not None
+        else:
+            return name in self.attributes
+
+    def hasAttributeNS(self, namespace, name):
+        return self.hasAttribute(name)
+
+    def removeAttribute(self, name):
+        field = FIELDS.get(name)
+        if field:
+            setattr(self, field, None)
+        else:
+            self.attributes.pop(name, None)
+
+    def removeAttributeNS(self, namespace, name):
+        self.removeAttribute(name)
+
+    # CHILDREN________________________________________________________________
+
+    def hasChildNodes(self):
+        return bool(self.childNodes)
+
+    def appendChild(self, node):
+        if node.parentNode is not None:
+            node.parentNode.removeChild(node)
+        node.parentNode = self
+        self.childNodes.append(node)
+        return node
+
+    def insertBefore(self, node, reference):
+        if reference is None:
+            return self.appendChild(node)
+        if node.parentNode is not None:
+            node.parentNode.removeChild(node)
+        self.childNodes.insert(self.childNodes.index(reference), node)
+        node.parentNode = self
+        return node
+
+    def removeChild(self, node):
+        try:
+            self.childNodes.remove(node)
+        except ValueError:
+            raise xml.dom.NotFoundErr()
+        node.parentNode = None
+        return node
+
+    def replaceChild(self, node, old):
+        if node.parentNode is not None:
+            node.parentNode.removeChild(node)
+        self.childNodes[self.childNodes.index(old)] = node
+        node.parentNode = self
+        old.parentNode = None
+        return old
+
+    def getElementsByTagName(self, name):
+        """Returns the descendants of this node with the given name, in
+        document order."""
+        result = []
+        stack = list(reversed(self.childNodes))
+        while stack:
+            node = stack.pop()
+            if node.nodeType == ELEMENT_NODE:
+                if name == "*" or node.nodeName == name:
+                    result.append(node)
+                stack.extend(reversed(node.childNodes))
+        return result
+
+    # SERIALIZATION___________________________________________________________
+
+    def writexml(self, writer, indent="", addindent="", newl=""):
+        writer.write(indent + "<" + self.nodeName)
+        for name, value in getAttributes(self):
+            writer.write(' %s="' % name)
+            writeData(writer, value)
+            writer.write('"')
+        children = self.childNodes
+        if children:
+            writer.write(">")
+            if len(children) == 1 and children[0].nodeType == TEXT_NODE:
+                children[0].writexml(writer, "", "", "")
+            else:
+                writer.write(newl)
+                for node in children:
+                    node.writexml(writer, indent + addindent, addindent, newl)
+                writer.write(indent)
+            writer.write("</%s>%s" % (self.nodeName, newl))
+        else:
+            writer.write("/>%s" % (newl))
+
+    def __repr__(self):
+        return "<Element %s>" % (self.nodeName)
+
+
+class Document(Element):
+    """The root of a native tree. Like in minidom, the document element is
+    the single element child of the document."""
+
+    __slots__ = ()
+
+    nodeType = DOCUMENT_NODE
+
+    def __init__(self):
+        Element.__init__(self, "#document")
+
+    @property
+    def documentElement(self):
+        for node in self.childNodes:
+            if node.nodeType == ELEMENT_NODE:
+                return node
+        return None
+
+    def createElementNS(self, namespace, name):
+        return Element(name)
+
+    def createElement(self, name):
+        return Element(name)
+
+    def createTextNode(self, data):
+        if not isinstance(data, str):
+            raise TypeError("node contents must be a string")
+        return Text(data)
+
+    def createComment(self, data):
+        return Comment(data)
+
+    def writexml(self, writer, indent="", addindent="", newl=""):
+        writer.write('<?xml version="1.0" ?>%s' % (newl))
+        for node in self.childNodes:
+            node.writexml(writer, indent, addindent, newl)
+
+    def toDOM(self):
+        """Returns an `xml.dom.minidom` copy of this document. A new copy is
+        built on each call, as the document may have changed since the last
+        one (see `Parser.reparse`)."""
+        return _toDOM(
+            self,
+            xml.dom.minidom.getDOMImplementation().createDocument(None, None, None),
+        )
+
+
+# ------------------------------------------------------------------------------
+#
+# FUNCTIONS
+#
+# ------------------------------------------------------------------------------
+
+
+def getOffsets(node):
+    """Returns the `(start, end)` source offsets of the given element, where
+    missing offsets are `None`."""
+    if isinstance(node, Element):
+        return node.start, node.end
+    else:
+        return _getInt(node, "_start"), _getInt(node, "_end")
+
+
+def setOffsets(node, start=None, end=None):
+    """Sets the source offsets of the given element, leaving the offsets
+    given as `None` untouched."""
+    if isinstance(node, Element):
+        if start is not None:
+            node.start = start
+        if end is not None:
+            node.end = end
+    else:
+        if start is not None:
+            node.setAttributeNS(None, "_start", str(start))
+        if end is not None:
+            node.setAttributeNS(None, "_end", str(end))
+
+
+def getIndent(node):
+    """Returns the indentation of the given element, or `None`."""
+    if isinstance(node, Element):
+        return node.indent
+    else:
+        return _getInt(node, "_indent")
+
+
+def setIndent(node, indent):
+    if isinstance(node, Element):
+        node.indent = indent
+    else:
+        node.setAttributeNS(None, "_indent", str(indent))
+
+
+def getNumber(node):
+    """Returns the number of the given element, which is set when offsets
+    are requested, or `None`."""
+    if isinstance(node, Element):
+        return node.number
+    else:
+        return _getInt(node, "_number")
+
+
+def setNumber(node, number):
+    if isinstance(node, Element):
+        node.number = number
+    else:
+        node.setAttributeNS(None, "_number", str(number))
+
+
+def getAttributes(node):
+    """Returns the list of `(name, value)` string pairs for the attributes
+    of the given element, including the source fields (see `FIELDS`), in
+    the order in which they are serialized."""
+    if isinstance(node, Element):
+        res = []
+        if node.indent is not None:
+            res.append(("_indent", str(node.indent)))
+        if node.start is not None:
+            res.append(("_start", str(node.start)))
+        if node.end is not None:
+            res.append(("_end", str(node.end)))
+        res.extend(node.attributes.items())
+        if node.number is not None:
+            res.append(("_number", str(node.number)))
+        return res
+    else:
+        return list(node.attributes.items())
+
+
+def _getInt(node, name):
+    value = node.getAttributeNS(None, name)
+    return int(value) if value else None
+
+
+def writeData(writer, data):
+    """Writes the given text to the writer, escaping it the same way
+    minidom does."""
+    if data:
+        writer.write(
+            data.replace("&", "&amp;")
+            .replace("<", "&lt;")
+            .replace('"', "&quot;")
+            .replace(">", "&gt;")
+        )
+
+
+def toDOM(node, document=None):
+    """Converts the given native node to an `xml.dom.minidom` node. Documents
+    are converted to a minidom document (see `Document.toDOM`), other nodes
+    are created within the given minidom `document`, or within a new one.
+    Nodes that are not native (ie. already minidom nodes) are returned
+    as-is."""
+    if not isinstance(node, Node):
+        return node
+    elif node.nodeType == DOCUMENT_NODE and document is None:
+        return node.toDOM()
+    if document is None:
+        document = xml.dom.minidom.getDOMImplementation().createDocument(
+            None, None, None
+        )
+    return _toDOM(node, document)
+
+
+def _toDOM(node, document):
+    if node.nodeType == TEXT_NODE:
+        return document.createTextNode(node.data)
+    elif node.nodeType == COMMENT_NODE:
+        return document.createComment(node.data)
+    elif node.nodeType == DOCUMENT_NODE:
+        for child in node.childNodes:
+            document.appendChild(_toDOM(child, document))
+        return document
+    else:
+        element = document.createElementNS(None, node.nodeName)
+        for name, value in getAttributes(node):
+            element.setAttributeNS(None, name, value)
+        for child in node.childNodes:
+            element.appendChild(_toDOM(child, document))
+        return element
+
+
+# EOF - vim: tw=80 ts=4 sw=4 et
@@ -0,0 +1,151 @@
+# -----------------------------------------------------------------------------
+# Project           :   Texto
+# -----------------------------------------------------------------------------
+# Author            :   Sebastien Pierre           <sebastien.pierre@gmail.com>
+# License           :   Revised BSD License
+# -----------------------------------------------------------------------------
+# Creation date     :   2026-10-17
+# Last mod.         :   2026-10-17
+# -----------------------------------------------------------------------------
+
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from .build import build, createArgumentParser, listSources
+from .command import extendParser
+from .parser import Parser
+
+__doc__ = """Watches a directory of Texto files and converts the files that
+change to another directory, like `texto build`. The watcher polls the
+modification times of the sources, waits for a burst of saves to be over
+before converting, and keeps its parser loaded between the builds."""
+
+# ------------------------------------------------------------------------------
+#
+# WATCH
+#
+# ------------------------------------------------------------------------------
+
+
+def watch(
+    source: str,
+    output: str,
+    format: str = "html",
+    offsets=False,
+    extensions: List[str] = [],
+    interval: float = 0.2,
+    delay: float = 0.1,
+    onBuild: Optional[Callable] = None,
+    tree: str = "dom",
+):
+    """Builds the `source` directory to the `output` directory (see
+    `build`), then polls the sources every `interval` seconds and builds
+    again once they changed and were left unchanged for `delay` seconds.
+    The `onBuild` callback is given the `(built, removed, unchanged,
+    failed)` results of each build, and the duration of the build in
+    seconds. The sources that fail to convert are reported by the build, and
+    are converted again by the following builds. The sources are parsed
+    into the given kind of `tree` (see `Parser`).
+
+    This runs until interrupted."""
+    parser = extendParser(Parser, extensions) or Parser(tree=tree)
+    snapshot = None
+    while True:
+        current = getSnapshot(source, output)
+        if current != snapshot:
+            # We wait until the sources stop changing, so that a burst of
+            # saves is built once.
+            while True:
+                time.sleep(delay)
+                latest = getSnapshot(source, output)
+                if latest == current:
+                    break
+                current = latest
+            started = time.monotonic()
+            snapshot = current
+            try:
+                result = build(source, output, format, offsets, 1, extensions, parser)
+            except Exception as e:
+                # The sources that fail to convert are reported by the build
+                # itself, so this is when the build can't run at all (like
+                # when the output can't be written).
+                print(f"texto: build failed: {e}", file=sys.stderr)
+                continue
+            if onBuild:
+                onBuild(*result, time.monotonic() - started)
+        time.sleep(interval)
+
+
+def getSnapshot(source: str, output: str) -> Dict[str, Tuple[int, int]]:
+    """Returns the modification time and size of each source file."""
+    snapshot = {}
+    for path in listSources(source, output):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # The file was removed since it was listed
+            continue
+        snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+# ------------------------------------------------------------------------------
+#
+# COMMAND-LINE INTERFACE
+#
+# ------------------------------------------------------------------------------
+
+
+def run(args=sys.argv[1:]):
+    """The command-line interface of `texto watch`."""
+    oparser = createArgumentParser("texto watch", __doc__)
+    oparser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        dest="interval",
+        default=0.2,
+        help="The number of seconds between two checks of the sources",
+    )
+    oparser.add_argument(
+        "-w",
+        "--wait",
+        type=float,
+        dest="delay",
+        default=0.1,
+        help="The number of seconds without changes before building",
+    )
+    args = oparser.parse_args(args=args)
+    if not os.path.isdir(args.source):
+        oparser.error(f"Source directory does not exist: {args.source}")
+
+    def report(built, removed, unchanged, failed, duration):
+        for path in built:
+            print(f"texto: built {path}", file=sys.stderr)
+        for path in removed:
+            print(f"texto: removed {path}", file=sys.stderr)
+        print(
+            f"texto: built {len(built)}, removed {len(removed)}, "
+            f"unchanged {len(unchanged)}, failed {len(failed)} "
+            f"in {duration * 1000:.0f}ms",
+            file=sys.stderr,
+        )
+
+    try:
+        watch(
+            args.source,
+            args.output,
+            args.format,
+            args.offsets,
+            args.extensions,
+            args.interval,
+            args.delay,
+            report,
+            args.tree,
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+# EOF
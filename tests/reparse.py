@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -----------------------------------------------------------------------------
+# Project           : Texto
+# -----------------------------------------------------------------------------
+# Author            : Sebastien Pierre             <sebastien.pierre@gmail.com>
+# -----------------------------------------------------------------------------
+# Creation  date    : 2026-10-17
+# Last mod.         : 2026-10-17
+# -----------------------------------------------------------------------------
+
+# Edits the paragraphs of the `tests/*.txto` documents one after the other
+# with `Parser.reparse`, and checks that each updated context gives the same
+# document, DOM copy, blocks, offsets, links and targets as a full parse of
+# the edited text. The edits are checked one by one, and then all at once so
+# that the offset shifts they leave pending are applied together.
+#
+# Usage: python tests/reparse.py
+
+import os
+import sys
+import io
+import glob
+import contextlib
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE, "..", "src", "py"))
+
+from texto.parser import Parser  # NOQA
+from texto.tree import toDOM  # NOQA
+
+# The edits of the paragraphs, as the text inserted in their middle and the
+# number of characters it replaces
+EDITS = (
+    ("word ", 0),
+    ("*em* ", 0),
+    ("[a link](http://x) ", 0),
+    ("|target| ", 0),
+    ("", 3),
+    ("x", 1),
+)
+
+
+def describe(context):
+    """Returns what the checks compare of the given context."""
+
+    def names(nodes):
+        return [_.getAttribute("target") or _.getAttribute("name") for _ in nodes]
+
+    return dict(
+        xml=context.document.toxml(),
+        dom=toDOM(context.document).toxml(),
+        blocks=[_[:2] for _ in context.blocks],
+        offsets=list(context.offsets) if context.offsets is not None else None,
+        links=names(context._links),
+        targets=names(context._targets),
+    )
+
+
+def check(path, tree, offsets, batch=False):
+    """Edits each paragraph of the given document, returning the number of
+    edits and the failed ones. When `batch` is set, the context is only
+    checked after the last edit."""
+    with open(path) as f:
+        text = f.read()
+    parser = Parser(tree=tree)
+    try:
+        context = parser.parse(text, offsets=offsets)
+    except Exception:
+        return 0, []
+    # The DOM copy is made before the edits, so that a stale copy shows
+    toDOM(context.document)
+    edits = 0
+    failed = []
+    for i, (edit, length) in enumerate(EDITS):
+        paragraphs = [_ for _ in context.blocks if _[2] is not None]
+        if not paragraphs:
+            break
+        start, end, _ = paragraphs[i % len(paragraphs)]
+        offset = (start + end) // 2
+        length = min(length, end - offset)
+        context = parser.reparse(context, offset, offset + length, edit)
+        edits += 1
+        if not batch or i == len(EDITS) - 1:
+            expected = Parser(tree=tree).parse(context.documentText, offsets=offsets)
+            actual = describe(context)
+            for key, value in describe(expected).items():
+                if actual[key] != value:
+                    failed.append(f"{os.path.basename(path)} {tree} {i} {key}")
+    return edits, failed
+
+
+def run():
+    edits = 0
+    failed = []
+    with contextlib.redirect_stderr(io.StringIO()):
+        for path in sorted(glob.glob(os.path.join(BASE, "*.txto"))):
+            for tree in ("native", "dom"):
+                for offsets in (False, True):
+                    for batch in (False, True):
+                        count, errors = check(path, tree, offsets, batch)
+                        edits += count
+                        failed += errors
+    for _ in failed:
+        print(f"FAIL {_}")
+    print(f"{edits} edits, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
+
+# EOF
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -----------------------------------------------------------------------------
+# Project           : Texto
+# -----------------------------------------------------------------------------
+# Author            : Sebastien Pierre             <sebastien.pierre@gmail.com>
+# -----------------------------------------------------------------------------
+# Creation  date    : 2026-10-17
+# Last mod.         : 2026-10-17
+# -----------------------------------------------------------------------------
+
+# Parses the reference documentation with a profiling parser and checks that
+# the stats record the regexp searches of the block parsers, and a
+# `recognises` call for the inline parsers that the parsing used.
+#
+# Usage: python tests/stats.py
+
+import os
+import sys
+import io
+import contextlib
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE, "..", "src", "py"))
+
+from texto.parser import Parser  # NOQA
+
+REFERENCE = os.path.join(BASE, "..", "doc", "reference.txto")
+# The block parsers that the reference has to exercise
+BLOCKS = (
+    "SectionBlockParser",
+    "ListItemBlockParser",
+    "TableBlockParser",
+    "ReferenceEntryBlockParser",
+    "MetaBlockParser",
+)
+
+
+def run():
+    with open(REFERENCE) as f:
+        text = f.read()
+    with contextlib.redirect_stderr(io.StringIO()):
+        context = Parser(profile=True).parse(text)
+    totals = context.stats.getTotals()
+    checks = len(BLOCKS)
+    failed = []
+    for name in BLOCKS:
+        frame = "block:%s.recognises" % (name)
+        if not totals.get(frame, {}).get("searches"):
+            failed.append(f"{frame} made no searches")
+    # Each inline parser that parsed an inline has recognised it
+    for frame, total in totals.items():
+        if frame.startswith("inline:") and frame.endswith(".parse"):
+            checks += 1
+            recognises = frame[: -len(".parse")] + ".recognises"
+            if totals.get(recognises, {}).get("calls", 0) < total["calls"]:
+                failed.append(f"{recognises} is missing")
+    for _ in failed:
+        print(f"FAIL {_}")
+    print(f"{checks - len(failed)}/{checks} checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
+
+# EOF
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -----------------------------------------------------------------------------
+# Project           : Texto
+# -----------------------------------------------------------------------------
+# Author            : Sebastien Pierre             <sebastien.pierre@gmail.com>
+# -----------------------------------------------------------------------------
+# Creation  date    : 2026-10-17
+# Last mod.         : 2026-10-17
+# -----------------------------------------------------------------------------
+
+# Renders the `tests/*.txto` documents from many threads at once using the
+# shared format processors, and checks that each rendering is the same as
+# when the documents are rendered one after the other.
+#
+# Usage: python tests/threads.py [THREADS] [ROUNDS]
+
+import os
+import sys
+import io
+import glob
+import random
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE, "..", "src", "py"))
+
+from texto.parser import Parser  # NOQA
+from texto.formats import html, lout, markdown, twiki, json  # NOQA
+
+FORMATS = {
+    "html": html,
+    "lout": lout,
+    "markdown": markdown,
+    "twiki": twiki,
+    "json": json,
+}
+# The levels we render with, so that the variables of a rendering leaking in
+# another one changes the output.
+LEVELS = (0, 1, 2)
+
+
+def parse(path):
+    with open(path) as f:
+        text = f.read()
+    try:
+        return Parser().parse(text).document
+    except Exception:
+        return None
+
+
+def render(document, format, level, bodyOnly, writer=False):
+    processor = FORMATS[format].processor
+    variables = {"LEVEL": level}
+    try:
+        if writer:
+            out = io.StringIO()
+            processor.render(document, out, bodyOnly, variables)
+            return out.getvalue()
+        else:
+            return processor.generate(document, bodyOnly, variables) or ""
+    except Exception as e:
+        return f"{e.__class__.__name__}: {e}"
+
+
+def run(threads=16, rounds=4):
+    # The parsing and rendering errors are silenced once for all the threads,
+    # as `redirect_stderr` swaps the global `sys.stderr`.
+    with contextlib.redirect_stderr(io.StringIO()):
+        return checkDocuments(threads, rounds)
+
+
+def checkDocuments(threads, rounds):
+    paths = sorted(glob.glob(os.path.join(BASE, "*.txto")))
+    # We parse the documents in the worker threads as well
+    with ThreadPoolExecutor(threads) as pool:
+        documents = dict(zip(paths, pool.map(parse, paths)))
+    jobs = [
+        (path, format, level, bodyOnly)
+        for path, document in documents.items()
+        if document
+        for format in FORMATS
+        for level in LEVELS
+        for bodyOnly in (False, True)
+    ]
+    expected = dict((job, render(documents[job[0]], *job[1:])) for job in jobs)
+    # Each round renders every job twice, returning the output or writing
+    # it, in a random order.
+    tasks = [(job, writer) for job in jobs for writer in (False, True)] * rounds
+    random.shuffle(tasks)
+
+    def check(task):
+        job, writer = task
+        output = render(documents[job[0]], *job[1:], writer)
+        return job if output != expected[job] else None
+
+    with ThreadPoolExecutor(threads) as pool:
+        failed = [_ for _ in pool.map(check, tasks) if _]
+    for path, format, level, bodyOnly in sorted(set(failed)):
+        name = os.path.basename(path)
+        print(f"FAIL {name} {format} LEVEL={level} bodyOnly={bodyOnly}")
+    print(
+        f"{len(tasks) - len(failed)}/{len(tasks)} renderings of "
+        f"{len(jobs)} jobs from {threads} threads were correct"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run(*(int(_) for _ in sys.argv[1:])))
+
+# EOF